@@ -4,11 +4,12 @@ import sys
 
 from .serverapp import ServerApp
 from jupyterlab import labapp
-from traitlets import List, Unicode, default, observe
+from traitlets import Bool, Enum, Float, Integer, List, Unicode, default, observe
 
 from jupyter_server.utils import url_path_join
 
 from ._version import __version__
+from .kernelmanager import PhoilaKernelManager
 from .server_extension import _load_jupyter_server_extension
 from .voila_handlers import add_voila_handlers
 
@@ -33,6 +34,8 @@ class PhoilaApp(ServerApp):
     description = "The Phoila application"
     examples = _examples
 
+    classes = ServerApp.classes + [PhoilaKernelManager]
+
     subcommands = dict(
         install=(InstallPhoilaExtensionApp, "Install phoila extension(s)"),
         update=(UpdatePhoilaExtensionApp, "Update phoila extension(s)"),
@@ -59,9 +62,72 @@ class PhoilaApp(ServerApp):
             "jupyter_server.services.kernelspecs.handlers",
             "jupyter_server.services.security.handlers",
             "jupyter_server.services.shutdown",
+            "phoila.drain_handlers",
         ),
     )
 
+    @default("kernel_manager_class")
+    def _default_kernel_manager_class(self):
+        return PhoilaKernelManager
+
+    workspaces_store = Enum(
+        ["directory", "sqlite"],
+        "directory",
+        config=True,
+        help="""How to store workspaces in the workspaces directory.
+
+        "directory" stores one JSON file per workspace, as in JupyterLab.
+        "sqlite" stores all workspaces in a single SQLite database, which
+        should be on a local disk (see `workspaces_sqlite_file`).
+        """,
+    )
+
+    workspaces_sqlite_file = Unicode(
+        "",
+        config=True,
+        help="""The SQLite database file for the "sqlite" workspaces store.
+
+        Defaults to a file in the Jupyter runtime dir. SQLite's WAL mode does
+        not work on network file systems, so keep it on a local disk.
+        """,
+    )
+
+    workspaces_write_delay = Float(
+        1.0,
+        config=True,
+        help="""(sec) Delay before writing a saved workspace to disk.
+
+        Saves within the delay are coalesced into a single write, which is
+        done on a background thread. Set to 0 to write on every save.
+        """,
+    )
+
+    single_workspaces_max_bytes = Integer(
+        16 * 1024 * 1024,
+        config=True,
+        help="""The maximum total size (in bytes) of the in-memory workspaces
+        kept for single notebook mode. The least recently used workspaces are
+        dropped first. These workspaces are never written to disk.
+        """,
+    )
+
+    render_worker = Bool(
+        False,
+        config=True,
+        help="""Fetch and parse the notebook render stream in a Web Worker in
+        the browser, to keep the page responsive while large notebooks load.
+        """,
+    )
+
+    share_sessions = Bool(
+        False,
+        config=True,
+        help="""Allow several views of the same notebook in a page. The views
+        share one session, with a single render request, kernel and set of
+        output models. Otherwise, opening a notebook again activates its view.
+        """,
+    )
+
     mathjax_url = Unicode(
         "",
         config=True,
@@ -109,6 +175,8 @@ class PhoilaApp(ServerApp):
                 'kernel_info_request',
                 'shutdown_request'
             ]
+            if isinstance(self.kernel_manager, PhoilaKernelManager):
+                self.kernel_manager.reattach_kernels()
             if self.subapp is None:
                 _load_jupyter_server_extension(self)
                 add_voila_handlers(self)
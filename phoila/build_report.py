@@ -0,0 +1,198 @@
+# Copyright (c) Vidar Tonaas Fauske.
+# Distributed under the terms of the Modified BSD License.
+
+"""Bundle size and build time reports for `phoila build --report`.
+"""
+
+import glob
+import gzip
+import json
+import os
+import time
+from contextlib import contextmanager
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+BUILD_REPORT = "phoila-build-report.json"
+BUILD_REPORT_VERSION = 1
+
+_size_keys = ("raw", "gzip", "brotli")
+
+
+def compressed_sizes(data):
+    """Get the raw, gzip and brotli (if available) sizes of some bytes."""
+    return dict(
+        raw=len(data),
+        gzip=len(gzip.compress(data, compresslevel=9)),
+        brotli=len(brotli.compress(data)) if brotli is not None else None,
+    )
+
+
+def _package_name(source):
+    """Get the npm package name of a source map source, or None."""
+    idx = source.rfind("node_modules/")
+    if idx == -1:
+        return None
+    parts = source[idx + len("node_modules/") :].split("/")
+    if parts[0].startswith("@") and len(parts) > 1:
+        return "/".join(parts[:2])
+    return parts[0]
+
+
+def _source_shares(map_path):
+    """Get the fraction of a chunk's sources that belong to each package.
+
+    The fractions are based on the size of the original sources in the
+    source map, so they are an estimate of each package's share of the
+    minified chunk.
+    """
+    try:
+        with open(map_path) as fid:
+            source_map = json.load(fid)
+    except (OSError, ValueError):
+        return {}
+    contents = source_map.get("sourcesContent") or []
+    sizes = {}
+    for source, content in zip(source_map.get("sources", []), contents):
+        name = _package_name(source) or "(app)"
+        sizes[name] = sizes.get(name, 0) + len(content or "")
+    total = sum(sizes.values())
+    if not total:
+        return {}
+    return {name: size / total for name, size in sizes.items()}
+
+
+def collect_sizes(static_dir):
+    """Get the sizes of the chunks in a build, and estimated package sizes.
+
+    Returns a tuple of dicts of chunk name -> sizes and package -> sizes.
+    """
+    chunks = {}
+    packages = {}
+    patterns = [os.path.join(static_dir, "*.js"), os.path.join(static_dir, "*.css")]
+    for path in sorted(p for pattern in patterns for p in glob.glob(pattern)):
+        with open(path, "rb") as fid:
+            sizes = compressed_sizes(fid.read())
+        chunks[os.path.basename(path)] = sizes
+        for name, share in _source_shares(path + ".map").items():
+            entry = packages.setdefault(name, dict.fromkeys(_size_keys, 0))
+            for key in _size_keys:
+                if sizes[key] is None:
+                    entry[key] = None
+                elif entry[key] is not None:
+                    entry[key] += int(round(sizes[key] * share))
+    return chunks, packages
+
+
+def bundle_size(static_dir):
+    """Get the total sizes of all the chunks in a build."""
+    return _totals(collect_sizes(static_dir)[0])
+
+
+def _totals(sizes):
+    totals = dict.fromkeys(_size_keys, 0)
+    for entry in sizes.values():
+        for key in _size_keys:
+            if entry[key] is None or totals[key] is None:
+                totals[key] = None
+            else:
+                totals[key] += entry[key]
+    return totals
+
+
+def _diff_sizes(previous, current):
+    """Get the size changes between two dicts of name -> sizes."""
+    diff = {}
+    for name in sorted(set(previous) | set(current)):
+        old = previous.get(name)
+        new = current.get(name)
+        if old == new:
+            continue
+        change = {}
+        for key in _size_keys:
+            old_size = old.get(key) if old else 0
+            new_size = new.get(key) if new else 0
+            if old_size is None or new_size is None:
+                change[key] = None
+            else:
+                change[key] = new_size - old_size
+        if old is None:
+            change["status"] = "added"
+        elif new is None:
+            change["status"] = "removed"
+        diff[name] = change
+    return diff
+
+
+def diff_reports(previous, current):
+    """Get the changes in bundle sizes since a previous report."""
+    if not previous:
+        return None
+    return dict(
+        total=_diff_sizes(
+            dict(total=previous["total"]), dict(total=current["total"])
+        ).get("total"),
+        chunks=_diff_sizes(previous["chunks"], current["chunks"]),
+        packages=_diff_sizes(previous["packages"], current["packages"]),
+    )
+
+
+def make_report(app_dir, timings, extensions=(), previous=None):
+    """Create a build report for the build in an app dir.
+
+    `extensions` are the package names to mark as extensions, and
+    `previous` is the report of the previous build, if any.
+    """
+    chunks, packages = collect_sizes(os.path.join(app_dir, "static"))
+    for name, entry in packages.items():
+        entry["extension"] = name in extensions
+    report = dict(
+        report_version=BUILD_REPORT_VERSION,
+        created=time.time(),
+        timings=timings,
+        total=_totals(chunks),
+        chunks=chunks,
+        packages=packages,
+    )
+    report["diff"] = diff_reports(previous, report)
+    return report
+
+
+def read_build_report(app_dir):
+    """Read the report of the previous build, or None."""
+    try:
+        with open(os.path.join(app_dir, BUILD_REPORT)) as fid:
+            report = json.load(fid)
+    except (OSError, ValueError):
+        return None
+    if report.get("report_version") != BUILD_REPORT_VERSION:
+        return None
+    return report
+
+
+def write_build_report(app_dir, report):
+    """Store a build report in the app dir, for diffing the next build."""
+    target = os.path.join(app_dir, BUILD_REPORT)
+    tmp = target + ".tmp"
+    with open(tmp, "w") as fid:
+        json.dump(report, fid, indent=2, sort_keys=True)
+    os.replace(tmp, target)
+
+
+class PhaseTimer(object):
+    """Record the wall time of named build phases."""
+
+    def __init__(self):
+        self.timings = {}
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = round(time.perf_counter() - start, 3)
@@ -1,12 +1,47 @@
+import glob
+import hashlib
+import json
 import os
+import re
 import sys
 
-from traitlets import Instance, Unicode, default, HasTraits
-from jupyterlab import labextensions, labapp
+from traitlets import Bool, Enum, Instance, Integer, Unicode, default, HasTraits
+from jupyterlab import labextensions, labapp, __version__ as lab_version
+from jupyterlab.commands import get_app_info
 from jupyterlab.coreconfig import CoreConfig
 
+from ._version import __version__
+from .build_report import (
+    PhaseTimer,
+    bundle_size,
+    make_report,
+    read_build_report,
+    write_build_report,
+)
+from .extension_cache import install_extensions, update_extensions
+from .themes import write_theme_bundles
+
 APP_DIR_DEFAULT = os.path.join(sys.prefix, "share", "jupyter", "phoila")
 
+# The app-info manifest written by `phoila build`:
+APP_INFO_MANIFEST = "phoila-app-info.json"
+APP_INFO_MANIFEST_VERSION = 1
+
+# Paths (relative to the app dir) that `get_app_info` reads from. If any of
+# these are newer than the manifest, the manifest is considered stale.
+_app_info_inputs = (
+    "extensions",
+    os.path.join("settings", "page_config.json"),
+    os.path.join("settings", "build_config.json"),
+    os.path.join("static", "package.json"),
+)
+
+# The fingerprint of the inputs of the last `phoila build`:
+BUILD_FINGERPRINT = "phoila-build-fingerprint.json"
+
+# Directories to skip when fingerprinting local/linked package sources:
+_fingerprint_skip_dirs = ("node_modules", ".git", "__pycache__")
+
 extensions = (
     "@jupyterlab/application-extension",
     "@jupyterlab/apputils-extension",
@@ -22,13 +57,12 @@ extensions = (
     "@jupyterlab/theme-light-extension",
     "@jupyterlab/vdom-extension",
 )
-mime_extensions = (
-    "@jupyterlab/javascript-extension",
-    "@jupyterlab/json-extension",
-    "@jupyterlab/pdf-extension",
-    "@jupyterlab/vega4-extension",
-    "@jupyterlab/vega5-extension",
-)
+# The themes to build CSS bundles for:
+themes = tuple(e for e in extensions if "/theme-" in e)
+# The standard mime extensions (javascript, json, pdf, vega4 and vega5) are
+# not part of the core config. The phoila extension registers them itself,
+# and loads each as a separate chunk the first time its mime type is used.
+mime_extensions = ()
 singletons = (
     "@jupyterlab/application",
     "@jupyterlab/apputils",
@@ -49,33 +83,452 @@ singletons = (
 )
 
 
+# The extensions and singletons that each build profile leaves out:
+profiles = {
+    "full": dict(extensions=(), singletons=()),
+    # Only what is needed to show dashboards:
+    "minimal": dict(
+        extensions=(
+            "@jupyterlab/csvviewer-extension",
+            "@jupyterlab/docmanager-extension",
+            "@jupyterlab/htmlviewer-extension",
+            "@jupyterlab/imageviewer-extension",
+            "@jupyterlab/markdownviewer-extension",
+            "@jupyterlab/shortcuts-extension",
+            "@jupyterlab/theme-dark-extension",
+        ),
+        singletons=(
+            "@jupyterlab/console",
+            "@jupyterlab/docmanager",
+            "@jupyterlab/extensionmanager",
+            "@jupyterlab/filebrowser",
+            "@jupyterlab/fileeditor",
+            "@jupyterlab/imageviewer",
+            "@jupyterlab/launcher",
+            "@jupyterlab/terminal",
+            "@jupyterlab/tooltip",
+        ),
+    ),
+}
+
+# The key in the build config (settings/build_config.json) that stores the
+# profile of the last build:
+BUILD_PROFILE_KEY = "phoila_profile"
+
+# Patterns for reading the plugin definitions of the installed extension
+# packages from the sources in the build's source maps:
+_source_package_pattern = re.compile(r"node_modules/((?:@[^/]+/)?[^/]+)/lib/")
+_import_pattern = re.compile(r"import\s*\{([^}]*)\}\s*from\s*'([^']+)'")
+_token_pattern = re.compile(r"(\w+)\s*=\s*new\s+Token\(\s*'([^']+)'")
+_provides_pattern = re.compile(r"\bprovides:\s*([\w.]+)")
+_requires_pattern = re.compile(r"\brequires:\s*\[([^\]]*)\]")
+
+
+def _package_sources(packages, app_dir=None, static_dir=None):
+    """Get the compiled sources of extension packages.
+
+    The sources are read from the packages installed in the staging dir of
+    the app dir, and otherwise from the source maps of the build in
+    `static_dir`.
+    """
+    sources = {name: [] for name in packages}
+    if app_dir:
+        for name in packages:
+            lib_dir = os.path.join(app_dir, "staging", "node_modules", name, "lib")
+            for dirpath, dirnames, filenames in os.walk(lib_dir):
+                for filename in sorted(filenames):
+                    if not filename.endswith(".js"):
+                        continue
+                    with open(os.path.join(dirpath, filename)) as fid:
+                        sources[name].append(fid.read())
+    if static_dir is None or all(sources.values()):
+        return sources
+    for path in sorted(glob.glob(os.path.join(static_dir, "*.js.map"))):
+        try:
+            with open(path) as fid:
+                source_map = json.load(fid)
+        except (OSError, ValueError):
+            continue
+        found = {}
+        for source_path, content in zip(
+            source_map.get("sources", []), source_map.get("sourcesContent") or []
+        ):
+            match = _source_package_pattern.search(source_path)
+            if match and match.group(1) in sources and content:
+                found.setdefault(match.group(1), []).append(content)
+        for name, contents in found.items():
+            if not sources[name]:
+                sources[name] = contents
+    return sources
+
+
+def _resolve_token(names, identifier):
+    """Resolve an identifier like `IFoo` or `Namespace.IFoo` to a token name."""
+    head, _, attribute = identifier.strip().partition(".")
+    token = names.get(head)
+    if token is None or not attribute:
+        return token
+    return "%s:%s" % (token.split(":")[0], attribute.split(".")[-1])
+
+
+def read_plugin_tokens(packages, app_dir=None, static_dir=None):
+    """Read the plugin tokens that extension packages provide and require.
+
+    The tokens are read from the plugin definitions in the compiled package
+    sources, as installed in the staging dir of `app_dir` by a previous
+    build, or as included in the source maps of the JupyterLab build in
+    `static_dir` (by default the build shipped with jupyterlab). Optional
+    tokens are left out. Packages whose sources are not found are missing
+    from the result.
+    """
+    if static_dir is None:
+        static_dir = os.path.join(os.path.dirname(labapp.__file__), "static")
+    tokens = {}
+    for name, sources in _package_sources(packages, app_dir, static_dir).items():
+        if not sources:
+            continue
+        local = {}
+        for source in sources:
+            local.update(_token_pattern.findall(source))
+        provides = set()
+        requires = set()
+        for source in sources:
+            names = dict(local)
+            for imported, module in _import_pattern.findall(source):
+                if module.startswith("."):
+                    continue
+                for item in imported.split(","):
+                    parts = item.split(" as ")
+                    if parts[0].strip():
+                        names[parts[-1].strip()] = "%s:%s" % (module, parts[0].strip())
+            for identifier in _provides_pattern.findall(source):
+                token = _resolve_token(names, identifier)
+                if token:
+                    provides.add(token)
+            for required in _requires_pattern.findall(source):
+                for identifier in required.split(","):
+                    token = _resolve_token(names, identifier)
+                    if token:
+                        requires.add(token)
+        tokens[name] = dict(provides=sorted(provides), requires=sorted(requires))
+    return tokens
+
+
+def read_build_profile(app_dir):
+    """Read the profile of the last build in the app dir, or None."""
+    try:
+        with open(os.path.join(app_dir, "settings", "build_config.json")) as fid:
+            profile = json.load(fid).get(BUILD_PROFILE_KEY)
+    except (OSError, ValueError, AttributeError):
+        return None
+    return profile if profile in profiles else None
+
+
+def write_build_profile(app_dir, profile):
+    """Store the profile of a build in the build config of the app dir."""
+    target = os.path.join(app_dir, "settings", "build_config.json")
+    try:
+        with open(target) as fid:
+            config = json.load(fid)
+    except (OSError, ValueError):
+        config = {}
+    if config.get(BUILD_PROFILE_KEY) == profile:
+        # Leave the file alone, as its mtime is a build input
+        return
+    config[BUILD_PROFILE_KEY] = profile
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open(target, "w") as fid:
+        json.dump(config, fid, indent=4)
+
+
 class PhoilaMixin(HasTraits):
     app_dir = Unicode(APP_DIR_DEFAULT, config=True, help="The app directory to target")
 
+    profile = Enum(
+        sorted(profiles),
+        config=True,
+        help="""The build profile, which determines the core extensions and
+        singletons included in the build. The "minimal" profile leaves out
+        everything that is not needed to show dashboards.
+
+        Defaults to the profile of the last build in the app directory, so
+        that installing or updating extensions keeps it, or "full".""",
+    )
+
     core_config = Instance(CoreConfig, allow_none=True)
 
+    @default("profile")
+    def _default_profile(self):
+        return read_build_profile(self.app_dir) or "full"
+
     @default("core_config")
     def _default_core_config(self):
+        pruned = profiles[self.profile]
         c = CoreConfig()
         orig_extensions = c.extensions
         orig_mimes = c.mime_extensions
         orig_singletons = c.singletons
         c.clear_packages()
         for e in extensions:
-            c.add(e, orig_extensions[e], extension=True)
+            if e not in pruned["extensions"]:
+                c.add(e, orig_extensions[e], extension=True)
         for e in mime_extensions:
             c.add(e, orig_mimes[e], mime_extension=True)
         for e in singletons:
-            c.add(e, orig_singletons[e])
+            if e not in pruned["singletons"]:
+                c.add(e, orig_singletons[e])
         return c
 
 
-class InstallPhoilaExtensionApp(PhoilaMixin, labextensions.InstallLabExtensionApp):
-    pass
+def check_profile(app_dir, profile, core_config=None, logger=None, static_dir=None):
+    """Check that the installed extensions work with a build profile.
 
+    Finds the installed extensions that depend on a singleton that the
+    profile leaves out, or on the package of a left out extension (which
+    would then not provide its plugins), and the plugins of kept core
+    extensions that require a token that only left out extensions provide.
+
+    Returns the list of problems, which are also logged as an error.
+    """
+    pruned = profiles[profile]
+    pruned_packages = set(pruned["singletons"]) | set(pruned["extensions"])
+    for name in pruned["extensions"]:
+        pruned_packages.add(name[: -len("-extension")])
+    problems = []
+
+    if pruned["extensions"]:
+        tokens = read_plugin_tokens(
+            extensions, app_dir=app_dir, static_dir=static_dir
+        )
+        missing = [e for e in extensions if e not in tokens]
+        if missing and logger:
+            logger.warning(
+                "Could not read the plugin tokens of %s, so their plugins "
+                "are not checked against the build profile",
+                ", ".join(missing),
+            )
+        kept = [e for e in extensions if e not in pruned["extensions"]]
+        lost = set()
+        for name in pruned["extensions"]:
+            lost.update(tokens.get(name, {}).get("provides", ()))
+        for name in kept:
+            lost.difference_update(tokens.get(name, {}).get("provides", ()))
+        for name in kept:
+            for token in tokens.get(name, {}).get("requires", ()):
+                if token in lost:
+                    problems.append("%s requires %s" % (name, token))
+
+    info = get_app_info(app_dir, logger=logger, core_config=core_config)
+    for name, data in sorted(info["extensions"].items()):
+        for dep in sorted(data.get("dependencies", {})):
+            if dep in pruned_packages:
+                problems.append("%s depends on %s" % (name, dep))
+    if problems and logger:
+        logger.error(
+            'The extensions need packages left out by the "%s" build '
+            "profile:\n    %s",
+            profile,
+            "\n    ".join(problems),
+        )
+    return problems
+
+
+def write_app_info_manifest(app_dir, core_config=None, logger=None):
+    """Write a compact app-info manifest to the app directory.
+
+    The manifest holds the parts of `get_app_info` that the server needs at
+    startup, so that `read_app_info_manifest` can skip the full app dir scan.
+    """
+    info = get_app_info(app_dir, logger=logger, core_config=core_config)
+    manifest = dict(
+        manifest_version=APP_INFO_MANIFEST_VERSION,
+        phoila_version=__version__,
+        lab_version=lab_version,
+        version=info["version"],
+        staticUrl=info["staticUrl"],
+        app_dir=info["app_dir"],
+        sys_dir=info["sys_dir"],
+        disabled=info["disabled"],
+        disabled_core=info["disabled_core"],
+        uninstalled_core=info["uninstalled_core"],
+        local_extensions=info["local_extensions"],
+        linked_packages=info["linked_packages"],
+        extensions={
+            name: data.get("version", "") for name, data in info["extensions"].items()
+        },
+    )
+    target = os.path.join(app_dir, APP_INFO_MANIFEST)
+    tmp = target + ".tmp"
+    with open(tmp, "w") as fid:
+        json.dump(manifest, fid, separators=(",", ":"), sort_keys=True)
+    os.replace(tmp, target)
+    return manifest
 
-class UpdatePhoilaExtensionApp(PhoilaMixin, labextensions.UpdateLabExtensionApp):
-    pass
+
+def read_app_info_manifest(app_dir):
+    """Read the app-info manifest from the app directory.
+
+    Returns None if the manifest is missing, unreadable, written by another
+    version of phoila/jupyterlab, or older than the app dir contents.
+    """
+    target = os.path.join(app_dir, APP_INFO_MANIFEST)
+    try:
+        manifest_mtime = os.stat(target).st_mtime
+    except OSError:
+        return None
+    for path in _app_info_inputs:
+        try:
+            if os.stat(os.path.join(app_dir, path)).st_mtime > manifest_mtime:
+                return None
+        except OSError:
+            if path == os.path.join("static", "package.json"):
+                # No build output, so the manifest cannot be current
+                return None
+    try:
+        with open(target) as fid:
+            manifest = json.load(fid)
+    except (OSError, ValueError):
+        return None
+    if (
+        manifest.get("manifest_version") != APP_INFO_MANIFEST_VERSION
+        or manifest.get("phoila_version") != __version__
+        or manifest.get("lab_version") != lab_version
+    ):
+        return None
+    return manifest
+
+
+def _file_stamp(path):
+    """Get the size and modification time of a file, or None if missing."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _tree_stamp(root):
+    """Get the file count and newest modification time under a directory."""
+    count = 0
+    newest = 0
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in _fingerprint_skip_dirs]
+        for filename in filenames:
+            stamp = _file_stamp(os.path.join(dirpath, filename))
+            if stamp is None:
+                continue
+            count += 1
+            newest = max(newest, stamp[1])
+    return [count, newest]
+
+
+def build_fingerprint(app_dir, core_config=None, logger=None, **build_args):
+    """Compute a fingerprint of all inputs to a phoila build.
+
+    This covers the phoila and jupyterlab versions, the core config, the
+    installed extension tarballs, the sources of local extensions and
+    linked packages, the build config, and the given build arguments.
+    """
+    info = get_app_info(app_dir, logger=logger, core_config=core_config)
+    inputs = dict(
+        phoila_version=__version__,
+        lab_version=lab_version,
+        build_args=build_args,
+        core=dict(
+            extensions=core_config.extensions if core_config else None,
+            mime_extensions=core_config.mime_extensions if core_config else None,
+            singletons=core_config.singletons if core_config else None,
+        ),
+        extensions={
+            name: [data["version"], data["location"], _file_stamp(data["path"])]
+            for name, data in info["extensions"].items()
+        },
+        local_extensions={
+            name: _tree_stamp(source)
+            for name, source in info["local_extensions"].items()
+        },
+        linked_packages={
+            name: _tree_stamp(data["source"])
+            for name, data in info["linked_packages"].items()
+        },
+        uninstalled_core=sorted(info["uninstalled_core"]),
+        build_config=_file_stamp(
+            os.path.join(app_dir, "settings", "build_config.json")
+        ),
+    )
+    serialized = json.dumps(inputs, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+def read_build_fingerprint(app_dir):
+    """Read the fingerprint of the last build, or None if there is no build."""
+    for path in ("package.json", "index.html"):
+        if not os.path.exists(os.path.join(app_dir, "static", path)):
+            return None
+    try:
+        with open(os.path.join(app_dir, BUILD_FINGERPRINT)) as fid:
+            return json.load(fid)["fingerprint"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def write_build_fingerprint(app_dir, fingerprint):
+    """Store the fingerprint of a completed build in the app dir."""
+    target = os.path.join(app_dir, BUILD_FINGERPRINT)
+    tmp = target + ".tmp"
+    with open(tmp, "w") as fid:
+        json.dump(dict(fingerprint=fingerprint), fid)
+    os.replace(tmp, target)
+
+
+class ParallelInstallMixin(HasTraits):
+    jobs = Integer(
+        4,
+        config=True,
+        help="""The number of extensions to resolve and pack concurrently.
+
+        Packed extensions are kept in a tarball cache in the app directory.""",
+    )
+
+    @property
+    def handler_args(self):
+        return dict(app_dir=self.app_dir, logger=self.log, core_config=self.core_config)
+
+
+install_aliases = dict(labextensions.install_aliases)
+install_aliases["jobs"] = "InstallPhoilaExtensionApp.jobs"
+
+
+class InstallPhoilaExtensionApp(
+    ParallelInstallMixin, PhoilaMixin, labextensions.InstallLabExtensionApp
+):
+    aliases = install_aliases
+
+    def run_task(self):
+        pinned_versions = self.pin.split(",") if self.pin else []
+        self.extra_args = self.extra_args or [os.getcwd()]
+        return install_extensions(
+            self.extra_args,
+            pins=pinned_versions,
+            jobs=self.jobs,
+            **self.handler_args
+        )
+
+
+class UpdatePhoilaExtensionApp(
+    ParallelInstallMixin, PhoilaMixin, labextensions.UpdateLabExtensionApp
+):
+    def run_task(self):
+        if not self.all and not self.extra_args:
+            self.log.warn(
+                "Specify an extension to update, or use --all to update all extensions"
+            )
+            return False
+        return update_extensions(
+            None if self.all else self.extra_args,
+            jobs=self.jobs,
+            **self.handler_args
+        )
 
 
 class UninstallPhoilaExtensionApp(PhoilaMixin, labextensions.UninstallLabExtensionApp):
@@ -106,11 +559,100 @@ class CheckLPhoilaxtensionsApp(PhoilaMixin, labextensions.CheckLabExtensionsApp)
     pass
 
 
+build_aliases = dict(labapp.build_aliases)
+build_aliases["profile"] = "PhoilaBuildApp.profile"
+
+build_flags = dict(labapp.build_flags)
+build_flags["force"] = (
+    {"PhoilaBuildApp": {"force": True}},
+    "Build even if the build inputs are unchanged since the last build.",
+)
+build_flags["report"] = (
+    {"PhoilaBuildApp": {"report": True}},
+    "Print a JSON report of bundle sizes and build timings.",
+)
+
+
 class PhoilaBuildApp(PhoilaMixin, labapp.LabBuildApp):
+    aliases = build_aliases
+    flags = build_flags
+
+    force = Bool(
+        False,
+        config=True,
+        help="Build even if the build inputs are unchanged since the last build.",
+    )
+
+    report = Bool(
+        False,
+        config=True,
+        help="""Print a JSON report of the per-chunk and per-package bundle sizes
+        (raw, gzip and brotli), the build phase timings, and the changes since
+        the previous report. The report is also stored in the app directory.
+
+        Brotli sizes are only included if the `brotli` package is installed.""",
+    )
+
     def start(self):
         # Ensure we override the `sys_dir` in lab when building:
         os.environ["JUPYTERLAB_DIR"] = self.app_dir
-        super(PhoilaBuildApp, self).start()
+        if check_profile(
+            self.app_dir, self.profile, core_config=self.core_config, logger=self.log
+        ):
+            self.exit(1)
+        write_build_profile(self.app_dir, self.profile)
+        timer = PhaseTimer()
+        with timer.phase("fingerprint"):
+            fingerprint = build_fingerprint(
+                self.app_dir,
+                core_config=self.core_config,
+                logger=self.log,
+                name=self.name,
+                version=self.version,
+                dev_build=self.dev_build,
+                minimize=self.minimize,
+            )
+        if (
+            not self.force
+            and not self.pre_clean
+            and read_build_fingerprint(self.app_dir) == fingerprint
+        ):
+            self.log.info(
+                "Build inputs unchanged in %s, skipping build "
+                "(use --force to build anyway)",
+                self.app_dir,
+            )
+        else:
+            with timer.phase("build"):
+                super(PhoilaBuildApp, self).start()
+            with timer.phase("app_info_manifest"):
+                write_app_info_manifest(
+                    self.app_dir, core_config=self.core_config, logger=self.log
+                )
+            with timer.phase("theme_bundles"):
+                write_theme_bundles(self.app_dir, themes)
+            write_build_fingerprint(self.app_dir, fingerprint)
+            size = bundle_size(os.path.join(self.app_dir, "static"))
+            self.log.info(
+                'Built the "%s" profile: %d bytes (%d bytes gzipped)',
+                self.profile,
+                size["raw"],
+                size["gzip"],
+            )
+        if self.report:
+            self.write_report(timer.timings)
+
+    def write_report(self, timings):
+        """Print the build report, and store it in the app dir."""
+        info = get_app_info(self.app_dir, logger=self.log, core_config=self.core_config)
+        report = make_report(
+            self.app_dir,
+            timings,
+            extensions=set(info["extensions"]) | set(info["core_extensions"]),
+            previous=read_build_report(self.app_dir),
+        )
+        write_build_report(self.app_dir, report)
+        print(json.dumps(report, indent=2, sort_keys=True))
 
 
 class PhoilaCleanApp(PhoilaMixin, labapp.LabCleanApp):
@@ -0,0 +1,33 @@
+# Copyright (c) Vidar Tonaas Fauske.
+# Distributed under the terms of the Modified BSD License.
+
+"""HTTP handler to drain the server before a restart.
+"""
+
+import json
+
+from tornado import web
+
+from jupyter_server.base.handlers import APIHandler
+
+
+class DrainHandler(APIHandler):
+    @web.authenticated
+    def get(self):
+        """Report the drain status, including remaining sessions."""
+        serverapp = self.settings["serverapp"]
+        self.finish(json.dumps(serverapp.drain_status()))
+
+    @web.authenticated
+    def post(self):
+        """Start draining the server."""
+        self.log.info("Draining on /api/drain request.")
+        serverapp = self.settings["serverapp"]
+        serverapp.drain()
+        self.set_status(202)
+        self.finish(json.dumps(serverapp.drain_status()))
+
+
+default_handlers = [
+    (r"/api/drain", DrainHandler),
+]
@@ -0,0 +1,345 @@
+# Copyright (c) Vidar Tonaas Fauske.
+# Distributed under the terms of the Modified BSD License.
+
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import TemporaryDirectory
+
+from jupyterlab import commands as lab_commands
+from jupyterlab.commands import PIN_PREFIX, _AppHandler, get_app_dir, read_package
+from jupyterlab.semver import max_satisfying
+
+# JupyterLab 1.2 configures app handlers with an options object, while
+# JupyterLab 1.1 takes keyword arguments:
+AppOptions = getattr(lab_commands, "AppOptions", None)
+
+# The cache relies on these private parts of JupyterLab, and installs
+# without it if any of them are missing:
+cache_supported = all(
+    hasattr(_AppHandler, name)
+    for name in ("_extract_package", "_latest_compatible_package_version")
+) and hasattr(lab_commands, "_node_check")
+
+
+CACHE_DIRNAME = "extension_cache"
+CACHE_INDEX = "index.json"
+
+_exact_version = re.compile(r"^\d+\.\d+\.\d+(-[0-9A-Za-z.-]+)?$")
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as fid:
+        for chunk in iter(lambda: fid.read(100 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _split_spec(source):
+    """Split a registry package spec into name and version (or range).
+
+    Returns None for local paths, tarballs and urls.
+    """
+    if os.path.exists(source) or "://" in source or source.endswith(".tgz"):
+        return None
+    idx = source.rfind("@")
+    if idx > 0:
+        return source[:idx], source[idx + 1 :]
+    return source, ""
+
+
+class TarballCache(object):
+    """A content-addressed cache of extension tarballs.
+
+    Tarballs are stored under the sha256 of their content, and indexed by
+    package name and version. Exact versions are served from the cache
+    without touching the network, and if the registry cannot be reached,
+    the best cached version for a package name or range is used, so that
+    extensions can be reinstalled fully offline.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        # Package specs resolved during this process -> "name@version"
+        self._resolved = {}
+
+    @property
+    def index_path(self):
+        return os.path.join(self.directory, CACHE_INDEX)
+
+    def _read_index(self):
+        try:
+            with open(self.index_path) as fid:
+                return json.load(fid)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_index(self, index):
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w") as fid:
+            json.dump(index, fid, indent=2, sort_keys=True)
+        os.replace(tmp, self.index_path)
+
+    def get(self, name, version):
+        """Get the path of a cached tarball, or None if not cached."""
+        key = "%s@%s" % (name, version)
+        with self._lock:
+            digest = self._read_index().get(key)
+            if digest is None:
+                return None
+            path = os.path.join(self.directory, digest + ".tgz")
+            if os.path.exists(path) and _sha256(path) == digest:
+                return path
+            # Missing or corrupt, drop the entry
+            index = self._read_index()
+            index.pop(key, None)
+            self._write_index(index)
+            return None
+
+    def put(self, path, name, version):
+        """Add a tarball to the cache, and return the cached path."""
+        digest = _sha256(path)
+        target = os.path.join(self.directory, digest + ".tgz")
+        with self._lock:
+            if not os.path.exists(self.directory):
+                os.makedirs(self.directory)
+            if not os.path.exists(target):
+                tmp = target + ".tmp"
+                shutil.copyfile(path, tmp)
+                os.replace(tmp, target)
+            index = self._read_index()
+            index["%s@%s" % (name, version)] = digest
+            self._write_index(index)
+        return target
+
+    def versions(self, name):
+        """Get the cached versions of a package."""
+        prefix = name + "@"
+        with self._lock:
+            index = self._read_index()
+        return [key[len(prefix) :] for key in index if key.startswith(prefix)]
+
+    def resolve(self, source, offline=False):
+        """Get the cached tarball for a package spec, or None.
+
+        Unless `offline` is set, only specs that are exact versions, or
+        that were resolved earlier in this process, are looked up.
+        """
+        if source in self._resolved:
+            name, _, version = self._resolved[source].rpartition("@")
+            return self.get(name, version)
+        spec = _split_spec(source)
+        if spec is None:
+            return None
+        name, version = spec
+        if _exact_version.match(version):
+            return self.get(name, version)
+        if not offline:
+            return None
+        best = max_satisfying(self.versions(name), version or "*")
+        if best is None:
+            return None
+        return self.get(name, best)
+
+    def remember(self, source, name, version):
+        """Record what a package spec resolved to."""
+        if _split_spec(source) is not None:
+            self._resolved[source] = "%s@%s" % (name, version)
+
+
+class CachingAppHandler(_AppHandler):
+    """A JupyterLab app handler that packs extensions through a tarball cache."""
+
+    def __init__(
+        self, cache, app_dir=None, logger=None, kill_event=None, core_config=None
+    ):
+        args, kwargs = _app_handler_args(
+            app_dir=app_dir,
+            logger=logger,
+            kill_event=kill_event,
+            core_config=core_config,
+        )
+        super(CachingAppHandler, self).__init__(*args, **kwargs)
+        self.cache = cache
+
+    def _extract_package(self, source, tempdir, pin=None):
+        cached = self.cache.resolve(source)
+        if cached is None:
+            try:
+                info = super(CachingAppHandler, self)._extract_package(
+                    source, tempdir, pin=pin
+                )
+            except ValueError:
+                # Probably offline, fall back to any suitable cached version
+                cached = self.cache.resolve(source, offline=True)
+                if cached is None:
+                    raise
+                self.logger.warning("Using cached tarball for %s", source)
+            else:
+                if not info["is_dir"]:
+                    self.cache.put(info["path"], info["name"], info["version"])
+                    self.cache.remember(source, info["name"], info["version"])
+                return info
+        else:
+            self.logger.info("Using cached tarball for %s", source)
+
+        # Mirror the result of `npm pack` in the temp dir:
+        data = read_package(cached)
+        filename = "%s-%s.tgz" % (
+            data["name"].lstrip("@").replace("/", "-"),
+            data["version"],
+        )
+        if pin:
+            filename = "%s%s.tgz" % (PIN_PREFIX, pin)
+        path = os.path.join(tempdir, filename)
+        shutil.copyfile(cached, path)
+        return dict(
+            source=source,
+            is_dir=False,
+            data=data,
+            path=path,
+            filename=filename,
+            name=data["name"],
+            version=data["version"],
+        )
+
+    def prefetch(self, source):
+        """Pack a package into the cache, unless it is already cached."""
+        if self.cache.resolve(source) is not None:
+            return
+        spec = _split_spec(source)
+        if spec is None:
+            # Local packages are always packed on install
+            return
+        with TemporaryDirectory() as tempdir:
+            self._extract_package(source, tempdir)
+
+
+def _app_handler_args(app_dir=None, logger=None, kill_event=None, core_config=None):
+    """Get the arguments for creating an `_AppHandler`."""
+    kwargs = dict(
+        app_dir=app_dir, logger=logger, kill_event=kill_event, core_config=core_config
+    )
+    if AppOptions is None:
+        return (), kwargs
+    options = AppOptions(**{k: v for k, v in kwargs.items() if v is not None})
+    return (options,), {}
+
+
+def get_tarball_cache(app_dir):
+    """Get the tarball cache of an app dir."""
+    return TarballCache(os.path.join(app_dir, CACHE_DIRNAME))
+
+
+def _prefetch_all(cache, handler_args, jobs, task, items):
+    """Run a prefetch task for all items concurrently.
+
+    Failures are only logged, as the sequential install that follows
+    reports them properly.
+    """
+
+    def run(item):
+        handler = CachingAppHandler(cache, **handler_args)
+        try:
+            task(handler, item)
+        except Exception as e:
+            handler_args["logger"].debug("Prefetching %s failed: %s", item, e)
+
+    with ThreadPoolExecutor(max(1, jobs)) as executor:
+        list(executor.map(run, items))
+
+
+def _handler_args(app_dir, logger, core_config):
+    return dict(
+        app_dir=app_dir or get_app_dir(),
+        logger=logger or logging.getLogger("jupyterlab"),
+        core_config=core_config,
+    )
+
+
+def install_extensions(
+    extensions, pins=None, jobs=4, app_dir=None, logger=None, core_config=None
+):
+    """Install extension packages, packing them concurrently.
+
+    All packages are first resolved and packed into the tarball cache in
+    parallel, and then installed one at a time from the cache.
+
+    Returns `True` if a rebuild is recommended, `False` otherwise.
+    """
+    handler_args = _handler_args(app_dir, logger, core_config)
+    pins = pins or []
+    if not cache_supported:
+        handler_args["logger"].warning(
+            "The extension cache does not support this version of JupyterLab"
+        )
+        return any(
+            [
+                lab_commands.install_extension(
+                    source, pin=pins[i] if i < len(pins) else None, **handler_args
+                )
+                for i, source in enumerate(extensions)
+            ]
+        )
+    lab_commands._node_check(handler_args["logger"])
+    cache = get_tarball_cache(handler_args["app_dir"])
+
+    _prefetch_all(
+        cache, handler_args, jobs, lambda h, source: h.prefetch(source), extensions
+    )
+    return any(
+        [
+            CachingAppHandler(cache, **handler_args).install_extension(
+                source, pin=pins[i] if i < len(pins) else None
+            )
+            for i, source in enumerate(extensions)
+        ]
+    )
+
+
+def update_extensions(
+    names=None, jobs=4, app_dir=None, logger=None, core_config=None
+):
+    """Update extensions by name, or all extensions if `names` is None.
+
+    The latest compatible versions are looked up and packed concurrently.
+
+    Returns `True` if a rebuild is recommended, `False` otherwise.
+    """
+    handler_args = _handler_args(app_dir, logger, core_config)
+    if not cache_supported:
+        handler_args["logger"].warning(
+            "The extension cache does not support this version of JupyterLab"
+        )
+        if names is None:
+            return lab_commands.update_extension(all_=True, **handler_args)
+        return any(
+            [lab_commands.update_extension(name, **handler_args) for name in names]
+        )
+    lab_commands._node_check(handler_args["logger"])
+    cache = get_tarball_cache(handler_args["app_dir"])
+    if names is None:
+        names = list(CachingAppHandler(cache, **handler_args).info["extensions"])
+
+    def prefetch_latest(handler, name):
+        data = handler.info["extensions"].get(name)
+        if data is None or data["alias_package_source"]:
+            return
+        latest = handler._latest_compatible_package_version(name)
+        if latest and latest != data["version"]:
+            handler.prefetch("%s@%s" % (name, latest))
+
+    _prefetch_all(cache, handler_args, jobs, prefetch_latest, names)
+    return any(
+        [
+            CachingAppHandler(cache, **handler_args).update_extension(name)
+            for name in names
+        ]
+    )
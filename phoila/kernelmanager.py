@@ -0,0 +1,242 @@
+# Copyright (c) Vidar Tonaas Fauske.
+# Distributed under the terms of the Modified BSD License.
+
+import json
+import os
+import signal
+import subprocess
+import time
+
+from tornado import gen
+from traitlets import Bool, Unicode, default
+
+from jupyter_server.services.kernels.kernelmanager import MappingKernelManager
+from jupyter_server.utils import check_pid
+
+
+class ReattachedKernelProcess(object):
+    """A stand-in for the Popen object of a kernel started by another server.
+
+    The kernel manager uses it to check whether the kernel is alive, and to
+    signal and kill it, which lets reattached kernels be interrupted and
+    restarted like any other kernel.
+    """
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.returncode = None
+
+    def poll(self):
+        if self.returncode is None:
+            try:
+                # Reap the kernel in case it is our child after all
+                pid, status = os.waitpid(self.pid, os.WNOHANG)
+                if pid:
+                    self.returncode = status
+            except (AttributeError, OSError):
+                pass
+        if self.returncode is None and not check_pid(self.pid):
+            # The exit status of other processes is unknown
+            self.returncode = -1
+        return self.returncode
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.time() + timeout
+        while self.poll() is None:
+            if deadline is not None and time.time() > deadline:
+                raise subprocess.TimeoutExpired(str(self.pid), timeout)
+            time.sleep(0.05)
+        return self.returncode
+
+    def send_signal(self, signum):
+        if self.poll() is None:
+            os.kill(self.pid, signum)
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(getattr(signal, "SIGKILL", signal.SIGTERM))
+
+
+class PhoilaKernelManager(MappingKernelManager):
+    """A kernel manager that can keep kernels alive across server restarts.
+
+    When `persist_kernels` is enabled, kernels are started independently of
+    the server process, and the information needed to reconnect to them is
+    kept in `kernel_store_file`. On shutdown the kernels are left running,
+    and a new server will reattach to any of them that are still alive.
+    """
+
+    persist_kernels = Bool(
+        False,
+        config=True,
+        help="""Keep kernels running when the server stops, and reattach to
+        them when it starts again.
+
+        Kernels that are never reattached are not shut down automatically, so
+        consider also configuring `cull_idle_timeout`.""",
+    )
+
+    kernel_store_file = Unicode(
+        config=True,
+        help="""The file to store the connection information of kernels in,
+        when `persist_kernels` is enabled.""",
+    )
+
+    @default("kernel_store_file")
+    def _default_kernel_store_file(self):
+        return os.path.join(self.connection_dir, "phoila-kernels.json")
+
+    def __init__(self, **kwargs):
+        super(PhoilaKernelManager, self).__init__(**kwargs)
+        self._kernel_entries = {}
+        self._connection_counts = {}
+
+    @gen.coroutine
+    def start_kernel(self, kernel_id=None, path=None, **kwargs):
+        """Start a kernel, recording it in the kernel store if persisting."""
+        new = kernel_id is None
+        if new and self.persist_kernels:
+            # Prevent the kernel from exiting together with the server
+            kwargs["independent"] = True
+        kernel_id = yield gen.maybe_future(
+            super(PhoilaKernelManager, self).start_kernel(
+                kernel_id=kernel_id, path=path, **kwargs
+            )
+        )
+        if new and self.persist_kernels:
+            km = self._kernels[kernel_id]
+            self._kernel_entries[kernel_id] = dict(
+                kernel_id=kernel_id,
+                kernel_name=km.kernel_name,
+                connection_file=km.connection_file,
+                pid=km.kernel.pid,
+                path=path,
+                launch_args=km._launch_args,
+            )
+            self.write_kernel_store()
+        return kernel_id
+
+    def notify_connect(self, kernel_id):
+        super(PhoilaKernelManager, self).notify_connect(kernel_id)
+        self._connection_counts[kernel_id] = (
+            self._connection_counts.get(kernel_id, 0) + 1
+        )
+
+    def notify_disconnect(self, kernel_id):
+        super(PhoilaKernelManager, self).notify_disconnect(kernel_id)
+        count = self._connection_counts.get(kernel_id, 0) - 1
+        if count > 0:
+            self._connection_counts[kernel_id] = count
+        else:
+            self._connection_counts.pop(kernel_id, None)
+
+    def connection_count(self, kernel_id=None):
+        """Get the number of open connections to a kernel, or to all kernels."""
+        if kernel_id is not None:
+            return self._connection_counts.get(kernel_id, 0)
+        return sum(self._connection_counts.values())
+
+    def remove_kernel(self, kernel_id):
+        self._connection_counts.pop(kernel_id, None)
+        km = super(PhoilaKernelManager, self).remove_kernel(kernel_id)
+        if self._kernel_entries.pop(kernel_id, None) is not None:
+            self.write_kernel_store()
+        return km
+
+    def shutdown_all(self, now=False):
+        """Shutdown all kernels, unless they are to be kept for reattachment."""
+        if not self.persist_kernels:
+            return super(PhoilaKernelManager, self).shutdown_all(now=now)
+        self.write_kernel_store()
+        self.log.info(
+            "Keeping %d kernels running for reattachment", len(self._kernel_entries)
+        )
+        for kernel_id in self.list_kernel_ids():
+            km = self._kernels[kernel_id]
+            km.stop_restarter()
+            if getattr(km, "_activity_stream", None) is not None:
+                km._activity_stream.close()
+                km._activity_stream = None
+            self.stop_buffering(kernel_id)
+            # An open control socket keeps the zmq context from terminating
+            close_control_socket = getattr(km, "_close_control_socket", None)
+            if close_control_socket is not None:
+                close_control_socket()
+
+    def reattach_kernels(self):
+        """Reattach to the still running kernels in the kernel store."""
+        if not self.persist_kernels:
+            return
+        for entry in self.read_kernel_store():
+            kernel_id = entry["kernel_id"]
+            if (
+                kernel_id in self
+                or not check_pid(entry["pid"])
+                or not os.path.exists(entry["connection_file"])
+            ):
+                continue
+            constructor_kwargs = {}
+            if self.kernel_spec_manager:
+                constructor_kwargs["kernel_spec_manager"] = self.kernel_spec_manager
+            km = self.kernel_manager_factory(
+                connection_file=entry["connection_file"],
+                parent=self,
+                log=self.log,
+                kernel_name=entry["kernel_name"],
+                **constructor_kwargs
+            )
+            try:
+                km.load_connection_file()
+            except (OSError, ValueError):
+                self.log.warning(
+                    "Could not load connection file for kernel %s",
+                    kernel_id,
+                    exc_info=True,
+                )
+                continue
+            # Let the kernel be interrupted, restarted and shut down as if
+            # it had been started by this server:
+            km.kernel = ReattachedKernelProcess(entry["pid"])
+            km._launch_args = dict(entry.get("launch_args", {}), independent=True)
+            self._kernels[kernel_id] = km
+            self._kernel_connections[kernel_id] = 0
+            self._kernel_entries[kernel_id] = entry
+            self.start_watching_activity(kernel_id)
+            km.start_restarter()
+            self.log.info("Reattached to kernel: %s", kernel_id)
+        # Drop any entries for kernels that are gone
+        self.write_kernel_store()
+        if not self._initialized_culler:
+            self.initialize_culler()
+
+    def read_kernel_store(self):
+        """Read the list of kernel entries from the kernel store."""
+        try:
+            with open(self.kernel_store_file) as f:
+                return json.load(f)["kernels"]
+        except (OSError, ValueError, KeyError):
+            return []
+
+    def write_kernel_store(self):
+        """Write the entries of the current kernels to the kernel store."""
+        for kernel_id, entry in self._kernel_entries.items():
+            # Restarted kernels have new processes
+            km = self._kernels.get(kernel_id)
+            if km is not None and km.has_kernel:
+                entry["pid"] = km.kernel.pid
+        tmp = self.kernel_store_file + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(
+                    {"kernels": list(self._kernel_entries.values())},
+                    f,
+                    indent=2,
+                    sort_keys=True,
+                )
+            os.replace(tmp, self.kernel_store_file)
+        except OSError as e:
+            self.log.error(
+                "Failed to write kernel store to %s: %s", self.kernel_store_file, e
+            )
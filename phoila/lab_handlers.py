@@ -1,27 +1,193 @@
 # Copyright (c) Vidar Tonaas Fauske.
 # Distributed under the terms of the Modified BSD License.
 
-from tornado import web
+import json
+import os
+import urllib
+from collections import OrderedDict
+
+from tornado import gen, web
 
 from jupyter_server.base.handlers import APIHandler, JupyterHandler
 
 from jupyterlab_server.handlers import (
     LabHandler as BaseLabHandler,
     ThemesHandler as BaseThemesHandler,
+    _camelCase,
 )
+from jupyterlab_server.server import url_path_join as ujoin
 from jupyterlab_server.server import FileFindHandler as BaseFileFindHandler
 from jupyterlab_server.workspaces_handler import (
     WorkspacesHandler as BaseWorkspacesHandler,
+    slugify,
 )
 from jupyterlab_server.settings_handler import SettingsHandler as BaseSettingsHandler
 
 
+# The workspace name used by the frontend in single notebook mode
+SINGLE_WORKSPACE = "phoila-single-workspace"
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class PageCache(object):
+    """A cache of rendered lab pages.
+
+    Also holds the parts of the page config that only depend on the lab
+    config, so that they are only computed once. Cached pages are dropped
+    when the page template (i.e. the build) or the page config file changes.
+    """
+
+    def __init__(self, lab_config, base_url, max_entries=128, log=None):
+        self.max_entries = max_entries
+        self.log = log
+        self.template_path = os.path.join(lab_config.templates_dir, "index.html")
+        self.page_config_path = os.path.join(
+            lab_config.app_settings_dir, "page_config.json"
+        )
+        self._pages = OrderedDict()
+        self._stamp = None
+        self._page_config_file = {}
+
+        # Put all our config in page_config
+        static_page_config = {}
+        for name in lab_config.trait_names():
+            static_page_config[_camelCase(name)] = getattr(lab_config, name)
+
+        # Add full versions of all the urls
+        for name in lab_config.trait_names():
+            if not name.endswith("_url"):
+                continue
+            full_name = _camelCase("full_" + name)
+            full_url = ujoin(base_url, getattr(lab_config, name))
+            static_page_config[full_name] = full_url
+        self.static_page_config = static_page_config
+
+    def validate(self):
+        """Drop all cached pages if the template or page config has changed."""
+        stamp = (_mtime(self.template_path), _mtime(self.page_config_path))
+        if stamp == self._stamp:
+            return
+        self._stamp = stamp
+        self._pages.clear()
+        self._page_config_file = {}
+        if stamp[1] is not None:
+            with open(self.page_config_path) as fid:
+                try:
+                    self._page_config_file = json.load(fid)
+                except Exception as e:
+                    if self.log:
+                        self.log.warning(
+                            "Failed to read page config %s: %s",
+                            self.page_config_path,
+                            e,
+                        )
+
+    @property
+    def page_config_file(self):
+        """The contents of the page config file of the app."""
+        return self._page_config_file
+
+    @staticmethod
+    def key(base_url, user, path):
+        """The cache key of a page, separate for each user."""
+        return (base_url, str(user or ""), path)
+
+    def get(self, key):
+        page = self._pages.get(key)
+        if page is not None:
+            self._pages.move_to_end(key)
+        return page
+
+    def put(self, key, page):
+        self._pages[key] = page
+        while len(self._pages) > self.max_entries:
+            self._pages.popitem(last=False)
+
+
 class LabHandler(BaseLabHandler, JupyterHandler):
-    pass
+    """Render the lab page, using a cache of rendered pages."""
+
+    def initialize(self, lab_config, page_cache):
+        super(LabHandler, self).initialize(lab_config)
+        self.page_cache = page_cache
+
+    @web.authenticated
+    @web.removeslash
+    def get(self):
+        # Ensure the xsrf cookie gets set, also when serving a cached page.
+        self.xsrf_token
+
+        self.page_cache.validate()
+        key = self.page_cache.key(self.base_url, self.current_user, self.request.path)
+        page = self.page_cache.get(key)
+        if page is None:
+            page = self.render_page()
+            self.page_cache.put(key, page)
+        self.write(page)
+
+    def render_page(self):
+        # Handle page config data.
+        page_config = self.settings.setdefault("page_config_data", {})
+        terminals = self.settings.get("terminals_available", False)
+        server_root = self.settings.get("server_root_dir", "")
+        server_root = server_root.replace(os.sep, "/")
+
+        page_config.setdefault("terminalsAvailable", terminals)
+        page_config.setdefault("ignorePlugins", [])
+        page_config.setdefault("serverRoot", server_root)
+
+        mathjax_config = self.settings.get("mathjax_config", "TeX-AMS_HTML-full,Safe")
+        page_config.setdefault("mathjaxConfig", mathjax_config)
+        page_config.setdefault("fullMathjaxUrl", self.mathjax_url)
+
+        page_config.update(self.page_cache.static_page_config)
+        page_config.update(self.page_cache.page_config_file)
+
+        return self.render_template("index.html", page_config=page_config)
 
 
 class ThemesHandler(BaseThemesHandler, JupyterHandler):
-    pass
+    """Themes handler that serves the theme bundles from memory.
+
+    When `bundles` are given, the themes url is versioned by the bundle
+    hash, so the bundles can be cached by the browser indefinitely. Other
+    theme files, like images and fonts, are not covered by the hash, and
+    are served from disk as usual.
+    """
+
+    def initialize(self, bundles=None, **kwargs):
+        super(ThemesHandler, self).initialize(**kwargs)
+        self.bundles = bundles or {}
+
+    def get(self, path, include_body=True):
+        bundle = self.bundles.get(path)
+        if bundle is None:
+            return super(ThemesHandler, self).get(path, include_body)
+
+        self.set_header("Content-Type", "text/css; charset=UTF-8")
+        self.set_header("Etag", bundle.etag)
+        self.set_header("Vary", "Accept-Encoding")
+        self.set_header(
+            "Cache-Control", "max-age=%d, public, immutable" % self.CACHE_MAX_AGE
+        )
+        if self.check_etag_header():
+            self.set_status(304)
+            return
+
+        if "gzip" in self.request.headers.get("Accept-Encoding", ""):
+            self.set_header("Content-Encoding", "gzip")
+            data = bundle.gzipped
+        else:
+            data = bundle.data
+        self.set_header("Content-Length", len(data))
+        if include_body:
+            self.write(data)
 
 
 class FileFindHandler(BaseFileFindHandler, JupyterHandler):
@@ -29,13 +195,119 @@ class FileFindHandler(BaseFileFindHandler, JupyterHandler):
 
 
 class WorkspacesHandler(BaseWorkspacesHandler, APIHandler):
+    """Workspaces handler backed by a workspace store.
+
+    The workspace of single notebook mode is kept in a per-user in-memory
+    store instead. See `phoila.workspace_store` for the available stores.
+    """
+
+    def initialize(self, store, single_store, workspaces_url=None):
+        self.store = store
+        self.single_store = single_store
+
+    @property
+    def user_key(self):
+        return str(self.current_user or "")
+
+    @web.authenticated
+    @gen.coroutine
+    def delete(self, space_name):
+        if not space_name:
+            raise web.HTTPError(400, "Workspace name is required for DELETE")
+
+        if space_name == SINGLE_WORKSPACE:
+            deleted = self.single_store.delete(self.user_key, space_name)
+        else:
+            deleted = yield gen.maybe_future(self.store.delete(space_name))
+        if not deleted:
+            raise web.HTTPError(
+                404, "Workspace %r (%r) not found" % (space_name, slugify(space_name))
+            )
+        self.set_status(204)
+
+    @web.authenticated
+    @gen.coroutine
+    def get(self, space_name=""):
+        if not space_name:
+            prefix = slugify("", sign=False)
+            values = yield gen.maybe_future(self.store.list(prefix))
+            workspaces = dict(
+                ids=[workspace["metadata"]["id"] for workspace in values],
+                values=values,
+            )
+            return self.finish(json.dumps(dict(workspaces=workspaces)))
+
+        if space_name == SINGLE_WORKSPACE:
+            workspace = self.single_store.get(self.user_key, space_name)
+        else:
+            workspace = yield gen.maybe_future(self.store.get(space_name))
+        if workspace is None:
+            id = space_name if space_name.startswith("/") else "/" + space_name
+            workspace = dict(data=dict(), metadata=dict(id=id))
+        self.finish(json.dumps(workspace))
+
     @web.authenticated
     def put(self, space_name=""):
-        if space_name == "phoila-single-workspace":
-            self.set_status(204)
+        if not space_name:
+            raise web.HTTPError(400, "Workspace name is required for PUT.")
+
+        raw = self.request.body.strip().decode(u"utf-8")
+
+        # Make sure the data is valid JSON.
+        try:
+            workspace = json.loads(raw)
+        except Exception as e:
+            raise web.HTTPError(400, str(e))
+
+        # Make sure metadata ID matches the workspace name.
+        # Transparently support an optional inital root `/`.
+        metadata_id = workspace["metadata"]["id"]
+        metadata_id = metadata_id if metadata_id.startswith("/") else "/" + metadata_id
+        metadata_id = urllib.parse.unquote(metadata_id)
+        if metadata_id != "/" + space_name:
+            message = "Workspace metadata ID mismatch: expected %r got %r" % (
+                space_name,
+                metadata_id,
+            )
+            raise web.HTTPError(400, message)
+
+        if space_name == SINGLE_WORKSPACE:
+            self.single_store.put(self.user_key, space_name, workspace, raw)
         else:
-            super(WorkspacesHandler, self).put(space_name=space_name)
+            self.store.put(space_name, workspace, raw)
+        self.set_status(204)
 
 
 class SettingsHandler(BaseSettingsHandler, APIHandler):
-    pass
+    def initialize(self, settings_index):
+        self.index = settings_index
+        self.schemas_dir = settings_index.schemas_dir
+        self.settings_dir = settings_index.settings_dir
+
+    @property
+    def overrides(self):
+        return self.index.overrides
+
+    @web.authenticated
+    def get(self, schema_name=""):
+        if schema_name:
+            model, warning = self.index.get_settings(schema_name)
+            if warning:
+                self.log.warning(warning)
+            return self.finish(json.dumps(model))
+
+        body, etag, warnings = self.index.list_settings()
+        if warnings:
+            self.log.warning("\n".join(warnings))
+        self.set_header("Etag", etag)
+        if self.check_etag_header():
+            self.set_status(304)
+            return self.finish()
+        self.finish(body)
+
+    @web.authenticated
+    def put(self, schema_name):
+        try:
+            super(SettingsHandler, self).put(schema_name)
+        finally:
+            self.index.invalidate(schema_name)
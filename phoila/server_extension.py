@@ -15,6 +15,7 @@ from jupyter_server.utils import url_escape
 
 from .lab_handlers import (
     LabHandler,
+    PageCache,
     ThemesHandler,
     FileFindHandler,
     WorkspacesHandler,
@@ -23,7 +24,10 @@ from .lab_handlers import (
 
 from ._version import __version__
 from .app_config import get_app_dir, get_user_settings_dir, get_workspaces_dir, pjoin
-from .commands import APP_DIR_DEFAULT
+from .commands import APP_DIR_DEFAULT, read_app_info_manifest
+from .settings_index import SettingsIndex
+from .themes import load_theme_bundles, read_themes_manifest
+from .workspace_store import MemoryWorkspaceStore, make_workspace_store
 
 HERE = os.path.dirname(__file__)
 
@@ -36,7 +40,8 @@ def load_config(nbapp):
     config = LabConfig(app_url=app_url, tree_url="/voila/tree")
     app_dir = getattr(nbapp, "app_dir", get_app_dir(default=APP_DIR_DEFAULT))
 
-    info = get_app_info(app_dir)
+    # Prefer the manifest written by `phoila build` over a full app dir scan:
+    info = read_app_info_manifest(app_dir) or get_app_info(app_dir)
     static_url = info["staticUrl"]
     user_settings_dir = getattr(
         nbapp,
@@ -64,6 +69,12 @@ def load_config(nbapp):
         config.themes_url = nbapp.override_theme_url
         config.themes_dir = ""
 
+    if config.themes_dir:
+        # Version the themes url by the bundles written by `phoila build`:
+        themes_manifest = read_themes_manifest(config.themes_dir)
+        if themes_manifest:
+            config.themes_url = ujoin(app_url, "api", "themes", themes_manifest["hash"])
+
     if static_url:
         config.static_url = static_url
     else:
@@ -122,17 +133,27 @@ def add_handlers(jupyter_app, config):
         setattr(config, name, value)
 
     lab_settings = {"lab_config": config}
+    page_config = web_app.settings.setdefault('page_config_data', {})
     if jupyter_app.file_to_run:
-        page_config = web_app.settings.setdefault('page_config_data', {})
         page_config.setdefault('notebook_path', jupyter_app.file_to_run)
+    page_config.setdefault(
+        "phoilaRenderWorker", getattr(jupyter_app, "render_worker", False)
+    )
+    page_config.setdefault(
+        "phoilaShareSessions", getattr(jupyter_app, "share_sessions", False)
+    )
 
     handlers = []
 
     # Set up the main page handler and tree handler.
     base_url = web_app.settings.get("base_url", "/")
     app_path = ujoin(base_url, config.app_url)
+    lab_handler_config = {
+        "lab_config": config,
+        "page_cache": PageCache(config, base_url, log=jupyter_app.log),
+    }
     handlers.append(
-        (app_path, LabHandler, {"lab_config": config}) 
+        (app_path, LabHandler, lab_handler_config)
         #  + notebook_path_regex + '?'
     )
     if config.app_url != '/':
@@ -154,7 +175,7 @@ def add_handlers(jupyter_app, config):
     if not jupyter_app.file_to_run:
         # Handle single notebook mode:
         single_mode_path = ujoin(app_path, "single", r".+")
-        handlers.append((single_mode_path, LabHandler, {"lab_config": config}))
+        handlers.append((single_mode_path, LabHandler, lab_handler_config))
 
     # Handle local static assets.
     if config.static_dir:
@@ -170,9 +191,9 @@ def add_handlers(jupyter_app, config):
     # Handle local settings.
     if config.schemas_dir:
         settings_config = {
-            "app_settings_dir": config.app_settings_dir,
-            "schemas_dir": config.schemas_dir,
-            "settings_dir": config.user_settings_dir,
+            "settings_index": SettingsIndex(
+                config.app_settings_dir, config.schemas_dir, config.user_settings_dir
+            )
         }
 
         # Handle requests for the list of settings. Make slash optional.
@@ -188,11 +209,20 @@ def add_handlers(jupyter_app, config):
         # Handle JupyterLab client URLs that include workspaces.
         workspaces_path = ujoin(base_url, config.workspaces_url, r".+")
         if not jupyter_app.file_to_run:
-            handlers.append((workspaces_path, LabHandler, {"lab_config": config}))
+            handlers.append((workspaces_path, LabHandler, lab_handler_config))
 
         workspaces_config = {
             "workspaces_url": config.workspaces_url,
-            "path": config.workspaces_dir,
+            "store": make_workspace_store(
+                getattr(jupyter_app, "workspaces_store", "directory"),
+                config.workspaces_dir,
+                getattr(jupyter_app, "workspaces_write_delay", 0),
+                log=jupyter_app.log,
+                sqlite_file=getattr(jupyter_app, "workspaces_sqlite_file", None),
+            ),
+            "single_store": MemoryWorkspaceStore(
+                getattr(jupyter_app, "single_workspaces_max_bytes", 16 * 1024 * 1024)
+            ),
         }
 
         # Handle requests for the list of workspaces. Make slash optional.
@@ -209,6 +239,10 @@ def add_handlers(jupyter_app, config):
     if config.themes_dir:
         themes_url = ujoin(base_url, config.themes_url)
         themes_path = ujoin(themes_url, "(.*)")
+        themes_manifest = read_themes_manifest(config.themes_dir)
+        bundles = None
+        if themes_manifest and config.themes_url.endswith(themes_manifest["hash"]):
+            bundles = load_theme_bundles(config.themes_dir, themes_url, themes_manifest)
         handlers.append(
             (
                 themes_path,
@@ -217,6 +251,7 @@ def add_handlers(jupyter_app, config):
                     "themes_url": themes_url,
                     "path": config.themes_dir,
                     "no_cache_paths": no_cache_paths,
+                    "bundles": bundles,
                 },
             )
         )
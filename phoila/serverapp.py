@@ -41,6 +41,7 @@
 
 from __future__ import absolute_import, print_function
 
+import asyncio
 import binascii
 import datetime
 import errno
@@ -96,6 +97,11 @@ try:  # PY3
 except ImportError:  # PY2
     from base64 import encodestring as encodebytes
 
+try:  # PY3
+    from urllib.parse import quote
+except ImportError:  # PY2
+    from urllib import quote
+
 
 from jinja2 import Environment, FileSystemLoader
 
@@ -127,6 +133,7 @@ if version_info < (4, 0):
 from tornado import httpserver
 from tornado import web
 from tornado.httputil import url_concat
+from tornado.netutil import bind_sockets, bind_unix_socket
 from tornado.log import LogFormatter, app_log, access_log, gen_log
 
 from jupyter_server import (
@@ -380,6 +387,10 @@ class ServerWebApplication(web.Application):
             server_root_dir=root_dir,
             jinja2_env=env,
             terminals_available=False,  # Set later if terminals are available
+            serverapp=jupyter_app,
+            # drain mode, see ServerApp.drain
+            draining=False,
+            inflight_renders=set(),
         )
 
         # allow custom overrides for the tornado web app.
@@ -630,6 +641,10 @@ flags["allow-root"] = (
     {"ServerApp": {"allow_root": True}},
     _("Allow the server to be run from root user."),
 )
+flags["reuse-port"] = (
+    {"ServerApp": {"reuse_port": True}},
+    _("Listen with SO_REUSEPORT, allowing several servers to share the port."),
+)
 flags["no-browser"] = (
     {"ServerApp": {"open_browser": False}},
     _("Prevent the opening of the default url in the browser."),
@@ -659,6 +674,9 @@ aliases.update(
         "notebook-dir": "ServerApp.root_dir",
         "browser": "ServerApp.browser",
         "pylab": "ServerApp.pylab",
+        "event-loop": "ServerApp.event_loop",
+        "sock": "ServerApp.sock",
+        "sock-mode": "ServerApp.sock_mode",
     }
 )
 
@@ -818,6 +836,34 @@ class ServerApp(JupyterApp):
         8888, config=True, help=_("The port the Jupyter server will listen on.")
     )
 
+    sock = Unicode(
+        u"",
+        config=True,
+        help=_(
+            """The path of a Unix domain socket to listen on instead of a TCP port.
+
+        Useful behind a local reverse proxy. When set, `ip`, `port` and
+        `reuse_port` are ignored."""
+        ),
+    )
+
+    sock_mode = Unicode(
+        "0600",
+        config=True,
+        help=_("The permissions mode (octal) for the Unix domain socket."),
+    )
+
+    reuse_port = Bool(
+        False,
+        config=True,
+        help=_(
+            """Listen with SO_REUSEPORT set, so that several servers can share
+        the same port. This allows starting a new server before the old one
+        has stopped. Disables trying alternative ports (`port_retries`).
+        Not available on all platforms."""
+        ),
+    )
+
     port_retries = Integer(
         50,
         config=True,
@@ -1450,6 +1496,16 @@ class ServerApp(JupyterApp):
         ),
     )
 
+    drain_timeout = Float(
+        300,
+        config=True,
+        help=_(
+            """(sec) The maximum time to wait for in-flight renders and open
+        kernel connections when draining the server before shutting down.
+        Draining is started by SIGUSR2 or a POST request to /api/drain."""
+        ),
+    )
+
     shutdown_no_activity_timeout = Integer(
         0,
         config=True,
@@ -1479,6 +1535,19 @@ class ServerApp(JupyterApp):
         ),
     )
 
+    event_loop = Unicode(
+        "",
+        config=True,
+        help=_(
+            """The asyncio event loop policy to run the server with.
+
+        Either "uvloop" (requires the uvloop package), or the import path of an
+        `asyncio.AbstractEventLoopPolicy` subclass. An empty string (the
+        default) uses the standard asyncio event loop.
+        """
+        ),
+    )
+
     def parse_command_line(self, argv=None):
         super(ServerApp, self).parse_command_line(argv)
 
@@ -1531,6 +1600,30 @@ class ServerApp(JupyterApp):
         logger.parent = self.log
         logger.setLevel(self.log.level)
 
+    def init_event_loop(self):
+        """Install the configured event loop policy.
+
+        This has to happen before anything binds to the current IOLoop,
+        i.e. before the http server starts listening in `init_webapp`.
+        """
+        if not self.event_loop:
+            return
+        name = self.event_loop
+        if name == "uvloop":
+            name = "uvloop.EventLoopPolicy"
+        modulename, _sep, clsname = name.rpartition(".")
+        try:
+            policy_cls = getattr(importlib.import_module(modulename), clsname)
+        except (ImportError, AttributeError, ValueError):
+            self.log.warning(
+                _("Could not load event loop policy %s, using the default loop"),
+                self.event_loop,
+                exc_info=True,
+            )
+            return
+        asyncio.set_event_loop_policy(policy_cls())
+        self.log.info(_("Using event loop policy: %s"), name)
+
     def init_webapp(self):
         """initialize tornado webapp and httpserver"""
         self.tornado_settings["allow_origin"] = self.allow_origin
@@ -1599,6 +1692,13 @@ class ServerApp(JupyterApp):
             self.web_app, ssl_options=ssl_options, xheaders=self.trust_xheaders
         )
 
+        if self.sock:
+            self._bind_unix_socket()
+            return
+        if self.reuse_port:
+            self._bind_reuse_port()
+            return
+
         success = None
         for port in random_ports(self.port, self.port_retries + 1):
             try:
@@ -1630,6 +1730,52 @@ class ServerApp(JupyterApp):
             )
             self.exit(1)
 
+    def _bind_unix_socket(self):
+        """Listen on the configured Unix domain socket."""
+        try:
+            sock = bind_unix_socket(self.sock, mode=int(self.sock_mode, 8))
+        except (socket.error, ValueError) as e:
+            self.log.critical(
+                _("ERROR: could not listen on Unix socket %s: %s"), self.sock, e
+            )
+            self.exit(1)
+        self._sock_inode = os.stat(self.sock).st_ino
+        self.http_server.add_socket(sock)
+
+    def _bind_reuse_port(self):
+        """Listen on the configured port with SO_REUSEPORT set.
+
+        The port is shared with any other process listening with the same
+        option, so no alternative ports are tried.
+        """
+        try:
+            sockets = bind_sockets(self.port, self.ip, reuse_port=True)
+        except (socket.error, ValueError) as e:
+            self.log.critical(
+                _("ERROR: could not listen on port %i with SO_REUSEPORT: %s"),
+                self.port,
+                e,
+            )
+            self.exit(1)
+        # With port 0, the OS picked the port (the same for all the sockets)
+        self.port = sockets[0].getsockname()[1]
+        self.http_server.add_sockets(sockets)
+
+    def remove_unix_socket(self):
+        """Remove the Unix socket file, if we are listening on one.
+
+        Leaves the file alone if another server has since bound to the same
+        path, e.g. when a new server was started while this one was draining.
+        """
+        if not self.sock:
+            return
+        try:
+            if os.stat(self.sock).st_ino == self._sock_inode:
+                os.unlink(self.sock)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+
     @property
     def display_url(self):
         if self.custom_display_url:
@@ -1655,6 +1801,12 @@ class ServerApp(JupyterApp):
 
     def _url(self, ip):
         proto = "https" if self.certfile else "http"
+        if self.sock:
+            return "%s+unix://%s%s" % (
+                proto,
+                quote(self.sock, safe=""),
+                self.base_url,
+            )
         return "%s://%s:%i%s" % (proto, ip, self.port, self.base_url)
 
     def init_terminals(self):
@@ -1670,6 +1822,9 @@ class ServerApp(JupyterApp):
         if hasattr(signal, "SIGINFO"):
             # only on BSD-based systems
             signal.signal(signal.SIGINFO, self._signal_info)
+        if hasattr(signal, "SIGUSR2"):
+            # Windows doesn't support SIGUSR2
+            signal.signal(signal.SIGUSR2, self._signal_drain)
 
     def _handle_sigint(self, sig, frame):
         """SIGINT handler spawns confirmation dialog"""
@@ -1725,6 +1880,10 @@ class ServerApp(JupyterApp):
     def _signal_info(self, sig, frame):
         print(self.notebook_info())
 
+    def _signal_drain(self, sig, frame):
+        self.log.critical(_("received signal %s, draining"), sig)
+        self.io_loop.add_callback_from_signal(self.drain)
+
     def init_components(self):
         """Check the components submodule, and warn if it's unclean"""
         # TODO: this should still check, but now we use bower, not git submodule
@@ -1821,6 +1980,7 @@ class ServerApp(JupyterApp):
             return
         self.init_configurables()
         self.init_components()
+        self.init_event_loop()
         self.init_webapp()
         self.init_terminals()
         self.init_signal()
@@ -1829,6 +1989,75 @@ class ServerApp(JupyterApp):
         self.init_mime_overrides()
         self.init_shutdown_no_activity()
 
+    def drain(self):
+        """Stop taking new work, and stop the server once existing work is done.
+
+        The server refuses new renders, while in-flight renders and open
+        kernel connections are allowed to finish, up to `drain_timeout`
+        seconds. It keeps listening until the in-flight renders are done,
+        so that their pages can still connect to their kernels, and the
+        drain status can be polled.
+        """
+        settings = self.web_app.settings
+        if settings["draining"]:
+            return
+        settings["draining"] = True
+        self._drain_deadline = self.io_loop.time() + self.drain_timeout
+        self.log.info(
+            _("Draining server, shutting down in at most %d seconds."),
+            self.drain_timeout,
+        )
+        self._drain_listening = True
+        self._drain_callback = ioloop.PeriodicCallback(self._check_drained, 1000)
+        self._drain_callback.start()
+        self._check_drained()
+
+    def drain_status(self):
+        """Return a JSONable dict describing the drain state of the server."""
+        settings = self.web_app.settings
+        km = self.kernel_manager
+        # Only the phoila kernel manager counts the kernel connections:
+        connection_count = getattr(km, "connection_count", None)
+        status = {
+            "draining": settings["draining"],
+            "renders": len(settings["inflight_renders"]),
+            "kernels": len(km.list_kernel_ids()),
+            "kernel_connections": connection_count() if connection_count else 0,
+            "remaining_time": None,
+        }
+        if settings["draining"]:
+            status["remaining_time"] = max(
+                0, self._drain_deadline - self.io_loop.time()
+            )
+        return status
+
+    def _check_drained(self):
+        status = self.drain_status()
+        if status["renders"] == 0 and self._drain_listening:
+            self.log.info(_("Renders finished, no longer accepting connections."))
+            self.http_server.stop()
+            self._drain_listening = False
+        if status["renders"] == 0 and status["kernel_connections"] == 0:
+            self.log.info(_("Server drained, shutting down."))
+        elif status["remaining_time"] <= 0:
+            self.log.warning(
+                _(
+                    "Drain timeout reached with %d renders and %d kernel "
+                    "connections remaining, shutting down."
+                ),
+                status["renders"],
+                status["kernel_connections"],
+            )
+        else:
+            self.log.info(
+                _("Draining: %d renders and %d kernel connections remaining."),
+                status["renders"],
+                status["kernel_connections"],
+            )
+            return
+        self._drain_callback.stop()
+        self.stop()
+
     def cleanup_kernels(self):
         """Shutdown all kernels.
 
@@ -1862,6 +2091,7 @@ class ServerApp(JupyterApp):
             "url": self.connection_url,
             "hostname": self.ip if self.ip else "localhost",
             "port": self.port,
+            "sock": self.sock,
             "secure": bool(self.certfile),
             "base_url": self.base_url,
             "token": self.token,
@@ -1955,7 +2185,8 @@ class ServerApp(JupyterApp):
                 uri = self.base_url
             if self.one_time_token:
                 uri = url_concat(uri, {"token": self.one_time_token})
-            if browser:
+            if browser and not self.sock:
+                # Browsers cannot connect to a Unix socket
                 b = lambda: browser.open(
                     url_path_join(self.connection_url, uri),
                     new=self.webbrowser_open_new,
@@ -1988,6 +2219,7 @@ class ServerApp(JupyterApp):
             info(_("Interrupted..."))
         finally:
             self.remove_server_info_file()
+            self.remove_unix_socket()
             self.cleanup_kernels()
 
     def stop(self):
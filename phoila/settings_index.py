@@ -0,0 +1,226 @@
+# Copyright (c) Vidar Tonaas Fauske.
+# Distributed under the terms of the Modified BSD License.
+
+import hashlib
+import json
+import os
+
+from tornado import web
+
+from jupyterlab_server.settings_handler import (
+    SETTINGS_EXTENSION,
+    _get_schema,
+    _get_settings,
+    _get_version,
+    _path,
+)
+
+
+def _mtime(path):
+    """Get the modification time of a path, or None if it does not exist."""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class _Scanner(object):
+    """Find the settings files under a directory, and their modification times.
+
+    Directory listings are cached until the modification time of the
+    directory changes, so rescanning only stats the settings files. Hidden
+    files and directories are skipped, as by the glob of jupyterlab_server.
+    """
+
+    def __init__(self, root_dir, extension):
+        self.root_dir = root_dir
+        self.extension = extension
+        self._listings = {}
+
+    def scan(self):
+        """Get a dict of schema name -> mtime."""
+        found = {}
+        listings = {}
+        if self.root_dir and os.path.isdir(self.root_dir):
+            self._scan_dir(self.root_dir, "", found, listings)
+        # Drop the listings of removed directories
+        self._listings = listings
+        return found
+
+    def _scan_dir(self, path, rel_dir, found, listings):
+        mtime = _mtime(path)
+        if mtime is None:
+            return
+        cached = self._listings.get(path)
+        if cached is None or cached[0] != mtime:
+            try:
+                names = os.listdir(path)
+            except OSError:
+                return
+            dirnames = []
+            filenames = []
+            for name in sorted(names):
+                if name.startswith("."):
+                    continue
+                if os.path.isdir(os.path.join(path, name)):
+                    dirnames.append(name)
+                elif name.endswith(self.extension):
+                    filenames.append(name)
+            cached = (mtime, dirnames, filenames)
+        listings[path] = cached
+        _, dirnames, filenames = cached
+
+        for filename in filenames:
+            file_mtime = _mtime(os.path.join(path, filename))
+            if file_mtime is None:
+                continue
+            # Same naming as jupyterlab_server, e.g.
+            # @jupyterlab/apputils-extension:themes
+            name = ":".join([rel_dir, filename[: -len(self.extension)]])
+            found[name] = file_mtime
+        for dirname in dirnames:
+            sub_dir = dirname if not rel_dir else rel_dir + "/" + dirname
+            self._scan_dir(os.path.join(path, dirname), sub_dir, found, listings)
+
+
+def _version_path(schemas_dir, schema_name):
+    """Get the path of the file `_get_version` reads the version of a schema from."""
+    return os.path.join(
+        os.path.dirname(_path(schemas_dir, schema_name)), "package.json.orig"
+    )
+
+
+class SettingsIndex(object):
+    """An in-process index of settings schemas and user settings.
+
+    Schemas are loaded and validated once, and user settings are parsed and
+    validated once, until the modification time of the underlying files
+    changes. The serialized list of all settings is cached together with
+    an ETag, for as long as no schema, package version or user settings
+    file changes.
+    """
+
+    def __init__(self, app_settings_dir, schemas_dir, settings_dir):
+        self.schemas_dir = schemas_dir
+        self.settings_dir = settings_dir
+        self._overrides_path = os.path.join(app_settings_dir, "overrides.json")
+        self._overrides_mtime = None
+        self._overrides = {}
+        self._schemas = {}
+        self._schema_scanner = _Scanner(schemas_dir, ".json")
+        self._user_scanner = _Scanner(settings_dir, SETTINGS_EXTENSION)
+        self._user_settings = {}
+        self._list_stamp = None
+        self._list_body = None
+        self._list_etag = None
+
+    @property
+    def overrides(self):
+        """The schema default overrides, reloaded if the file changed."""
+        mtime = _mtime(self._overrides_path)
+        if mtime != self._overrides_mtime:
+            self._overrides_mtime = mtime
+            self._overrides = {}
+            if mtime is not None:
+                with open(self._overrides_path) as fid:
+                    try:
+                        self._overrides = json.load(fid)
+                    except Exception:
+                        # Mirror jupyterlab_server: ignore broken overrides
+                        pass
+            # Overrides are baked into the cached schemas:
+            self._schemas.clear()
+            self._user_settings.clear()
+            self._list_stamp = None
+        return self._overrides
+
+    def get_settings(self, schema_name):
+        """Get the settings model for a single schema.
+
+        Returns a tuple of the model and any validation warning for the
+        user settings.
+        """
+        schema_mtime = _mtime(_path(self.schemas_dir, schema_name))
+        if schema_mtime is None:
+            raise web.HTTPError(404, "Schema not found: %s" % schema_name)
+        version_mtime = _mtime(_version_path(self.schemas_dir, schema_name))
+        user_mtime = _mtime(
+            _path(self.settings_dir, schema_name, False, SETTINGS_EXTENSION)
+        )
+        return self._get_settings(
+            schema_name, (schema_mtime, version_mtime), user_mtime
+        )
+
+    def list_settings(self):
+        """Get the serialized list of all settings.
+
+        Returns a tuple of the JSON body, its ETag, and the validation
+        warnings generated if the list had to be rebuilt.
+        """
+        overrides = self.overrides
+        schemas = self._schema_scanner.scan()
+        user = self._user_scanner.scan()
+        # The schemas of a package share its version file:
+        versions = {}
+        for schema_name, mtime in schemas.items():
+            path = _version_path(self.schemas_dir, schema_name)
+            if path not in versions:
+                versions[path] = _mtime(path)
+            schemas[schema_name] = (mtime, versions[path])
+        stamp = (sorted(schemas.items()), sorted(user.items()))
+        if stamp == self._list_stamp:
+            return self._list_body, self._list_etag, []
+
+        settings_list = []
+        warnings = []
+        for schema_name in sorted(schemas):
+            model, warning = self._get_settings(
+                schema_name, schemas[schema_name], user.get(schema_name), overrides
+            )
+            if warning:
+                warnings.append(warning)
+            settings_list.append(model)
+
+        body = json.dumps(dict(settings=settings_list))
+        self._list_stamp = stamp
+        self._list_body = body
+        self._list_etag = '"%s"' % hashlib.sha1(body.encode("utf-8")).hexdigest()
+        return self._list_body, self._list_etag, warnings
+
+    def invalidate(self, schema_name=None):
+        """Drop cached data for a schema, or for all schemas if None."""
+        if schema_name is None:
+            self._schemas.clear()
+            self._user_settings.clear()
+        else:
+            self._schemas.pop(schema_name, None)
+            self._user_settings.pop(schema_name, None)
+        self._list_stamp = None
+
+    def _get_settings(self, schema_name, schema_stamp, user_mtime, overrides=None):
+        """Get the settings model for a schema, using the cache if it is valid.
+
+        The schema stamp is the pair of modification times of the schema,
+        and of the package file its version is read from.
+        """
+        if overrides is None:
+            overrides = self.overrides
+
+        cached = self._schemas.get(schema_name)
+        if cached is None or cached[0] != schema_stamp:
+            schema = _get_schema(self.schemas_dir, schema_name, overrides)
+            version = _get_version(self.schemas_dir, schema_name)
+            cached = self._schemas[schema_name] = (schema_stamp, schema, version)
+        _, schema, version = cached
+
+        key = (schema_stamp, user_mtime)
+        user_cached = self._user_settings.get(schema_name)
+        if user_cached is None or user_cached[0] != key:
+            result = _get_settings(self.settings_dir, schema_name, schema)
+            user_cached = self._user_settings[schema_name] = (key, result)
+        raw, settings, warning = user_cached[1]
+
+        model = dict(
+            id=schema_name, raw=raw, schema=schema, settings=settings, version=version
+        )
+        return model, warning
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) Vidar Tonaas Fauske.
+# Distributed under the terms of the Modified BSD License.
+
+import json
+
+import pytest
+
+from ..build_report import (
+    BUILD_REPORT,
+    PhaseTimer,
+    brotli,
+    make_report,
+    read_build_report,
+    write_build_report,
+)
+
+SIZE_KEYS = {"raw", "gzip", "brotli"}
+
+
+def write_chunk(static_dir, name, sources):
+    """Write a chunk with a source map of the given source -> content."""
+    content = "\n".join(sources.values())
+    (static_dir / name).write_text(content)
+    source_map = dict(
+        version=3,
+        sources=list(sources),
+        sourcesContent=list(sources.values()),
+    )
+    (static_dir / (name + ".map")).write_text(json.dumps(source_map))
+
+
+@pytest.fixture
+def app_dir(tmp_path):
+    static_dir = tmp_path / "static"
+    static_dir.mkdir()
+    write_chunk(
+        static_dir,
+        "main.js",
+        {
+            "webpack:///./node_modules/@scope/a/lib/index.js": "a" * 300,
+            "webpack:///./node_modules/b/index.js": "b" * 100,
+            "webpack:///./build/index.out.js": "c" * 100,
+        },
+    )
+    (static_dir / "style.css").write_text(".a { color: red; }")
+    return tmp_path
+
+
+def test_report_shape(app_dir):
+    report = make_report(str(app_dir), dict(build=1.5), extensions={"@scope/a"})
+    # The report is plain JSON:
+    assert json.loads(json.dumps(report)) == report
+    assert set(report) == {
+        "report_version",
+        "created",
+        "timings",
+        "total",
+        "chunks",
+        "packages",
+        "diff",
+    }
+    assert report["timings"] == dict(build=1.5)
+    assert report["diff"] is None
+
+    assert set(report["chunks"]) == {"main.js", "style.css"}
+    for sizes in report["chunks"].values():
+        assert set(sizes) == SIZE_KEYS
+        assert (sizes["brotli"] is None) == (brotli is None)
+    main = report["chunks"]["main.js"]
+    assert main["raw"] == len("a" * 300 + "b" * 100 + "c" * 100) + 2
+    for key in ("raw", "gzip"):
+        assert report["total"][key] == sum(c[key] for c in report["chunks"].values())
+
+    packages = report["packages"]
+    assert set(packages) == {"@scope/a", "b", "(app)"}
+    for entry in packages.values():
+        assert set(entry) == SIZE_KEYS | {"extension"}
+    assert packages["@scope/a"]["extension"]
+    assert not packages["b"]["extension"]
+    # Package sizes are estimated from their share of the sources:
+    assert packages["@scope/a"]["raw"] == round(main["raw"] * 0.6)
+    assert packages["b"]["raw"] == round(main["raw"] * 0.2)
+
+
+def test_report_diff(app_dir):
+    previous = make_report(str(app_dir), {})
+    static_dir = app_dir / "static"
+    write_chunk(
+        static_dir,
+        "main.js",
+        {"webpack:///./node_modules/b/index.js": "b" * 1000},
+    )
+    (static_dir / "style.css").unlink()
+    write_chunk(static_dir, "1.js", {"webpack:///./node_modules/c/index.js": "c"})
+
+    report = make_report(str(app_dir), {}, previous=previous)
+    diff = report["diff"]
+    assert set(diff) == {"total", "chunks", "packages"}
+    assert diff["total"]["raw"] == report["total"]["raw"] - previous["total"]["raw"]
+    assert diff["chunks"]["style.css"]["status"] == "removed"
+    assert diff["chunks"]["1.js"]["status"] == "added"
+    assert "status" not in diff["chunks"]["main.js"]
+    old_main = previous["chunks"]["main.js"]
+    assert diff["chunks"]["main.js"]["raw"] == 1000 - old_main["raw"]
+    assert diff["packages"]["@scope/a"]["status"] == "removed"
+    assert diff["packages"]["c"]["status"] == "added"
+
+    # Unchanged builds have empty diffs:
+    again = make_report(str(app_dir), {}, previous=report)
+    assert again["diff"]["chunks"] == {}
+    assert again["diff"]["packages"] == {}
+    assert again["diff"]["total"] is None
+
+
+def test_read_write_report(app_dir):
+    assert read_build_report(str(app_dir)) is None
+    report = make_report(str(app_dir), dict(build=1.0))
+    write_build_report(str(app_dir), report)
+    assert read_build_report(str(app_dir)) == report
+
+    report["report_version"] = 0
+    (app_dir / BUILD_REPORT).write_text(json.dumps(report))
+    assert read_build_report(str(app_dir)) is None
+
+
+def test_phase_timer():
+    timer = PhaseTimer()
+    with timer.phase("a"):
+        pass
+    with pytest.raises(ValueError):
+        with timer.phase("b"):
+            raise ValueError()
+    assert set(timer.timings) == {"a", "b"}
+    assert all(t >= 0 for t in timer.timings.values())
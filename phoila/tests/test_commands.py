@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) Vidar Tonaas Fauske.
+# Distributed under the terms of the Modified BSD License.
+
+import io
+import json
+import logging
+import os
+import tarfile
+
+import pytest
+from jupyterlab import labapp
+
+from ..commands import (
+    APP_INFO_MANIFEST,
+    BUILD_FINGERPRINT,
+    InstallPhoilaExtensionApp,
+    PhoilaBuildApp,
+    build_fingerprint,
+    check_profile,
+    profiles,
+    read_app_info_manifest,
+    read_build_profile,
+    read_plugin_tokens,
+    write_app_info_manifest,
+    write_build_profile,
+)
+
+
+def add_extension(app_dir, name, dependencies):
+    """Add an extension tarball to an app dir, as if it was installed."""
+    extensions_dir = app_dir / "extensions"
+    extensions_dir.mkdir(parents=True, exist_ok=True)
+    data = json.dumps(
+        dict(
+            name=name,
+            version="1.0.0",
+            jupyterlab=dict(extension=True),
+            dependencies=dependencies,
+        )
+    ).encode("utf-8")
+    with tarfile.open(str(extensions_dir / ("%s-1.0.0.tgz" % name)), "w:gz") as tar:
+        info = tarfile.TarInfo("package/package.json")
+        info.size = len(data)
+        tar.addfile(info, io.BytesIO(data))
+
+
+def write_source_map(static_dir, sources):
+    """Write a source map with the given package sources to a build dir."""
+    static_dir.mkdir(parents=True, exist_ok=True)
+    source_map = dict(
+        version=3,
+        sources=[
+            "webpack:///./node_modules/%s/lib/index.js" % name for name in sources
+        ],
+        sourcesContent=list(sources.values()),
+    )
+    (static_dir / "main.js.map").write_text(json.dumps(source_map))
+
+
+def test_read_plugin_tokens_from_installed_jupyterlab():
+    packages = ["@jupyterlab/application-extension", "@jupyterlab/docmanager-extension"]
+    tokens = read_plugin_tokens(packages)
+    if not tokens:
+        pytest.skip("The jupyterlab build has no source maps")
+    application = tokens["@jupyterlab/application-extension"]
+    assert "@jupyterlab/application:ILabShell" in application["provides"]
+    assert "@jupyterlab/application:IPaths" in application["provides"]
+    docmanager = tokens["@jupyterlab/docmanager-extension"]
+    assert docmanager["provides"] == ["@jupyterlab/docmanager:IDocumentManager"]
+    assert "@jupyterlab/coreutils:ISettingRegistry" in docmanager["requires"]
+
+
+def test_read_plugin_tokens(tmp_path):
+    write_source_map(
+        tmp_path / "static",
+        {
+            "a-extension": "const plugin = { provides: IOverridden };",
+            "b-extension": "\n".join(
+                [
+                    "import { IFoo, Ns as Alias } from 'b';",
+                    "import { IBar } from './tokens';",
+                    "export const ILocal = new Token('b-extension:ILocal');",
+                    "const plugin = {",
+                    "    provides: Alias.IProvided,",
+                    "    requires: [IFoo, ILocal],",
+                    "    optional: [IBar],",
+                    "};",
+                ]
+            ),
+            "c-extension": "const plugin = { provides: IUnknown };",
+        },
+    )
+    # Installed package sources take precedence over the build's source maps:
+    lib_dir = tmp_path / "app" / "staging" / "node_modules" / "a-extension" / "lib"
+    lib_dir.mkdir(parents=True)
+    (lib_dir / "index.js").write_text(
+        "import { IFoo } from 'a';\nconst plugin = { provides: IFoo };"
+    )
+    tokens = read_plugin_tokens(
+        ["a-extension", "b-extension", "c-extension", "d-extension"],
+        app_dir=str(tmp_path / "app"),
+        static_dir=str(tmp_path / "static"),
+    )
+    assert tokens == {
+        "a-extension": dict(provides=["a:IFoo"], requires=[]),
+        "b-extension": dict(
+            provides=["b:IProvided"], requires=["b-extension:ILocal", "b:IFoo"]
+        ),
+        "c-extension": dict(provides=[], requires=[]),
+    }
+
+
+def test_check_profile_passes(tmp_path):
+    app_dir = tmp_path / "app"
+    add_extension(app_dir, "my-extension", {"@jupyterlab/apputils": "^1.0.0"})
+    assert check_profile(str(app_dir), "minimal") == []
+
+
+def test_check_profile_finds_pruned_dependencies(tmp_path, caplog):
+    app_dir = tmp_path / "app"
+    add_extension(app_dir, "my-extension", {"@jupyterlab/filebrowser": "^1.0.0"})
+    logger = logging.getLogger("phoila-test")
+    problems = check_profile(str(app_dir), "minimal", logger=logger)
+    assert problems == ["my-extension depends on @jupyterlab/filebrowser"]
+    assert "@jupyterlab/filebrowser" in caplog.text
+
+
+def test_check_profile_finds_lost_tokens(tmp_path):
+    (pruned,) = [e for e in profiles["minimal"]["extensions"] if "docmanager" in e]
+    write_source_map(
+        tmp_path / "static",
+        {
+            pruned: "import { IDocumentManager } from '@jupyterlab/docmanager';\n"
+            "const plugin = { provides: IDocumentManager };",
+            "@jupyterlab/application-extension": "import { IDocumentManager } "
+            "from '@jupyterlab/docmanager';\n"
+            "const plugin = { requires: [IDocumentManager] };",
+        },
+    )
+    problems = check_profile(
+        str(tmp_path / "app"), "minimal", static_dir=str(tmp_path / "static")
+    )
+    assert problems == [
+        "@jupyterlab/application-extension requires "
+        "@jupyterlab/docmanager:IDocumentManager"
+    ]
+
+
+def test_build_exits_on_profile_problems(tmp_path, monkeypatch):
+    app_dir = tmp_path / "app"
+    # The build app sets this, so make sure it is restored afterwards:
+    monkeypatch.setenv("JUPYTERLAB_DIR", str(app_dir))
+    add_extension(app_dir, "my-extension", {"@jupyterlab/filebrowser": "^1.0.0"})
+    app = PhoilaBuildApp(app_dir=str(app_dir), profile="minimal")
+    with pytest.raises(SystemExit) as info:
+        app.start()
+    assert info.value.code == 1
+    assert read_build_profile(str(app_dir)) is None
+
+
+def test_build_profile_is_reused(tmp_path):
+    app_dir = str(tmp_path / "app")
+    assert read_build_profile(app_dir) is None
+    assert InstallPhoilaExtensionApp(app_dir=app_dir).profile == "full"
+
+    write_build_profile(app_dir, "minimal")
+    assert read_build_profile(app_dir) == "minimal"
+    app = InstallPhoilaExtensionApp(app_dir=app_dir)
+    assert app.profile == "minimal"
+    assert "@jupyterlab/filebrowser" not in app.core_config.singletons
+    assert InstallPhoilaExtensionApp(app_dir=app_dir, profile="full").profile == "full"
+
+
+def test_write_build_profile_keeps_build_config(tmp_path):
+    settings_dir = tmp_path / "settings"
+    settings_dir.mkdir()
+    config_file = settings_dir / "build_config.json"
+    config_file.write_text(json.dumps({"linked_packages": {"a": "/a"}}))
+    write_build_profile(str(tmp_path), "minimal")
+    assert json.loads(config_file.read_text()) == {
+        "linked_packages": {"a": "/a"},
+        "phoila_profile": "minimal",
+    }
+    mtime = config_file.stat().st_mtime_ns
+    write_build_profile(str(tmp_path), "minimal")
+    assert config_file.stat().st_mtime_ns == mtime
+
+
+@pytest.fixture
+def built_app_dir(tmp_path):
+    """An app dir with the files the app-info manifest depends on."""
+    app_dir = tmp_path / "app"
+    add_extension(app_dir, "my-extension", {})
+    (app_dir / "settings").mkdir()
+    (app_dir / "settings" / "page_config.json").write_text("{}")
+    (app_dir / "settings" / "build_config.json").write_text("{}")
+    (app_dir / "static").mkdir()
+    (app_dir / "static" / "package.json").write_text(
+        json.dumps(
+            dict(
+                name="@jupyterlab/application-top",
+                version="1.0.0",
+                jupyterlab=dict(version="1.0.0", staticUrl="/phoila/static"),
+            )
+        )
+    )
+    return app_dir
+
+
+def make_newer(path, than):
+    """Set the modification time of a path to after that of another path."""
+    mtime = os.stat(str(than)).st_mtime_ns + 10 ** 9
+    os.utime(str(path), ns=(mtime, mtime))
+
+
+def test_app_info_manifest_is_used(built_app_dir):
+    manifest = write_app_info_manifest(str(built_app_dir))
+    assert manifest["extensions"] == {"my-extension": "1.0.0"}
+    assert manifest["staticUrl"] == "/phoila/static"
+    assert read_app_info_manifest(str(built_app_dir)) == manifest
+
+
+@pytest.mark.parametrize(
+    "changed",
+    [
+        "extensions",
+        "settings/page_config.json",
+        "settings/build_config.json",
+        "static/package.json",
+    ],
+)
+def test_app_info_manifest_falls_back_on_changes(built_app_dir, changed):
+    write_app_info_manifest(str(built_app_dir))
+    make_newer(built_app_dir / changed, than=built_app_dir / APP_INFO_MANIFEST)
+    assert read_app_info_manifest(str(built_app_dir)) is None
+
+
+def test_app_info_manifest_needs_build_output(built_app_dir):
+    write_app_info_manifest(str(built_app_dir))
+    os.remove(str(built_app_dir / "static" / "package.json"))
+    assert read_app_info_manifest(str(built_app_dir)) is None
+
+
+@pytest.mark.parametrize("key", ["manifest_version", "phoila_version", "lab_version"])
+def test_app_info_manifest_rejects_other_versions(built_app_dir, key):
+    manifest = write_app_info_manifest(str(built_app_dir))
+    manifest[key] = "0.0.0"
+    target = built_app_dir / APP_INFO_MANIFEST
+    target.write_text(json.dumps(manifest))
+    make_newer(target, than=built_app_dir / "static" / "package.json")
+    assert read_app_info_manifest(str(built_app_dir)) is None
+
+
+@pytest.fixture
+def lab_builds(monkeypatch):
+    """Record the JupyterLab builds, writing only a minimal build output."""
+    builds = []
+
+    def start(self):
+        builds.append(self.app_dir)
+        static_dir = os.path.join(self.app_dir, "static")
+        os.makedirs(static_dir, exist_ok=True)
+        os.makedirs(os.path.join(self.app_dir, "themes"), exist_ok=True)
+        for name in ("package.json", "index.html"):
+            with open(os.path.join(static_dir, name), "w") as fid:
+                fid.write("{}")
+
+    monkeypatch.setattr(labapp.LabBuildApp, "start", start)
+    return builds
+
+
+def build(app_dir, *argv):
+    app = PhoilaBuildApp()
+    app.initialize(["--app-dir=%s" % app_dir] + list(argv))
+    app.start()
+
+
+def test_build_fingerprint(tmp_path):
+    app_dir = str(tmp_path / "app")
+    fingerprint = build_fingerprint(app_dir, minimize=True)
+    assert build_fingerprint(app_dir, minimize=True) == fingerprint
+    assert build_fingerprint(app_dir, minimize=False) != fingerprint
+    add_extension(tmp_path / "app", "my-extension", {})
+    assert build_fingerprint(app_dir, minimize=True) != fingerprint
+
+
+def test_build_skipped_when_unchanged(tmp_path, monkeypatch, lab_builds):
+    app_dir = tmp_path / "app"
+    monkeypatch.setenv("JUPYTERLAB_DIR", str(app_dir))
+    build(app_dir)
+    assert lab_builds == [str(app_dir)]
+    assert (app_dir / BUILD_FINGERPRINT).exists()
+
+    build(app_dir)
+    assert len(lab_builds) == 1
+
+    # Changed inputs are built:
+    add_extension(app_dir, "my-extension", {})
+    build(app_dir)
+    assert len(lab_builds) == 2
+
+    # A missing build output is rebuilt:
+    os.remove(str(app_dir / "static" / "index.html"))
+    build(app_dir)
+    assert len(lab_builds) == 3
+    build(app_dir)
+    assert len(lab_builds) == 3
+
+
+def test_build_force(tmp_path, monkeypatch, lab_builds):
+    app_dir = tmp_path / "app"
+    monkeypatch.setenv("JUPYTERLAB_DIR", str(app_dir))
+    build(app_dir)
+    build(app_dir, "--force")
+    assert len(lab_builds) == 2
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) Vidar Tonaas Fauske.
+# Distributed under the terms of the Modified BSD License.
+
+import logging
+
+from ..extension_cache import (
+    CachingAppHandler,
+    cache_supported,
+    get_tarball_cache,
+)
+
+
+def make_tarball(path, content):
+    with open(str(path), "wb") as fid:
+        fid.write(content)
+    return str(path)
+
+
+def test_cache_supports_installed_jupyterlab():
+    assert cache_supported
+
+
+def test_caching_app_handler(tmp_path):
+    app_dir = str(tmp_path / "app")
+    cache = get_tarball_cache(app_dir)
+    logger = logging.getLogger("phoila-test")
+    handler = CachingAppHandler(cache, app_dir=app_dir, logger=logger)
+    assert handler.cache is cache
+    assert handler.app_dir == app_dir
+    assert handler.logger is logger
+    assert handler.info["extensions"] == {}
+
+
+def test_tarball_cache_exact_versions(tmp_path):
+    cache = get_tarball_cache(str(tmp_path / "app"))
+    source = make_tarball(tmp_path / "a.tgz", b"a")
+    cached = cache.put(source, "@scope/pkg", "1.0.0")
+    assert cache.get("@scope/pkg", "1.0.0") == cached
+    assert cache.resolve("@scope/pkg@1.0.0") == cached
+    assert cache.get("@scope/pkg", "1.0.1") is None
+
+
+def test_tarball_cache_ranges(tmp_path):
+    cache = get_tarball_cache(str(tmp_path / "app"))
+    old = cache.put(make_tarball(tmp_path / "a.tgz", b"a"), "pkg", "1.0.0")
+    new = cache.put(make_tarball(tmp_path / "b.tgz", b"b"), "pkg", "1.2.0")
+    # Ranges are only resolved from the cache when offline, or once they
+    # have been resolved during this process:
+    assert cache.resolve("pkg@^1.0.0") is None
+    assert cache.resolve("pkg@^1.0.0", offline=True) == new
+    assert cache.resolve("pkg@~1.0.0", offline=True) == old
+    cache.remember("pkg@~1.0.0", "pkg", "1.0.0")
+    assert cache.resolve("pkg@~1.0.0") == old
+
+
+def test_tarball_cache_drops_corrupt_entries(tmp_path):
+    cache = get_tarball_cache(str(tmp_path / "app"))
+    cached = cache.put(make_tarball(tmp_path / "a.tgz", b"a"), "pkg", "1.0.0")
+    make_tarball(cached, b"corrupt")
+    assert cache.get("pkg", "1.0.0") is None
+    assert cache.versions("pkg") == []
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) Vidar Tonaas Fauske.
+# Distributed under the terms of the Modified BSD License.
+
+from tornado import gen
+from tornado.ioloop import IOLoop
+
+from ..kernelmanager import PhoilaKernelManager
+
+
+def run_sync(result):
+    return IOLoop.current().run_sync(lambda: gen.maybe_future(result))
+
+
+def make_manager(tmp_path):
+    return PhoilaKernelManager(
+        persist_kernels=True,
+        kernel_store_file=str(tmp_path / "kernels.json"),
+        connection_dir=str(tmp_path),
+        root_dir=str(tmp_path),
+    )
+
+
+def test_reattached_kernel_interrupt_and_restart(tmp_path):
+    first = make_manager(tmp_path)
+    kernel_id = run_sync(first.start_kernel(path=""))
+    second = make_manager(tmp_path)
+    try:
+        first.shutdown_all()
+
+        second.reattach_kernels()
+        assert second.list_kernel_ids() == [kernel_id]
+        km = second.get_kernel(kernel_id)
+        old_pid = km.kernel.pid
+        assert km.is_alive()
+
+        second.interrupt_kernel(kernel_id)
+        assert km.is_alive()
+
+        run_sync(second.restart_kernel(kernel_id))
+        assert km.is_alive()
+        assert km.kernel.pid != old_pid
+
+        second.write_kernel_store()
+        (entry,) = second.read_kernel_store()
+        assert entry["pid"] == km.kernel.pid
+    finally:
+        # Shut the kernel down with whichever manager got to own it:
+        manager = second if kernel_id in second else first
+        run_sync(manager.shutdown_kernel(kernel_id, now=True))
+        if kernel_id in first:
+            first.remove_kernel(kernel_id)
+    assert second.read_kernel_store() == []
+
+
+def test_connection_count(tmp_path):
+    manager = make_manager(tmp_path)
+    assert manager.connection_count() == 0
+    manager.notify_connect("a")
+    manager.notify_connect("a")
+    manager.notify_connect("b")
+    assert manager.connection_count("a") == 2
+    assert manager.connection_count() == 3
+    manager.notify_disconnect("a")
+    manager.notify_disconnect("b")
+    assert manager.connection_count("a") == 1
+    assert manager.connection_count("b") == 0
+    assert manager.connection_count() == 1
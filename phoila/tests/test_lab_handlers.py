@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) Vidar Tonaas Fauske.
+# Distributed under the terms of the Modified BSD License.
+
+import json
+import os
+
+import pytest
+from jupyterlab_server import LabConfig
+
+from ..lab_handlers import PageCache
+
+
+def touch(path):
+    stat = os.stat(str(path))
+    os.utime(str(path), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+@pytest.fixture
+def lab_config(tmp_path):
+    templates_dir = tmp_path / "static"
+    settings_dir = tmp_path / "settings"
+    templates_dir.mkdir()
+    settings_dir.mkdir()
+    (templates_dir / "index.html").write_text("<html></html>")
+    (settings_dir / "page_config.json").write_text(json.dumps({"a": 1}))
+    return LabConfig(
+        templates_dir=str(templates_dir), app_settings_dir=str(settings_dir)
+    )
+
+
+@pytest.fixture
+def cache(lab_config):
+    cache = PageCache(lab_config, "/base/")
+    cache.validate()
+    return cache
+
+
+def test_page_cache_static_page_config(cache):
+    assert cache.static_page_config["appSettingsDir"].endswith("settings")
+    assert cache.page_config_file == {"a": 1}
+
+
+def test_page_cache_key_isolates_users(cache):
+    alice = PageCache.key("/base/", "alice", "/base/lab")
+    bob = PageCache.key("/base/", "bob", "/base/lab")
+    assert alice != bob
+    cache.put(alice, "alice page")
+    assert cache.get(alice) == "alice page"
+    assert cache.get(bob) is None
+    assert PageCache.key("/base/", None, "/lab") == ("/base/", "", "/lab")
+
+
+@pytest.mark.parametrize(
+    "changed", ["static/index.html", "settings/page_config.json"]
+)
+def test_page_cache_invalidation(cache, tmp_path, changed):
+    key = PageCache.key("/base/", "alice", "/base/lab")
+    cache.put(key, "page")
+    cache.validate()
+    assert cache.get(key) == "page"
+
+    (tmp_path / "settings" / "page_config.json").write_text(json.dumps({"a": 2}))
+    touch(tmp_path / changed)
+    cache.validate()
+    assert cache.get(key) is None
+    assert cache.page_config_file == {"a": 2}
+
+
+def test_page_cache_lru_eviction(lab_config):
+    cache = PageCache(lab_config, "/base/", max_entries=2)
+    cache.validate()
+    cache.put("a", "page a")
+    cache.put("b", "page b")
+    assert cache.get("a") == "page a"
+    cache.put("c", "page c")
+    assert cache.get("b") is None
+    assert cache.get("a") == "page a"
+    assert cache.get("c") == "page c"
@@ -0,0 +1,385 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) Vidar Tonaas Fauske.
+# Distributed under the terms of the Modified BSD License.
+
+import asyncio
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+import nbformat
+import pytest
+from nbformat.v4 import new_code_cell, new_notebook
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop
+from tornado.websocket import websocket_connect
+
+from ..serverapp import ServerApp
+
+
+class RecordingEventLoopPolicy(asyncio.DefaultEventLoopPolicy):
+    """The default event loop policy, recording that it created a loop.
+
+    The loop is recorded in the file named by `PHOILA_TEST_LOOP_MARKER`.
+    """
+
+    def new_event_loop(self):
+        marker = os.environ.get("PHOILA_TEST_LOOP_MARKER")
+        if marker:
+            with open(marker, "w") as fid:
+                fid.write(type(self).__name__)
+        return super(RecordingEventLoopPolicy, self).new_event_loop()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """An HTTP connection over a Unix domain socket."""
+
+    def __init__(self, sock_path, timeout=30):
+        super(UnixHTTPConnection, self).__init__("localhost", timeout=timeout)
+        self.sock_path = sock_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.sock_path)
+
+
+def unix_get(sock_path, path):
+    conn = UnixHTTPConnection(sock_path)
+    try:
+        conn.request("GET", path)
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
+
+
+def wait_for_server(ping, proc, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("The server exited with code %s" % proc.returncode)
+        try:
+            ping()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("The server did not start within %s seconds" % timeout)
+
+
+def start_server(notebook_dir, tmp_path, *args, env=None, sock=None):
+    """Start a phoila server in a subprocess, and wait for it to listen.
+
+    The server listens on a free port, or on the Unix socket `sock`.
+    """
+    port = free_port()
+    env = dict(
+        os.environ,
+        JUPYTER_CONFIG_DIR=str(tmp_path / "config"),
+        JUPYTER_RUNTIME_DIR=str(tmp_path / "runtime"),
+        **(env or {})
+    )
+    if sock:
+        args = ("--ServerApp.sock=%s" % sock,) + args
+        ping = lambda: unix_get(sock, "/api/status")
+    else:
+        ping = lambda: urlopen(server_url(port) + "api/status").close()
+    log_path = tmp_path / "server.log"
+    with open(str(log_path), "w") as log:
+        proc = subprocess.Popen(
+            [
+                sys.executable,
+                "-c",
+                "from phoila.app import main; main()",
+                "--no-browser",
+                "--allow-root",
+                "--ip=127.0.0.1",
+                "--port=%d" % port,
+                "--port-retries=0",
+                "--ServerApp.token=",
+                "--ServerApp.root_dir=%s" % notebook_dir,
+            ]
+            + list(args),
+            cwd=str(notebook_dir),
+            env=env,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+    try:
+        wait_for_server(ping, proc)
+    except Exception:
+        stop_server(proc)
+        raise
+    return proc, port, log_path
+
+
+def server_url(port):
+    return "http://127.0.0.1:%d/" % port
+
+
+def stop_server(proc):
+    if proc.poll() is None:
+        proc.terminate()
+    proc.wait(30)
+
+
+def drain_status(url, method="GET"):
+    data = b"" if method == "POST" else None
+    request = Request(url + "api/drain", data=data, method=method)
+    with urlopen(request, timeout=30) as response:
+        return response.status, json.loads(response.read().decode("utf-8"))
+
+
+def wait_for(condition, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        value = condition()
+        if value:
+            return value
+        time.sleep(0.2)
+    raise RuntimeError("Timed out after %s seconds" % timeout)
+
+
+async def kernel_info(ws_url):
+    conn = await websocket_connect(ws_url)
+    try:
+        msg_id = uuid.uuid4().hex
+        conn.write_message(
+            json.dumps(
+                {
+                    "header": {
+                        "msg_id": msg_id,
+                        "msg_type": "kernel_info_request",
+                        "username": "test",
+                        "session": uuid.uuid4().hex,
+                        "version": "5.3",
+                    },
+                    "parent_header": {},
+                    "metadata": {},
+                    "content": {},
+                    "channel": "shell",
+                    "buffers": [],
+                }
+            )
+        )
+        while True:
+            raw = await conn.read_message()
+            if raw is None:
+                raise RuntimeError("The kernel websocket closed")
+            msg = json.loads(raw)
+            if msg.get("parent_header", {}).get("msg_id") == msg_id and (
+                msg["msg_type"] == "kernel_info_reply"
+            ):
+                return msg
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def notebook_dir(tmp_path):
+    nb = new_notebook(cells=[new_code_cell('print("hello from the kernel")')])
+    nbformat.write(nb, str(tmp_path / "test.ipynb"))
+    nb = new_notebook(
+        cells=[new_code_cell('import time\ntime.sleep(5)\nprint("slept")')]
+    )
+    nbformat.write(nb, str(tmp_path / "slow.ipynb"))
+    return tmp_path
+
+
+@pytest.mark.parametrize(
+    "event_loop",
+    [
+        "phoila.tests.test_serverapp.RecordingEventLoopPolicy",
+        "uvloop",
+    ],
+)
+def test_event_loop_policy(notebook_dir, tmp_path, event_loop):
+    if event_loop == "uvloop":
+        pytest.importorskip("uvloop")
+    marker = tmp_path / "loop-marker"
+    proc, port, log_path = start_server(
+        notebook_dir,
+        tmp_path,
+        "--ServerApp.event_loop=%s" % event_loop,
+        env=dict(PHOILA_TEST_LOOP_MARKER=str(marker)),
+    )
+    url = server_url(port)
+    try:
+        with urlopen(url + "voila/render/test.ipynb", timeout=60) as response:
+            body = response.read().decode("utf-8")
+        records = [json.loads(line) for line in body.splitlines() if line.strip()]
+        kernel_id = records[0]["kernelId"]
+        assert any("hello from the kernel" in json.dumps(r) for r in records[1:])
+
+        ws_url = "ws://127.0.0.1:%d/api/kernels/%s/channels" % (port, kernel_id)
+        reply = IOLoop.current().run_sync(lambda: kernel_info(ws_url), timeout=60)
+        assert reply["content"]["status"] == "ok"
+    finally:
+        stop_server(proc)
+
+    with open(str(log_path)) as log:
+        assert "Using event loop policy" in log.read()
+    if event_loop != "uvloop":
+        assert marker.read_text() == "RecordingEventLoopPolicy"
+
+
+def test_drain_waits_for_renders(notebook_dir, tmp_path):
+    proc, port, log_path = start_server(
+        notebook_dir,
+        tmp_path,
+        "--ServerApp.disable_check_xsrf=True",
+        "--ServerApp.drain_timeout=60",
+    )
+    url = server_url(port)
+    try:
+        status, data = drain_status(url)
+        assert status == 200
+        assert data == {
+            "draining": False,
+            "renders": 0,
+            "kernels": 0,
+            "kernel_connections": 0,
+            "remaining_time": None,
+        }
+
+        bodies = []
+
+        def render():
+            with urlopen(url + "voila/render/slow.ipynb", timeout=60) as response:
+                bodies.append(response.read().decode("utf-8"))
+
+        thread = threading.Thread(target=render)
+        thread.start()
+        wait_for(lambda: drain_status(url)[1]["renders"] == 1)
+
+        status, data = drain_status(url, "POST")
+        assert status == 202
+        assert data["draining"]
+        assert data["renders"] == 1
+        assert 0 < data["remaining_time"] <= 60
+
+        # New renders are refused:
+        with pytest.raises(HTTPError) as info:
+            urlopen(url + "voila/render/test.ipynb", timeout=60)
+        assert info.value.code == 503
+
+        # The in-flight render finishes, after which the server stops:
+        thread.join(60)
+        assert "slept" in bodies[0]
+        proc.wait(30)
+    finally:
+        stop_server(proc)
+    with open(str(log_path)) as log:
+        assert "Server drained, shutting down." in log.read()
+
+
+def test_closed_render_connection_is_not_in_flight(notebook_dir, tmp_path):
+    proc, port, log_path = start_server(notebook_dir, tmp_path)
+    url = server_url(port)
+    try:
+        response = urlopen(url + "voila/render/slow.ipynb", timeout=60)
+        response.readline()
+        assert drain_status(url)[1]["renders"] == 1
+        response.close()
+        wait_for(lambda: drain_status(url)[1]["renders"] == 0)
+    finally:
+        stop_server(proc)
+
+
+def test_drain_waits_for_kernel_connections(notebook_dir, tmp_path):
+    proc, port, log_path = start_server(
+        notebook_dir,
+        tmp_path,
+        "--ServerApp.disable_check_xsrf=True",
+        "--ServerApp.drain_timeout=60",
+    )
+    url = server_url(port)
+    loop = IOLoop.current()
+    try:
+        with urlopen(url + "voila/render/test.ipynb", timeout=60) as response:
+            kernel_id = json.loads(response.readline().decode("utf-8"))["kernelId"]
+            response.read()
+        ws_url = "ws://127.0.0.1:%d/api/kernels/%s/channels" % (port, kernel_id)
+        conn = loop.run_sync(lambda: websocket_connect(ws_url), timeout=60)
+        try:
+            assert drain_status(url)[1]["kernel_connections"] == 1
+            status, data = drain_status(url, "POST")
+            assert data["renders"] == 0
+            assert data["kernel_connections"] == 1
+            # The server keeps running while the kernel connection is open:
+            loop.run_sync(lambda: asyncio.sleep(3))
+            assert proc.poll() is None
+        finally:
+            conn.close()
+        loop.run_sync(lambda: asyncio.sleep(0.5))
+        proc.wait(30)
+    finally:
+        stop_server(proc)
+
+
+def test_unix_socket(notebook_dir, tmp_path):
+    sock = str(tmp_path / "phoila.sock")
+    proc, port, log_path = start_server(notebook_dir, tmp_path, sock=sock)
+    try:
+        assert os.stat(sock).st_mode & 0o777 == 0o600
+        status, body = unix_get(sock, "/api/status")
+        assert status == 200
+        assert "started" in json.loads(body.decode("utf-8"))
+        # Nothing listens on the TCP port:
+        with pytest.raises(URLError):
+            urlopen(server_url(port) + "api/status", timeout=5)
+    finally:
+        stop_server(proc)
+    assert not os.path.exists(sock)
+
+
+def test_remove_unix_socket_keeps_replaced_socket(tmp_path):
+    sock = str(tmp_path / "phoila.sock")
+    app = ServerApp(sock=sock)
+    app.http_server = HTTPServer(lambda request: None)
+    app._bind_unix_socket()
+    # Another server binds to the same path while this one is draining:
+    os.unlink(sock)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as other:
+        other.bind(sock)
+        app.http_server.stop()
+        app.remove_unix_socket()
+        assert os.path.exists(sock)
+    os.unlink(sock)
+    # A missing socket file is fine:
+    app.remove_unix_socket()
+
+
+def test_reuse_port_with_port_zero():
+    apps = []
+    try:
+        for _ in range(2):
+            port = apps[0].port if apps else 0
+            app = ServerApp(ip="127.0.0.1", port=port, reuse_port=True)
+            app.http_server = HTTPServer(lambda request: None)
+            app._bind_reuse_port()
+            apps.append(app)
+        # The port picked by the OS is read back, and can be shared:
+        assert apps[0].port != 0
+        assert apps[1].port == apps[0].port
+        with socket.create_connection(("127.0.0.1", apps[0].port), timeout=5):
+            pass
+    finally:
+        for app in apps:
+            app.http_server.stop()
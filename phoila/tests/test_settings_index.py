@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) Vidar Tonaas Fauske.
+# Distributed under the terms of the Modified BSD License.
+
+import json
+import os
+
+import pytest
+from tornado import web
+from tornado.httpclient import AsyncHTTPClient, HTTPClientError
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop
+from tornado.testing import bind_unused_port
+
+from ..lab_handlers import SettingsHandler
+from ..settings_index import SettingsIndex
+
+PACKAGE = "@scope/pkg-extension"
+USER_FILE = os.path.join(
+    "user", "@scope", "pkg-extension", "plugin.jupyterlab-settings"
+)
+
+
+def touch(path):
+    stat = os.stat(str(path))
+    os.utime(str(path), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+def write_json(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data))
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    schemas_dir = tmp_path / "schemas"
+    package_dir = schemas_dir / "@scope" / "pkg-extension"
+    write_json(
+        package_dir / "plugin.json",
+        {"type": "object", "properties": {"a": {"type": "number", "default": 1}}},
+    )
+    write_json(package_dir / "package.json.orig", {"version": "1.0.0"})
+    (tmp_path / "settings").mkdir()
+    (tmp_path / "user").mkdir()
+    return tmp_path
+
+
+@pytest.fixture
+def index(dirs):
+    return SettingsIndex(
+        str(dirs / "settings"), str(dirs / "schemas"), str(dirs / "user")
+    )
+
+
+def settings_ids(body):
+    return [s["id"] for s in json.loads(body)["settings"]]
+
+
+def test_list_settings(index):
+    body, etag, warnings = index.list_settings()
+    (model,) = json.loads(body)["settings"]
+    assert model["id"] == PACKAGE + ":plugin"
+    assert model["version"] == "1.0.0"
+    assert warnings == []
+    assert index.list_settings()[:2] == (body, etag)
+
+
+def test_list_settings_skips_hidden_files(index, dirs):
+    package_dir = dirs / "schemas" / "@scope" / "pkg-extension"
+    write_json(package_dir / ".hidden.json", {"type": "object"})
+    write_json(dirs / "schemas" / ".git" / "plugin.json", {"type": "object"})
+    body, _, _ = index.list_settings()
+    assert settings_ids(body) == [PACKAGE + ":plugin"]
+
+
+@pytest.mark.parametrize(
+    "change",
+    ["schema", "version", "user settings", "new schema", "removed schema"],
+)
+def test_list_settings_invalidation(index, dirs, change):
+    package_dir = dirs / "schemas" / "@scope" / "pkg-extension"
+    body, etag, _ = index.list_settings()
+
+    if change == "schema":
+        write_json(
+            package_dir / "plugin.json",
+            {"type": "object", "properties": {"a": {"type": "number", "default": 2}}},
+        )
+        touch(package_dir / "plugin.json")
+    elif change == "version":
+        write_json(package_dir / "package.json.orig", {"version": "1.0.1"})
+        touch(package_dir / "package.json.orig")
+    elif change == "user settings":
+        write_json(dirs / USER_FILE, {"a": 3})
+    elif change == "new schema":
+        other_dir = dirs / "schemas" / "@scope" / "other"
+        write_json(other_dir / "plugin.json", {"type": "object"})
+    else:
+        os.remove(str(package_dir / "plugin.json"))
+
+    new_body, new_etag, _ = index.list_settings()
+    assert new_etag != etag
+    models = json.loads(new_body)["settings"]
+    if change == "schema":
+        assert models[0]["schema"]["properties"]["a"]["default"] == 2
+    elif change == "version":
+        assert models[0]["version"] == "1.0.1"
+        assert index.get_settings(PACKAGE + ":plugin")[0]["version"] == "1.0.1"
+    elif change == "user settings":
+        assert models[0]["settings"] == {"a": 3}
+    elif change == "new schema":
+        assert settings_ids(new_body) == ["@scope/other:plugin", PACKAGE + ":plugin"]
+    else:
+        assert models == []
+
+
+def fetch(index, path, **kwargs):
+    """Fetch a path from a server with settings handlers for an index."""
+    config = {"settings_index": index}
+    app = web.Application(
+        [
+            (r"/settings/?", SettingsHandler, config),
+            (r"/settings/(?P<schema_name>.+)", SettingsHandler, config),
+        ]
+    )
+    sock, port = bind_unused_port()
+    server = HTTPServer(app)
+    server.add_sockets([sock])
+    try:
+        return IOLoop.current().run_sync(
+            lambda: AsyncHTTPClient().fetch(
+                "http://127.0.0.1:%d%s" % (port, path), **kwargs
+            )
+        )
+    finally:
+        server.stop()
+
+
+def test_settings_handler_etag(index, dirs):
+    response = fetch(index, "/settings/")
+    etag = response.headers["Etag"]
+    assert settings_ids(response.body.decode("utf-8")) == [PACKAGE + ":plugin"]
+
+    with pytest.raises(HTTPClientError) as info:
+        fetch(index, "/settings/", headers={"If-None-Match": etag})
+    assert info.value.code == 304
+
+    write_json(dirs / USER_FILE, {"a": 2})
+    response = fetch(index, "/settings/", headers={"If-None-Match": etag})
+    assert response.code == 200
+    assert response.headers["Etag"] != etag
+
+    response = fetch(index, "/settings/%s:plugin" % PACKAGE)
+    assert json.loads(response.body.decode("utf-8"))["settings"] == {"a": 2}
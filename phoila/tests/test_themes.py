@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) Vidar Tonaas Fauske.
+# Distributed under the terms of the Modified BSD License.
+
+import gzip
+import os
+
+import pytest
+from tornado import web
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop
+from tornado.testing import bind_unused_port
+
+from ..lab_handlers import ThemesHandler
+from ..themes import (
+    load_theme_bundles,
+    minify_css,
+    read_themes_manifest,
+    write_theme_bundles,
+)
+
+THEMES_URL = "/api/themes/abc/"
+
+
+def touch(path):
+    stat = os.stat(str(path))
+    os.utime(str(path), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+def test_minify_css():
+    css = """
+    /* A comment */
+    .a ,
+    .b {
+        color : red ;
+        margin: 0  1px;
+    }
+    """
+    assert minify_css(css) == ".a,.b{color : red;margin: 0 1px}"
+
+
+def test_minify_css_keeps_strings_and_urls():
+    css = """
+    .a::before { content: "a ; } ,  b" ; }
+    .b { font-family: 'Font  Name', sans-serif; }
+    .c { background: url(data:image/png;base64,AAAA) ; }
+    .d { content: "/* not a comment */"; }
+    /* "not a string */
+    .e { content: '\\'  ;' }
+    """
+    assert minify_css(css) == (
+        '.a::before{content: "a ; } ,  b"}'
+        ".b{font-family: 'Font  Name',sans-serif}"
+        ".c{background: url(data:image/png;base64,AAAA)}"
+        '.d{content: "/* not a comment */"}'
+        ".e{content: '\\'  ;'}"
+    )
+
+
+@pytest.fixture
+def themes_dir(tmp_path):
+    theme_dir = tmp_path / "themes" / "@scope" / "theme"
+    (theme_dir / "images").mkdir(parents=True)
+    (theme_dir / "index.css").write_text(
+        ".a { background: url('images/a.png'); }\n"
+        ".b { background: url('/static/b.png'); }\n"
+    )
+    (theme_dir / "images" / "a.png").write_bytes(b"png")
+    return tmp_path / "themes"
+
+
+def test_theme_bundles(themes_dir):
+    manifest = write_theme_bundles(str(themes_dir.parent), ["@scope/theme", "missing"])
+    assert manifest["themes"] == ["@scope/theme"]
+    assert read_themes_manifest(str(themes_dir)) == manifest
+
+    bundles = load_theme_bundles(str(themes_dir), THEMES_URL, manifest)
+    bundle = bundles["@scope/theme/index.css"]
+    assert bundle.data == (
+        b".a{background: url('/api/themes/abc/@scope/theme/images/a.png')}"
+        b".b{background: url('/static/b.png')}"
+    )
+    assert gzip.decompress(bundle.gzipped) == bundle.data
+
+    # Rebuilding a theme invalidates the bundles:
+    touch(themes_dir / "@scope" / "theme" / "index.css")
+    assert read_themes_manifest(str(themes_dir)) is None
+
+
+def fetch(themes_dir, bundles, path, **kwargs):
+    """Fetch a path from a server with a themes handler."""
+    app = web.Application(
+        [
+            (
+                THEMES_URL + "(.*)",
+                ThemesHandler,
+                {
+                    "path": str(themes_dir),
+                    "themes_url": THEMES_URL,
+                    "bundles": bundles,
+                },
+            )
+        ]
+    )
+    sock, port = bind_unused_port()
+    server = HTTPServer(app)
+    server.add_sockets([sock])
+    try:
+        return IOLoop.current().run_sync(
+            lambda: AsyncHTTPClient().fetch(
+                "http://127.0.0.1:%d%s" % (port, path), raise_error=False, **kwargs
+            )
+        )
+    finally:
+        server.stop()
+
+
+def test_themes_handler_cache_headers(themes_dir):
+    manifest = write_theme_bundles(str(themes_dir.parent), ["@scope/theme"])
+    bundles = load_theme_bundles(str(themes_dir), THEMES_URL, manifest)
+
+    response = fetch(themes_dir, bundles, THEMES_URL + "@scope/theme/index.css")
+    assert response.code == 200
+    assert response.body == bundles["@scope/theme/index.css"].data
+    assert "immutable" in response.headers["Cache-Control"]
+    etag = response.headers["Etag"]
+
+    response = fetch(
+        themes_dir,
+        bundles,
+        THEMES_URL + "@scope/theme/index.css",
+        headers={"If-None-Match": etag},
+    )
+    assert response.code == 304
+
+    # Files that are not bundled are not covered by the hash:
+    response = fetch(themes_dir, bundles, THEMES_URL + "@scope/theme/images/a.png")
+    assert response.code == 200
+    assert response.body == b"png"
+    assert "max-age" not in response.headers.get("Cache-Control", "")
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) Vidar Tonaas Fauske.
+# Distributed under the terms of the Modified BSD License.
+
+import pytest
+
+from nbformat.v4 import new_code_cell
+
+from ..voila_handlers import PartialOutputPreprocessor, _merge_streams
+
+
+def stream(text, name="stdout"):
+    return {"output_type": "stream", "name": name, "text": text}
+
+
+def add(output):
+    return {"partial": {"add": output}}
+
+
+def make_msg(msg_type, content, parent_id="parent"):
+    return {
+        "msg_type": msg_type,
+        "header": {"msg_type": msg_type},
+        "parent_header": {"msg_id": parent_id},
+        "metadata": {},
+        "content": content,
+    }
+
+
+class OutputHook(object):
+    """Stands in for an output widget that captures outputs."""
+
+    def __init__(self):
+        self.calls = []
+
+    def output(self, outs, msg, display_id, cell_index):
+        self.calls.append(msg)
+
+    def clear_output(self, outs, msg, cell_index):
+        self.calls.append(msg)
+
+
+@pytest.fixture
+def preprocessor():
+    pre = PartialOutputPreprocessor()
+    # As set up for executing a cell:
+    pre.clear_before_next_output = False
+    pre.records = []
+    pre.partial_callback = pre.records.append
+    return pre
+
+
+def test_merge_streams_joins_consecutive_streams():
+    records = [add(stream("a")), add(stream("b")), add(stream("c"))]
+    assert _merge_streams(records) == [add(stream("abc"))]
+    # The records are not modified:
+    assert records[0] == add(stream("a"))
+
+
+def test_merge_streams_keeps_other_records_apart():
+    display = {"output_type": "display_data", "data": {}, "metadata": {}}
+    widgets = {"widgets": {"version_major": 2, "version_minor": 0, "state": {}}}
+    records = [
+        add(stream("a")),
+        add(stream("b", "stderr")),
+        widgets,
+        add(stream("c", "stderr")),
+        {"partial": {"clear": True}},
+        add(stream("d", "stderr")),
+        add(display),
+        add(stream("e", "stderr")),
+    ]
+    assert _merge_streams(records) == records
+
+
+def test_process_message_reports_new_outputs(preprocessor):
+    cell = new_code_cell()
+    preprocessor.process_message(
+        make_msg("stream", {"name": "stdout", "text": "a"}), cell, 0
+    )
+    assert preprocessor.records == [{"add": stream("a")}]
+    assert len(cell.outputs) == 1
+
+
+def test_process_message_reports_clear(preprocessor):
+    cell = new_code_cell()
+    preprocessor.process_message(
+        make_msg("stream", {"name": "stdout", "text": "a"}), cell, 0
+    )
+    preprocessor.process_message(make_msg("clear_output", {"wait": True}), cell, 0)
+    preprocessor.process_message(
+        make_msg("stream", {"name": "stdout", "text": "b"}), cell, 0
+    )
+    assert preprocessor.records == [
+        {"add": stream("a")},
+        {"clear": True},
+        {"add": stream("b")},
+    ]
+    assert [output["text"] for output in cell.outputs] == ["b"]
+
+
+def test_process_message_skips_stripped_outputs(preprocessor):
+    cell = new_code_cell()
+    preprocessor.process_message(
+        make_msg("stream", {"name": "stderr", "text": "warning"}), cell, 0
+    )
+    assert preprocessor.records == []
+    assert len(cell.outputs) == 1
+
+
+def test_process_message_skips_captured_outputs(preprocessor):
+    cell = new_code_cell()
+    hook = OutputHook()
+    preprocessor.output_hook_stack["parent"].append(hook)
+    preprocessor.process_message(
+        make_msg("stream", {"name": "stdout", "text": "a"}), cell, 0
+    )
+    preprocessor.process_message(make_msg("clear_output", {"wait": False}), cell, 0)
+    assert preprocessor.records == []
+    assert len(hook.calls) == 2
+    assert cell.outputs == []
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright (c) Vidar Tonaas Fauske.
+# Distributed under the terms of the Modified BSD License.
+
+import json
+import os
+
+import pytest
+from tornado import gen
+from tornado.ioloop import IOLoop
+
+from ..workspace_store import (
+    SQLITE_FILENAME,
+    CoalescingWorkspaceStore,
+    DirectoryWorkspaceStore,
+    MemoryWorkspaceStore,
+    SQLiteWorkspaceStore,
+    make_workspace_store,
+)
+
+
+def workspace(name, value=0):
+    data = dict(data={"value": value}, metadata=dict(id="/" + name))
+    return data, json.dumps(data)
+
+
+def run_sync(func):
+    return IOLoop.current().run_sync(func)
+
+
+class CountingStore(DirectoryWorkspaceStore):
+    """A directory store that counts the writes to it."""
+
+    def __init__(self, directory):
+        super(CountingStore, self).__init__(directory)
+        self.writes = []
+
+    def put(self, space_name, workspace, raw):
+        self.writes.append(space_name)
+        super(CountingStore, self).put(space_name, workspace, raw)
+
+
+@pytest.fixture(params=["directory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteWorkspaceStore(str(tmp_path / SQLITE_FILENAME))
+    return DirectoryWorkspaceStore(str(tmp_path / "workspaces"))
+
+
+def test_backend(backend):
+    assert backend.get("a") is None
+    assert backend.list("") == []
+    backend.put("b", *workspace("b", 1))
+    backend.put("a", *workspace("a", 1))
+    backend.put("a", *workspace("a", 2))
+    assert backend.get("a") == workspace("a", 2)[0]
+    assert backend.list("") == [workspace("a", 2)[0], workspace("b", 1)[0]]
+    assert backend.delete("a")
+    assert not backend.delete("a")
+    assert backend.get("a") is None
+    assert backend.list("") == [workspace("b", 1)[0]]
+
+
+def test_coalescing_store(backend):
+    store = CoalescingWorkspaceStore(backend, 0.1)
+
+    @gen.coroutine
+    def check():
+        store.put("a", *workspace("a", 1))
+        store.put("a", *workspace("a", 2))
+        # Reads see the pending state before it is written:
+        assert backend.get("a") is None
+        assert (yield store.get("a")) == workspace("a", 2)[0]
+        assert (yield store.list("")) == [workspace("a", 2)[0]]
+        yield gen.sleep(0.5)
+        assert backend.get("a") == workspace("a", 2)[0]
+        assert (yield store.get("a")) == workspace("a", 2)[0]
+
+    run_sync(check)
+
+
+def test_coalescing_store_writes_once(tmp_path):
+    backend = CountingStore(str(tmp_path))
+    store = CoalescingWorkspaceStore(backend, 0.1)
+
+    @gen.coroutine
+    def check():
+        for value in range(5):
+            store.put("a", *workspace("a", value))
+        yield gen.sleep(0.5)
+        assert backend.writes == ["a"]
+        assert backend.get("a") == workspace("a", 4)[0]
+
+    run_sync(check)
+
+
+def test_coalescing_store_without_delay(tmp_path):
+    backend = CountingStore(str(tmp_path))
+    store = CoalescingWorkspaceStore(backend, 0)
+
+    @gen.coroutine
+    def check():
+        store.put("a", *workspace("a", 1))
+        yield gen.sleep(0.1)
+        store.put("a", *workspace("a", 2))
+        yield gen.sleep(0.1)
+        assert backend.writes == ["a", "a"]
+
+    run_sync(check)
+
+
+def test_coalescing_store_delete_then_put(backend):
+    store = CoalescingWorkspaceStore(backend, 0.1)
+    backend.put("a", *workspace("a", 1))
+
+    @gen.coroutine
+    def check():
+        # Deleting a pending workspace drops it, even if it was never written:
+        store.put("b", *workspace("b", 1))
+        assert (yield store.delete("b"))
+        assert not (yield store.delete("b"))
+
+        assert (yield store.delete("a"))
+        store.put("a", *workspace("a", 2))
+        yield gen.sleep(0.5)
+        assert backend.get("a") == workspace("a", 2)[0]
+        assert backend.get("b") is None
+
+        # A put that was collected before the delete is not written after it:
+        store.put("a", *workspace("a", 3))
+        store._flush_async()
+        assert (yield store.delete("a"))
+        yield gen.sleep(0.5)
+        assert backend.get("a") is None
+        assert (yield store.list("")) == []
+
+    run_sync(check)
+
+
+def test_coalescing_store_flush(tmp_path):
+    backend = CountingStore(str(tmp_path))
+    store = CoalescingWorkspaceStore(backend, 10)
+    run_sync(lambda: gen.maybe_future(store.put("a", *workspace("a", 1))))
+    store.flush()
+    assert backend.writes == ["a"]
+    assert backend.get("a") == workspace("a", 1)[0]
+
+
+def test_sqlite_file_defaults_to_runtime_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("JUPYTER_RUNTIME_DIR", str(tmp_path / "runtime"))
+    store = make_workspace_store("sqlite", str(tmp_path / "workspaces"))
+    assert store.store.path == os.path.join(str(tmp_path / "runtime"), SQLITE_FILENAME)
+    assert not os.path.exists(str(tmp_path / "workspaces"))
+
+    path = str(tmp_path / "local" / "ws.sqlite")
+    store = make_workspace_store("sqlite", "", sqlite_file=path)
+    assert store.store.path == path
+
+
+def test_memory_store_is_per_user():
+    store = MemoryWorkspaceStore(1000)
+    store.put("alice", "a", *workspace("a", 1))
+    store.put("bob", "a", *workspace("a", 2))
+    assert store.get("alice", "a") == workspace("a", 1)[0]
+    assert store.get("bob", "a") == workspace("a", 2)[0]
+    assert store.delete("alice", "a")
+    assert not store.delete("alice", "a")
+    assert store.get("alice", "a") is None
+    assert store.get("bob", "a") == workspace("a", 2)[0]
+
+
+def test_memory_store_counts_encoded_bytes():
+    data = dict(data={"value": "\u00e6\u00f8\u00e5"}, metadata=dict(id="/a"))
+    raw = json.dumps(data, ensure_ascii=False)
+    size = len(raw.encode("utf-8"))
+    assert size > len(raw)
+    store = MemoryWorkspaceStore(size)
+    store.put("alice", "a", data, raw)
+    assert store.get("alice", "a") == data
+    # Too large when counted in bytes rather than characters:
+    store = MemoryWorkspaceStore(size - 1)
+    store.put("alice", "a", data, raw)
+    assert store.get("alice", "a") is None
+
+
+def test_memory_store_lru_eviction():
+    size = len(workspace("a")[1])
+    store = MemoryWorkspaceStore(2 * size)
+    store.put("alice", "a", *workspace("a"))
+    store.put("alice", "b", *workspace("b"))
+    # Reading a workspace makes it the most recently used:
+    assert store.get("alice", "a") == workspace("a")[0]
+    store.put("alice", "c", *workspace("c"))
+    assert store.get("alice", "b") is None
+    assert store.get("alice", "a") == workspace("a")[0]
+    assert store.get("alice", "c") == workspace("c")[0]
+
+    # Replacing a workspace does not count its old size:
+    store.put("alice", "c", *workspace("c", 1))
+    assert store.get("alice", "a") == workspace("a")[0]
+    assert store.get("alice", "c") == workspace("c", 1)[0]
+
+    # Workspaces larger than the limit are not stored, and evict nothing:
+    store.put("alice", "d", dict(data={}), "x" * (2 * size + 1))
+    assert store.get("alice", "d") is None
+    assert store.get("alice", "a") == workspace("a")[0]
@@ -0,0 +1,156 @@
+# Copyright (c) Vidar Tonaas Fauske.
+# Distributed under the terms of the Modified BSD License.
+
+"""Precomputed theme CSS bundles.
+
+`phoila build` writes a minified copy of each theme's CSS, with its local
+urls rewritten relative to the themes url, and a manifest with a hash of
+all the bundles. The server loads the bundles once, fills in the actual
+themes url, compresses them, and serves them from memory under a themes
+url that includes the hash, so they can be cached indefinitely.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+from collections import namedtuple
+from urllib.parse import urlparse
+
+
+THEMES_MANIFEST = "phoila-themes.json"
+BUNDLE_FILENAME = "index.bundle.css"
+
+# Stands in for the themes url in the bundles, as it depends on base_url
+_THEMES_URL_MARKER = "__PHOILA_THEMES_URL__"
+
+# We only match strings that are local urls,
+# e.g. `url('../foo.css')`, `url('images/foo.png')`
+_url_pattern = re.compile(r"url\('(.*?)'\)|" r'url\("(.*?)"\)')
+
+# Comments, strings and unquoted urls, which are matched together so that
+# e.g. quotes in comments and comment markers in strings are handled
+_literal_pattern = re.compile(
+    r"(/\*.*?\*/)"
+    r"|(\"(?:[^\"\\]|\\.)*\"|'(?:[^'\\]|\\.)*'|url\([^'\")]*\))",
+    re.DOTALL | re.IGNORECASE,
+)
+# Stands in for a string or url while minifying
+_placeholder_pattern = re.compile(r"\x00(\d+)\x00")
+_space_pattern = re.compile(r"\s+")
+_punctuation_pattern = re.compile(r"\s*([{};,])\s*")
+
+
+ThemeBundle = namedtuple("ThemeBundle", ["data", "gzipped", "etag"])
+
+
+def minify_css(css):
+    """Remove comments and redundant whitespace from css.
+
+    Strings and urls are kept as they are.
+    """
+    literals = []
+
+    def extract(m):
+        if m.group(1) is not None:
+            return ""
+        literals.append(m.group(2))
+        return "\x00%d\x00" % (len(literals) - 1)
+
+    css = _literal_pattern.sub(extract, css)
+    css = _space_pattern.sub(" ", css)
+    css = _punctuation_pattern.sub(r"\1", css)
+    css = css.replace(";}", "}").strip()
+    return _placeholder_pattern.sub(lambda m: literals[int(m.group(1))], css)
+
+
+def _rewrite_urls(css, basedir):
+    """Make the local urls in css relative to the themes url marker."""
+
+    def replacer(m):
+        """Replace the matched relative url with the mangled url."""
+        group = m.group()
+        # Get the part that matched
+        part = [g for g in m.groups() if g][0]
+
+        # Ignore urls that start with `/` or have a protocol like `http`.
+        parsed = urlparse(part)
+        if part.startswith("/") or parsed.scheme:
+            return group
+
+        return group.replace(part, "/".join([_THEMES_URL_MARKER, basedir, part]))
+
+    return _url_pattern.sub(replacer, css)
+
+
+def write_theme_bundles(app_dir, theme_names):
+    """Write the CSS bundles of the given themes, and the themes manifest.
+
+    Themes that are not built in the app dir are skipped.
+    """
+    themes_dir = os.path.join(app_dir, "themes")
+    digest = hashlib.sha256()
+    bundled = []
+    for name in sorted(theme_names):
+        css_path = os.path.join(themes_dir, name, "index.css")
+        if not os.path.exists(css_path):
+            continue
+        with open(css_path, "rb") as fid:
+            css = fid.read().decode("utf-8")
+        bundle = _rewrite_urls(minify_css(css), name).encode("utf-8")
+        with open(os.path.join(themes_dir, name, BUNDLE_FILENAME), "wb") as fid:
+            fid.write(bundle)
+        digest.update(name.encode("utf-8"))
+        digest.update(bundle)
+        bundled.append(name)
+
+    manifest = dict(hash=digest.hexdigest()[:16], themes=bundled)
+    with open(os.path.join(themes_dir, THEMES_MANIFEST), "w") as fid:
+        json.dump(manifest, fid)
+    return manifest
+
+
+def read_themes_manifest(themes_dir):
+    """Read the themes manifest.
+
+    Returns None if there are no bundles, or if any of the themes have been
+    rebuilt since the bundles were written.
+    """
+    target = os.path.join(themes_dir, THEMES_MANIFEST)
+    try:
+        manifest_mtime = os.stat(target).st_mtime
+        with open(target) as fid:
+            manifest = json.load(fid)
+    except (OSError, ValueError):
+        return None
+    if not manifest.get("themes"):
+        return None
+    for name in manifest["themes"]:
+        try:
+            css_mtime = os.stat(os.path.join(themes_dir, name, "index.css")).st_mtime
+        except OSError:
+            return None
+        if css_mtime > manifest_mtime:
+            return None
+    return manifest
+
+
+def load_theme_bundles(themes_dir, themes_url, manifest):
+    """Load the theme bundles for serving at the given (full) themes url.
+
+    Returns a dict of request path -> ThemeBundle.
+    """
+    bundles = {}
+    for name in manifest["themes"]:
+        try:
+            with open(os.path.join(themes_dir, name, BUNDLE_FILENAME), "rb") as fid:
+                css = fid.read().decode("utf-8")
+        except OSError:
+            continue
+        data = css.replace(_THEMES_URL_MARKER, themes_url.rstrip("/")).encode("utf-8")
+        etag = '"%s"' % hashlib.sha1(data).hexdigest()
+        bundles[name + "/index.css"] = ThemeBundle(
+            data, gzip.compress(data, compresslevel=9), etag
+        )
+    return bundles
@@ -37,8 +37,11 @@ DAMAGE.
 
 import os
 import gettext
+import queue
+import threading
 
 from jinja2 import Environment, FileSystemLoader
+from nbconvert.preprocessors import ClearOutputPreprocessor
 import tornado
 
 from jupyter_server.utils import url_path_join
@@ -46,6 +49,7 @@ from jupyter_server.base.handlers import path_regex
 from jupyter_server.base.handlers import FileFindHandler
 
 from voila.paths import ROOT, STATIC_ROOT, collect_template_paths, jupyter_path
+from voila.execute import VoilaExecutePreprocessor, should_strip_error
 from voila.handler import VoilaHandler
 from voila.treehandler import VoilaTreeHandler
 from voila.static_file_handler import MultiStaticFileHandler, WhiteListFileHandler
@@ -59,6 +63,170 @@ DEV_MODE = os.path.exists(os.path.join(HERE, "../setup.py")) and os.path.exists(
 )
 
 
+class PartialOutputPreprocessor(VoilaExecutePreprocessor):
+    """Execute, and report the outputs of the executing cell as they arrive.
+
+    `partial_callback` is called with a partial output record for each
+    change to the outputs of the cell:
+
+    - `{"add": output}` for a new output.
+    - `{"clear": wait}` for a clear_output message.
+    - `{"outputs": outputs}` when the outputs were updated in place.
+
+    The changed widget states are tracked as well, so that they can be
+    embedded in the render stream (see `widget_state_delta`).
+    """
+
+    partial_callback = None
+
+    def __init__(self, **kwargs):
+        super(PartialOutputPreprocessor, self).__init__(**kwargs)
+        self._changed_widgets = set()
+
+    def handle_comm_msg(self, outs, msg, cell_index):
+        super(PartialOutputPreprocessor, self).handle_comm_msg(outs, msg, cell_index)
+        data = msg["content"].get("data") or {}
+        if "state" in data:
+            self._changed_widgets.add(msg["content"]["comm_id"])
+
+    def widget_state_delta(self):
+        """Get the state of the widgets changed since the last call, or None.
+
+        The state follows the widget embed format (version 2). Widget state
+        tracking is only available with nbconvert's `store_widget_state`.
+        """
+        changed, self._changed_widgets = self._changed_widgets, set()
+        widget_state = getattr(self, "widget_state", {})
+        widget_buffers = getattr(self, "widget_buffers", {})
+        state = {}
+        for comm_id in changed:
+            widget = widget_state.get(comm_id)
+            if not widget or "_model_name" not in widget:
+                continue
+            state[comm_id] = {
+                "model_name": widget["_model_name"],
+                "model_module": widget.get("_model_module"),
+                "model_module_version": widget.get("_model_module_version"),
+                # Copied, as the execution thread keeps updating it:
+                "state": dict(widget),
+            }
+            if widget_buffers.get(comm_id):
+                state[comm_id]["buffers"] = widget_buffers[comm_id]
+        if not state:
+            return None
+        return {"version_major": 2, "version_minor": 0, "state": state}
+
+    def process_message(self, msg, cell, cell_index):
+        outputs = cell.get("outputs", [])
+        last = outputs[-1] if outputs else None
+        result = super(PartialOutputPreprocessor, self).process_message(
+            msg, cell, cell_index
+        )
+        if self.partial_callback is None:
+            return result
+        parent_msg_id = msg["parent_header"].get("msg_id")
+        if self.output_hook_stack[parent_msg_id]:
+            # Captured by an output widget
+            return result
+        outputs = cell.get("outputs", [])
+        msg_type = msg["msg_type"]
+        if msg_type == "clear_output":
+            self.partial_callback({"clear": bool(msg["content"].get("wait"))})
+        elif msg_type == "update_display_data":
+            self.partial_callback({"outputs": self._visible(outputs)})
+        elif outputs and outputs[-1] is not last:
+            visible = self._visible(outputs[-1:])
+            if visible:
+                self.partial_callback({"add": visible[0]})
+        return result
+
+    def _visible(self, outputs):
+        """Leave out the outputs that are stripped from the final cell."""
+        if not should_strip_error(self.config):
+            return list(outputs)
+        return [
+            output
+            for output in outputs
+            if output["output_type"] != "error"
+            and not (
+                output["output_type"] == "stream" and output["name"] == "stderr"
+            )
+        ]
+
+    def stream_cell(self, cell, resources, cell_index):
+        """Execute a cell, yielding render stream records while it runs.
+
+        The records are `{"partial": record}` for the output changes, and
+        `{"widgets": state}` for the changed widget states, which come
+        before the outputs that could display them. The cell is executed
+        in a separate thread. Consecutive records that add to the same
+        stream are merged.
+        """
+        records = queue.Queue()
+        done = object()
+        error = []
+
+        def run():
+            try:
+                self.preprocess_cell(cell, resources, cell_index, store_history=False)
+            except BaseException as e:
+                error.append(e)
+            finally:
+                records.put(done)
+
+        def report(record):
+            widgets = self.widget_state_delta()
+            if widgets is not None:
+                records.put({"widgets": widgets})
+            records.put({"partial": record})
+
+        self.partial_callback = report
+        thread = threading.Thread(target=run, name="phoila-cell-%d" % cell_index)
+        thread.start()
+        try:
+            finished = False
+            while not finished:
+                batch = [records.get()]
+                while True:
+                    try:
+                        batch.append(records.get_nowait())
+                    except queue.Empty:
+                        break
+                if batch[-1] is done:
+                    batch.pop()
+                    finished = True
+                for record in _merge_streams(batch):
+                    yield record
+        finally:
+            thread.join()
+            self.partial_callback = None
+        if error:
+            raise error[0]
+        widgets = self.widget_state_delta()
+        if widgets is not None:
+            yield {"widgets": widgets}
+
+
+def _merge_streams(records):
+    """Merge consecutive partial records that add to the same stream."""
+    merged = []
+    for record in records:
+        output = record.get("partial", {}).get("add")
+        previous = merged[-1].get("partial", {}).get("add") if merged else None
+        if (
+            output is not None
+            and previous is not None
+            and output["output_type"] == previous["output_type"] == "stream"
+            and output["name"] == previous["name"]
+        ):
+            merged[-1] = {
+                "partial": {"add": dict(previous, text=previous["text"] + output["text"])}
+            }
+        else:
+            merged.append(record)
+    return merged
+
+
 class PhoilaHandler(VoilaHandler):
     def set_header(self, header, value):
         if header == "Content-Type" and value == "text/html":
@@ -69,6 +237,9 @@ class PhoilaHandler(VoilaHandler):
     @tornado.web.authenticated
     @tornado.gen.coroutine
     def get(self, path=None):
+        if self.settings.get("draining"):
+            raise tornado.web.HTTPError(503, "Server is shutting down")
+        self.settings["inflight_renders"].add(self)
         if (
             self.notebook_path and path and
             path.endswith(self.notebook_path)
@@ -77,6 +248,38 @@ class PhoilaHandler(VoilaHandler):
             return
         yield from super(PhoilaHandler, self).get(path)
 
+    def _jinja_cell_generator(self, nb, kernel_id):
+        """Execute the cells one at a time, with extra render stream records.
+
+        While a code cell executes, and after it has executed, records of the
+        form `{"phoila_record": record}` are yielded for its output changes
+        and widget states, before the cell itself is yielded.
+        """
+        km = self.kernel_manager.get_kernel(kernel_id)
+
+        nb, resources = ClearOutputPreprocessor().preprocess(
+            nb, {"metadata": {"path": self.cwd}}
+        )
+        ep = PartialOutputPreprocessor(config=self.traitlet_config)
+
+        with ep.setup_preprocessor(nb, resources, km=km):
+            for cell_idx, cell in enumerate(nb.cells):
+                if cell.cell_type == "code":
+                    for record in ep.stream_cell(cell, resources, cell_idx):
+                        yield {"phoila_record": record}
+                else:
+                    ep.preprocess_cell(cell, resources, cell_idx, store_history=False)
+                yield cell
+
+    def on_finish(self):
+        self.settings["inflight_renders"].discard(self)
+        super(PhoilaHandler, self).on_finish()
+
+    def on_connection_close(self):
+        self.settings["inflight_renders"].discard(self)
+        super(PhoilaHandler, self).on_connection_close()
+
+
 def add_voila_handlers(server_app):
     web_app = server_app.web_app
 
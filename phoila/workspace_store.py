@@ -0,0 +1,295 @@
+# Copyright (c) Vidar Tonaas Fauske.
+# Distributed under the terms of the Modified BSD License.
+
+import atexit
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from jupyter_core.paths import jupyter_runtime_dir
+from tornado import gen, web
+from tornado.ioloop import IOLoop
+
+from jupyterlab_server.workspaces_handler import WORKSPACE_EXTENSION, slugify
+
+
+SQLITE_FILENAME = "phoila-workspaces.sqlite"
+
+
+class DirectoryWorkspaceStore(object):
+    """Workspaces stored as one JSON file each, as in JupyterLab."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, space_name):
+        return os.path.join(self.directory, slugify(space_name) + WORKSPACE_EXTENSION)
+
+    def get(self, space_name):
+        path = self._path(space_name)
+        if not os.path.exists(path):
+            return None
+        with open(path) as fid:
+            try:  # to load and parse the workspace file.
+                return json.load(fid)
+            except Exception as e:
+                raise web.HTTPError(500, str(e))
+
+    def put(self, space_name, workspace, raw):
+        if not os.path.exists(self.directory):
+            try:
+                os.makedirs(self.directory)
+            except Exception as e:
+                raise web.HTTPError(500, str(e))
+        path = self._path(space_name)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as fid:
+            fid.write(raw)
+        os.replace(tmp, path)
+
+    def delete(self, space_name):
+        path = self._path(space_name)
+        if not os.path.exists(path):
+            return False
+        try:  # to delete the workspace file.
+            os.remove(path)
+        except Exception as e:
+            raise web.HTTPError(500, str(e))
+        return True
+
+    def list(self, prefix):
+        if not os.path.exists(self.directory):
+            return []
+        items = sorted(
+            item
+            for item in os.listdir(self.directory)
+            if item.startswith(prefix) and item.endswith(WORKSPACE_EXTENSION)
+        )
+        workspaces = []
+        for slug in items:
+            with open(os.path.join(self.directory, slug)) as fid:
+                try:  # to load and parse the workspace file.
+                    workspaces.append(json.load(fid))
+                except Exception as e:
+                    raise web.HTTPError(500, str(e))
+        return workspaces
+
+
+class SQLiteWorkspaceStore(object):
+    """Workspaces stored in a single SQLite database in WAL mode.
+
+    WAL mode does not work on network file systems, so the database should
+    be kept on a local disk.
+    """
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS workspaces "
+            "(slug TEXT PRIMARY KEY, data TEXT NOT NULL)"
+        )
+
+    def get(self, space_name):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM workspaces WHERE slug = ?", (slugify(space_name),)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, space_name, workspace, raw):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO workspaces (slug, data) VALUES (?, ?)",
+                (slugify(space_name), raw),
+            )
+
+    def delete(self, space_name):
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM workspaces WHERE slug = ?", (slugify(space_name),)
+            )
+        return cursor.rowcount > 0
+
+    def list(self, prefix):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM workspaces WHERE substr(slug, 1, ?) = ? "
+                "ORDER BY slug",
+                (len(prefix), prefix),
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+
+class CoalescingWorkspaceStore(object):
+    """Coalesce frequent workspace saves into delayed background writes.
+
+    A saved workspace is kept in memory, and written to the underlying store
+    on a background thread `delay` seconds after the first unwritten save,
+    so that a burst of saves results in a single write that does not block
+    the event loop. With no delay, each save is written right away, but
+    still on the background thread. Any pending writes are flushed when the
+    process exits.
+
+    Reads and deletes are also done on the background thread, and return
+    futures. Reads see the pending state.
+    """
+
+    def __init__(self, store, delay, log=None):
+        self.store = store
+        self.delay = delay
+        self.log = log
+        self._pending = {}
+        # Slugs deleted since they were last saved, for skipping them in
+        # batches that were collected before the delete:
+        self._deleted = set()
+        self._timeout = None
+        self._executor = ThreadPoolExecutor(1)
+        self._write_lock = threading.Lock()
+        atexit.register(self.flush)
+
+    @gen.coroutine
+    def get(self, space_name):
+        pending = self._pending.get(slugify(space_name))
+        if pending is not None:
+            return pending[1]
+        workspace = yield self._executor.submit(self.store.get, space_name)
+        return workspace
+
+    def put(self, space_name, workspace, raw):
+        slug = slugify(space_name)
+        self._deleted.discard(slug)
+        self._pending[slug] = (space_name, workspace, raw)
+        if self.delay <= 0:
+            self._flush_async()
+        elif self._timeout is None:
+            loop = IOLoop.current()
+            self._timeout = loop.call_later(self.delay, self._flush_async)
+
+    def delete(self, space_name):
+        slug = slugify(space_name)
+        pending = self._pending.pop(slug, None)
+        self._deleted.add(slug)
+        return self._executor.submit(self._delete, space_name, pending is not None)
+
+    @gen.coroutine
+    def list(self, prefix):
+        stored = yield self._executor.submit(self.store.list, prefix)
+        workspaces = {slugify(w["metadata"]["id"]): w for w in stored}
+        for slug, (_, workspace, _raw) in self._pending.items():
+            if slug.startswith(prefix):
+                workspaces[slug] = workspace
+        return [workspaces[slug] for slug in sorted(workspaces)]
+
+    def flush(self):
+        """Synchronously write all pending workspaces."""
+        batch = dict(self._pending)
+        self._write(batch)
+        self._written(batch)
+
+    def _flush_async(self):
+        if self._timeout is not None:
+            IOLoop.current().remove_timeout(self._timeout)
+            self._timeout = None
+        batch = dict(self._pending)
+        future = self._executor.submit(self._write, batch)
+        IOLoop.current().add_future(future, lambda f: self._on_written(batch, f))
+
+    def _write(self, batch):
+        with self._write_lock:
+            for slug, (space_name, workspace, raw) in batch.items():
+                if slug not in self._deleted:
+                    self.store.put(space_name, workspace, raw)
+
+    def _delete(self, space_name, was_pending):
+        with self._write_lock:
+            return self.store.delete(space_name) or was_pending
+
+    def _on_written(self, batch, future):
+        try:
+            future.result()
+        except Exception:
+            if self.log:
+                self.log.error("Failed to write workspaces", exc_info=True)
+            # Keep the workspaces pending, and try again later
+            if self._timeout is None:
+                loop = IOLoop.current()
+                self._timeout = loop.call_later(self.delay, self._flush_async)
+            return
+        self._written(batch)
+
+    def _written(self, batch):
+        for slug, entry in batch.items():
+            # Only drop entries that were not saved again in the meantime
+            if self._pending.get(slug) is entry:
+                del self._pending[slug]
+
+
+class MemoryWorkspaceStore(object):
+    """Workspaces kept in memory only, per user.
+
+    Workspaces are kept as their UTF-8 encoded JSON only, and the least
+    recently used workspaces are dropped when the total encoded size of the
+    stored workspaces exceeds `max_bytes`. Nothing is ever written to disk,
+    so the workspaces only last for the lifetime of the server.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._size = 0
+        self._workspaces = OrderedDict()
+
+    def get(self, user, space_name):
+        key = (user, slugify(space_name))
+        data = self._workspaces.get(key)
+        if data is None:
+            return None
+        self._workspaces.move_to_end(key)
+        return json.loads(data.decode("utf-8"))
+
+    def put(self, user, space_name, workspace, raw):
+        self.delete(user, space_name)
+        data = raw.encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+        self._workspaces[(user, slugify(space_name))] = data
+        self._size += len(data)
+        while self._size > self.max_bytes:
+            _, old_data = self._workspaces.popitem(last=False)
+            self._size -= len(old_data)
+
+    def delete(self, user, space_name):
+        data = self._workspaces.pop((user, slugify(space_name)), None)
+        if data is None:
+            return False
+        self._size -= len(data)
+        return True
+
+
+def make_workspace_store(
+    kind, workspaces_dir, write_delay=0, log=None, sqlite_file=None
+):
+    """Create a workspace store of the given kind ("directory" or "sqlite").
+
+    The SQLite database is kept in `sqlite_file`, by default in the Jupyter
+    runtime dir, which is on a local disk. All disk access is done on a
+    background thread.
+    """
+    if kind == "sqlite":
+        if not sqlite_file:
+            sqlite_file = os.path.join(jupyter_runtime_dir(), SQLITE_FILENAME)
+        store = SQLiteWorkspaceStore(sqlite_file)
+    else:
+        store = DirectoryWorkspaceStore(workspaces_dir)
+    return CoalescingWorkspaceStore(store, write_delay, log=log)
@@ -29,11 +29,21 @@
   Therefore it is important to have the cell loop in the template.
   The issue for Jinja is: https://github.com/pallets/jinja/issues/1044
   #}
+  {#
+  While a code cell executes, the cell generator yields extra records for it,
+  which are streamed before the cell: { "partial": ... } records with changes
+  to its outputs, and { "widgets": ... } records with the changed widget
+  states, in the widget embed format.
+  #}
   {%- for cell in cell_generator(nb, kernel_id) -%}
+    {%- if cell.phoila_record is defined -%}
+      {{ cell.phoila_record | tojson }}
+    {% else -%}
     {% set cellloop = loop %}
     {%- block any_cell scoped -%}
       {{ '{' }} "source": {% filter tojson %} {{ super() }} {% endfilter %} {{ '}' }}
     {% endblock any_cell -%}
+    {%- endif -%}
   {%- endfor -%}
 {% endwith %}
 {%- endblock body_loop -%}
@@ -6,16 +6,6 @@ import { Panel } from "@phosphor/widgets";
 import { VoilaSession } from './session';
 
 
-
-
-
-function flatten<T>(nested: ReadonlyArray<ReadonlyArray<T>>): ReadonlyArray<T> {
-  return nested.reduce<T[]>((res, sub) => {
-    res.splice(res.length, 0, ...sub);
-    return res;
-  }, []);
-}
-
 /**
  * A widget hosting a cloned output area.
  */
@@ -33,7 +23,7 @@ export class ClonedOutputArea extends Panel {
     // Wait for the notebook to be loaded before
     // cloning the output area.
     void this._session.populated.then(() => {
-      const oa = flatten(this._session.outputModels)[this._index];
+      const oa = this._session.outputModelAt(this._index);
       if (!oa) {
         this.dispose();
         return;
@@ -0,0 +1,203 @@
+// Copyright (c) Vidar Tonaas Fauske
+// Distributed under the terms of the Modified BSD License.
+
+/*
+
+This module contains lazy-loading stand-ins for mime renderer extensions.
+
+The mime extensions are not part of the initial bundle. Instead, a renderer
+factory is registered for their mime types up front, and the extension code
+is split into its own chunk that is only fetched the first time an output
+with one of its mime types is rendered.
+
+*/
+
+import { IRenderMime } from '@jupyterlab/rendermime-interfaces';
+
+import { PanelLayout, Widget } from '@phosphor/widgets';
+
+
+/**
+ * A mime extension that is loaded on first use.
+ */
+export interface ILazyMimeExtension {
+  /**
+   * The package name of the mime extension.
+   */
+  readonly name: string;
+
+  /**
+   * The mime types handled by the extension.
+   */
+  readonly mimeTypes: ReadonlyArray<string>;
+
+  /**
+   * Whether the renderers are safe, as in the extension.
+   */
+  readonly safe: boolean;
+
+  /**
+   * The rank of the renderers, as in the extension.
+   */
+  readonly rank: number;
+
+  /**
+   * Load the chunk of the extension module.
+   */
+  load(): Promise<IRenderMime.IExtensionModule>;
+}
+
+
+/**
+ * The mime extensions that are split into separate chunks.
+ *
+ * Note that `require.ensure` needs literal module names for webpack to
+ * be able to split out the chunks.
+ */
+export const LAZY_MIME_EXTENSIONS: ReadonlyArray<ILazyMimeExtension> = [
+  {
+    name: '@jupyterlab/javascript-extension',
+    mimeTypes: ['text/javascript', 'application/javascript'],
+    safe: false,
+    rank: 0,
+    load: () => new Promise((resolve, reject) => {
+      (require as any).ensure(['@jupyterlab/javascript-extension'], (require: NodeRequire) => {
+        resolve(require('@jupyterlab/javascript-extension'));
+      },
+      reject,
+      '@jupyterlab/javascript-extension'
+      );
+    })
+  },
+  {
+    name: '@jupyterlab/json-extension',
+    mimeTypes: ['application/json'],
+    safe: true,
+    rank: 0,
+    load: () => new Promise((resolve, reject) => {
+      (require as any).ensure(['@jupyterlab/json-extension'], (require: NodeRequire) => {
+        resolve(require('@jupyterlab/json-extension'));
+      },
+      reject,
+      '@jupyterlab/json-extension'
+      );
+    })
+  },
+  {
+    name: '@jupyterlab/pdf-extension',
+    mimeTypes: ['application/pdf'],
+    safe: false,
+    rank: 100,
+    load: () => new Promise((resolve, reject) => {
+      (require as any).ensure(['@jupyterlab/pdf-extension'], (require: NodeRequire) => {
+        resolve(require('@jupyterlab/pdf-extension'));
+      },
+      reject,
+      '@jupyterlab/pdf-extension'
+      );
+    })
+  },
+  {
+    name: '@jupyterlab/vega4-extension',
+    mimeTypes: ['application/vnd.vega.v4+json', 'application/vnd.vegalite.v2+json'],
+    safe: true,
+    rank: 58,
+    load: () => new Promise((resolve, reject) => {
+      (require as any).ensure(['@jupyterlab/vega4-extension'], (require: NodeRequire) => {
+        resolve(require('@jupyterlab/vega4-extension'));
+      },
+      reject,
+      '@jupyterlab/vega4-extension'
+      );
+    })
+  },
+  {
+    name: '@jupyterlab/vega5-extension',
+    mimeTypes: ['application/vnd.vega.v5+json', 'application/vnd.vegalite.v3+json'],
+    safe: true,
+    rank: 57,
+    load: () => new Promise((resolve, reject) => {
+      (require as any).ensure(['@jupyterlab/vega5-extension'], (require: NodeRequire) => {
+        resolve(require('@jupyterlab/vega5-extension'));
+      },
+      reject,
+      '@jupyterlab/vega5-extension'
+      );
+    })
+  },
+];
+
+
+/**
+ * The loaded chunks, by extension name.
+ */
+const loaded: {[key: string]: Promise<IRenderMime.IExtensionModule>} = {};
+
+
+/**
+ * Get the real renderer factory of a lazy extension for a mime type.
+ */
+export async function loadRendererFactory(extension: ILazyMimeExtension, mimeType: string): Promise<IRenderMime.IRendererFactory> {
+  if (!loaded[extension.name]) {
+    loaded[extension.name] = extension.load();
+    // Allow a retry if the chunk failed to load:
+    loaded[extension.name].catch(() => {
+      delete loaded[extension.name];
+    });
+  }
+  const mod = await loaded[extension.name];
+  const data = mod.default;
+  const extensions = Array.isArray(data) ? data : [data];
+  for (let ext of extensions) {
+    if (ext.rendererFactory.mimeTypes.indexOf(mimeType) !== -1) {
+      return ext.rendererFactory;
+    }
+  }
+  throw new Error(`No renderer for ${mimeType} in ${extension.name}`);
+}
+
+
+/**
+ * A renderer that loads the real renderer on first render.
+ */
+export class LazyRenderer extends Widget implements IRenderMime.IRenderer {
+  constructor(options: IRenderMime.IRendererOptions, factory: Promise<IRenderMime.IRendererFactory>) {
+    super();
+    this.layout = new PanelLayout();
+    this._options = options;
+    this._factory = factory;
+  }
+
+  async renderModel(model: IRenderMime.IMimeModel): Promise<void> {
+    if (!this._renderer) {
+      const factory = await this._factory;
+      if (this.isDisposed) {
+        return;
+      }
+      this._renderer = factory.createRenderer(this._options);
+      this.layout.addWidget(this._renderer);
+    }
+    return this._renderer.renderModel(model);
+  }
+
+  layout: PanelLayout;
+
+  private _options: IRenderMime.IRendererOptions;
+  private _factory: Promise<IRenderMime.IRendererFactory>;
+  private _renderer: IRenderMime.IRenderer | null = null;
+}
+
+
+/**
+ * Create a renderer factory that loads the extension on first use.
+ */
+export function createLazyRendererFactory(extension: ILazyMimeExtension): IRenderMime.IRendererFactory {
+  return {
+    safe: extension.safe,
+    mimeTypes: extension.mimeTypes.slice(),
+    defaultRank: extension.rank,
+    createRenderer: options => new LazyRenderer(
+      options, loadRendererFactory(extension, options.mimeType)
+    )
+  };
+}
@@ -7,6 +7,10 @@ import {
   DOMWidgetView, JupyterPhosphorWidget
 } from '@jupyter-widgets/base';
 
+import {
+  ArrayExt
+} from '@phosphor/algorithm';
+
 import {
   Message
 } from '@phosphor/messaging';
@@ -36,6 +40,12 @@ import $ from 'jquery';
 export
 const OUTPUT_WIDGET_VERSION = outputBase.OUTPUT_WIDGET_VERSION;
 
+/**
+ * The longest time (ms) to wait for an animation frame before applying
+ * pending outputs. Animation frames are paused in hidden tabs.
+ */
+const FLUSH_TIMEOUT = 100;
+
 export
 class OutputModel extends outputBase.OutputModel {
   defaults() {
@@ -49,6 +59,8 @@ class OutputModel extends outputBase.OutputModel {
     super.initialize(attributes, options);
     // The output area model is trusted since widgets are only rendered in trusted contexts.
     this._outputs = new OutputAreaModel({trusted: true});
+    this._pending = [];
+    this._cancelFlush = null;
     this._msgHook = (msg) => {
       this.add(msg);
       return false;
@@ -89,27 +101,109 @@ class OutputModel extends outputBase.OutputModel {
     }
   }
 
+  /**
+   * Add an output message.
+   *
+   * Messages are applied in batches, once per animation frame, and the
+   * outputs are synced back to the kernel once per batch.
+   */
   add(msg: KernelMessage.IIOPubMessage) {
-    let msgType = msg.header.msg_type;
-    switch (msgType) {
+    switch (msg.header.msg_type) {
     case 'execute_result':
     case 'display_data':
     case 'stream':
     case 'error':
-      let model = msg.content as nbformat.IOutput;
-      model.output_type = msgType as nbformat.OutputType;
-      this._outputs!.add(model);
-      break;
     case 'clear_output':
-      this.clear_output((msg as KernelMessage.IClearOutputMsg).content.wait);
+      this._pending.push(msg);
+      if (this._cancelFlush === null) {
+        this._cancelFlush = Private.scheduleFrame(() => this._flush());
+      }
       break;
     default:
       break;
     }
+  }
+
+  /**
+   * Apply the pending output messages, and sync the outputs.
+   *
+   * Consecutive messages of the same stream are merged before they are
+   * added, and messages before an immediate clear are skipped.
+   */
+  private _flush() {
+    this._cancelFlush = null;
+    let pending = this._pending;
+    this._pending = [];
+    const lastClear = ArrayExt.findLastIndex(pending, msg =>
+      msg.header.msg_type === 'clear_output' &&
+      !(msg as KernelMessage.IClearOutputMsg).content.wait
+    );
+    if (lastClear > 0) {
+      pending = pending.slice(lastClear);
+    }
+    let streamName: nbformat.StreamType | null = null;
+    let streamText: string[] = [];
+    for (const msg of pending) {
+      const msgType = msg.header.msg_type;
+      if (msgType === 'stream') {
+        const content = (msg as KernelMessage.IStreamMsg).content;
+        if (streamName === content.name) {
+          streamText.push(content.text);
+          continue;
+        }
+      }
+      if (streamName !== null) {
+        this._addStream(streamName, streamText);
+        streamName = null;
+        streamText = [];
+      }
+      switch (msgType) {
+      case 'stream':
+        const content = (msg as KernelMessage.IStreamMsg).content;
+        streamName = content.name;
+        streamText.push(content.text);
+        break;
+      case 'execute_result':
+      case 'display_data':
+      case 'error':
+        let model = msg.content as nbformat.IOutput;
+        model.output_type = msgType as nbformat.OutputType;
+        this._outputs!.add(model);
+        break;
+      case 'clear_output':
+        this.clear_output((msg as KernelMessage.IClearOutputMsg).content.wait);
+        break;
+      default:
+        break;
+      }
+    }
+    if (streamName !== null) {
+      this._addStream(streamName, streamText);
+    }
     this.set('outputs', this._outputs!.toJSON(), {newMessage: true});
     this.save_changes();
   }
 
+  private _addStream(name: nbformat.StreamType, text: string[]) {
+    this._outputs!.add({output_type: 'stream', name, text: text.join('')});
+  }
+
+  /**
+   * Drop any pending output messages.
+   */
+  private _dropPending() {
+    if (this._cancelFlush !== null) {
+      this._cancelFlush();
+      this._cancelFlush = null;
+    }
+    this._pending = [];
+  }
+
+  close(comm_closed?: boolean) {
+    this._dropPending();
+    return super.close(comm_closed);
+  }
+
   clear_output(wait: boolean = false) {
     this._outputs!.clear(wait);
   }
@@ -120,6 +214,8 @@ class OutputModel extends outputBase.OutputModel {
 
   setOutputs(model?: any, value?: any, options?: any) {
     if (!(options && options.newMessage)) {
+        // The new outputs replace any pending ones
+        this._dropPending();
         // fromJSON does not clear the existing output
         this.clear_output();
         // fromJSON does not copy the message, so we make a deep copy
@@ -132,6 +228,11 @@ class OutputModel extends outputBase.OutputModel {
 
   private _msgHook: ((msg: KernelMessage.IIOPubMessage) => boolean) | undefined;
   private _outputs: OutputAreaModel | undefined;
+  // Set in initialize, which runs before field initializers:
+  // @ts-ignore TS2564
+  private _pending: KernelMessage.IIOPubMessage[];
+  // @ts-ignore TS2564
+  private _cancelFlush: (() => void) | null;
 }
 
 export
@@ -224,3 +325,37 @@ class OutputView extends outputBase.OutputView {
   // @ts-ignore TS2564
   pWidget: Panel;
 }
+
+
+namespace Private {
+  /**
+   * Call a function on the next animation frame, or after a timeout,
+   * whichever comes first.
+   *
+   * Returns a function that cancels the call.
+   */
+  export
+  function scheduleFrame(fn: () => void): () => void {
+    let frame: number | null = null;
+    let timer: any = null;
+    const cancel = () => {
+      if (frame !== null) {
+        cancelAnimationFrame(frame);
+        frame = null;
+      }
+      if (timer !== null) {
+        clearTimeout(timer);
+        timer = null;
+      }
+    };
+    const run = () => {
+      cancel();
+      fn();
+    };
+    if (typeof requestAnimationFrame === 'function') {
+      frame = requestAnimationFrame(run);
+    }
+    timer = setTimeout(run, FLUSH_TIMEOUT);
+    return cancel;
+  }
+}
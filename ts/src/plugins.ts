@@ -48,7 +48,9 @@ import { UUID } from '@phosphor/coreutils';
 import { TPhoilaWidgetRegistry, TVoilaTracker } from './tokens';
 
 import { ClonedOutputArea } from './clones';
+import { LAZY_MIME_EXTENSIONS, createLazyRendererFactory } from './mimerenderers';
 import { WidgetRegistry } from './registry';
+import { KeySlots, SessionRegistry } from './sessions';
 import { VoilaView, VOLIA_MAINAREA_CLASS } from './widget';
 
 import "../style/index.css";
@@ -125,9 +127,23 @@ const voilaViewPlugin: JupyterFrontEndPlugin<TVoilaTracker> = {
       typesetter.typeset(document.createElement('div'));
     }
     const { commands, shell } = app;
-    const sessions: {[key: string]: VoilaSession} = {};
+    const sessionOptions: VoilaSession.IOptions = {
+      parseInWorker: PageConfig.getOption('phoilaRenderWorker') === 'true'
+    };
+    const shareSessions = PageConfig.getOption('phoilaShareSessions') === 'true';
     const tracker = new WidgetTracker<MainAreaWidget<VoilaView>>({namespace: 'phoila-views'});
     const cloneTracker = new WidgetTracker<MainAreaWidget<ClonedOutputArea>>({namespace: 'phoila-clones'});
+    // Slots that keep the restorer names of views and clones stable:
+    const viewSlots = new KeySlots<Widget>();
+    const cloneSlots = new KeySlots<Widget>();
+
+    const sessions = new SessionRegistry<VoilaSession>({
+      create: nbPath => new VoilaSession(nbPath, WIDGET_REGISTRY, rendermime, sessionOptions),
+      hasViews: session => !!tracker.find(
+        w => !w.isDisposed && w.content.session === session
+      )
+    });
+
     commands.addCommand(
       'phoila:open-new', {
         label: 'Open New Voila View',
@@ -149,18 +165,15 @@ const voilaViewPlugin: JupyterFrontEndPlugin<TVoilaTracker> = {
             ppromise = Promise.resolve(path);
           }
           const nbPath = await ppromise;
-          let session: VoilaSession;
-          if (!sessions[nbPath]) {
-            session = new VoilaSession(nbPath, WIDGET_REGISTRY, rendermime);
-            sessions[nbPath] = session;
-          } else {
-            session = sessions[nbPath];
-          }
-          const existing = tracker.find(w => w.content.session === session);
-          if (existing) {
-            existing.activate();
-            return;
+          // Unless sessions are shared, a notebook only has a single view:
+          if (!shareSessions) {
+            const existing = tracker.find(w => w.content.session.notebookPath === nbPath);
+            if (existing) {
+              existing.activate();
+              return;
+            }
           }
+          const session = sessions.get(nbPath);
           // Open voila widget
           const view = new VoilaView(session);
           view.allowDrag = editable;
@@ -177,6 +190,11 @@ const voilaViewPlugin: JupyterFrontEndPlugin<TVoilaTracker> = {
             // reveal: Promise.all([view.populated, view.connected])
           });
           w.addClass(VOLIA_MAINAREA_CLASS);
+          viewSlots.acquire(nbPath, w);
+          w.disposed.connect(() => {
+            viewSlots.release(w);
+            sessions.release(session);
+          });
           tracker.add(w);
           shell.add(w);
         }
@@ -187,21 +205,19 @@ const voilaViewPlugin: JupyterFrontEndPlugin<TVoilaTracker> = {
       'phoila:clone-output', {
         execute: args => {
           const nbPath = args['notebookPath'] as string
-          let session = sessions[nbPath];
-          if (!session) {
-            session = new VoilaSession(nbPath, WIDGET_REGISTRY, rendermime);
-            sessions[nbPath] = session;
-          }
-          const clone = new ClonedOutputArea({
-            session,
-            index: args['index'] as number
-          });
+          const index = args['index'] as number;
+          const session = sessions.get(nbPath);
+          const clone = session.cloneOutput(index);
 
           const widget = new MainAreaWidget({
             content: clone,
             reveal: session.populated,
           });
           widget.addClass(VOLIA_MAINAREA_CLASS);
+          cloneSlots.acquire(`${nbPath}:${index}`, widget);
+          widget.disposed.connect(() => {
+            cloneSlots.release(widget);
+          });
 
           // Add the cloned output to the output widget tracker.
           cloneTracker.add(widget);
@@ -215,7 +231,9 @@ const voilaViewPlugin: JupyterFrontEndPlugin<TVoilaTracker> = {
         args: view => ({
           path: view.content.session.notebookPath,
         }),
-        name: (view) => view.content.session.notebookPath,
+        name: (view) => shareSessions ?
+          `${view.content.session.notebookPath}:${viewSlots.get(view)}` :
+          view.content.session.notebookPath,
         when: app.serviceManager.ready
       });
       void restorer.restore(cloneTracker, {
@@ -224,7 +242,12 @@ const voilaViewPlugin: JupyterFrontEndPlugin<TVoilaTracker> = {
           notebookPath: widget.content.notebookPath,
           index: widget.content.index,
         }),
-        name: widget => `${widget.content.notebookPath}:${widget.content.index}`,
+        name: widget => {
+          const key = `${widget.content.notebookPath}:${widget.content.index}`;
+          const slot = cloneSlots.get(widget);
+          // Keep the names of first clones from before there were slots:
+          return slot ? `${key}:${slot}` : key;
+        },
         when: tracker.restored // After the notebook widgets (but not contents).
       });
     }
@@ -495,6 +518,20 @@ const phoilaWidgetManagerPlugin = {
   autoStart: true
 };
 
+/**
+ * Renderers for the mime extensions that are loaded on first use.
+ */
+const lazyMimeRenderersPlugin: JupyterFrontEndPlugin<void> = {
+  id: 'phoila:lazy-mime-renderers',
+  requires: [IRenderMimeRegistry],
+  activate: (app: JupyterFrontEnd, rendermime: IRenderMimeRegistry) => {
+    for (let extension of LAZY_MIME_EXTENSIONS) {
+      rendermime.addFactory(createLazyRendererFactory(extension), extension.rank);
+    }
+  },
+  autoStart: true
+};
+
 /**
  * The widget manager provider.
  */
@@ -515,5 +552,6 @@ export default [
   autoNewWorkspacePlugin,
   resolver,
   phoilaWidgetManagerPlugin,
-  standardWidgetManagerPlugin
+  standardWidgetManagerPlugin,
+  lazyMimeRenderersPlugin
 ];
@@ -0,0 +1,176 @@
+// Copyright (c) Vidar Tonaas Fauske
+// Distributed under the terms of the Modified BSD License.
+
+/*
+
+This module contains a Web Worker pipeline for the Voila render stream.
+
+The worker fetches the stream, decodes it, splits it into lines and parses
+the JSON records, including the output data embedded in the rendered cell
+source. Parsed records are posted to the main thread in batches, so that
+only the structured clone of the records happens on the main thread.
+
+The worker code is kept as a plain JS string, as it has to be
+self-contained, and is loaded from a Blob URL.
+
+*/
+
+import { ReadonlyJSONValue } from '@phosphor/coreutils';
+
+
+/**
+ * The source of the render stream worker.
+ */
+const WORKER_SOURCE = `
+'use strict';
+
+var OUTPUT_PATTERN = /<script type="application\\/x\\.voila-lab-output\\+json">([\\s\\S]*?)<\\/script>/g;
+// Post batches at least this often (ms), to keep the view updating:
+var BATCH_INTERVAL = 50;
+
+function parseRecord(line) {
+  var record = JSON.parse(line);
+  if (record !== null && typeof record === 'object' && typeof record.source === 'string') {
+    var parsedOutputs = [];
+    var match;
+    OUTPUT_PATTERN.lastIndex = 0;
+    while ((match = OUTPUT_PATTERN.exec(record.source)) !== null) {
+      parsedOutputs.push(JSON.parse(match[1]));
+    }
+    record.parsedOutputs = parsedOutputs;
+  }
+  return record;
+}
+
+self.onmessage = async function(event) {
+  var batch = [];
+  var lastPost = Date.now();
+  function post(force) {
+    if (batch.length > 0 && (force || Date.now() - lastPost >= BATCH_INTERVAL)) {
+      self.postMessage({type: 'records', records: batch});
+      batch = [];
+      lastPost = Date.now();
+    }
+  }
+  function handleLine(line) {
+    if (line.trim().length > 0) {
+      batch.push(parseRecord(line));
+    }
+  }
+  try {
+    var response = await fetch(event.data.url, {
+      headers: event.data.headers,
+      credentials: 'same-origin'
+    });
+    if (!response.ok) {
+      throw new Error(response.status + ' (' + response.statusText + ')');
+    }
+    var reader = response.body.getReader();
+    var decoder = new TextDecoder();
+    var pending = [];
+    while (true) {
+      var result = await reader.read();
+      var text = result.done ? decoder.decode() : decoder.decode(result.value, {stream: true});
+      var start = 0;
+      var idx = text.indexOf('\\n');
+      while (idx !== -1) {
+        pending.push(text.slice(start, idx));
+        handleLine(pending.join(''));
+        pending = [];
+        start = idx + 1;
+        idx = text.indexOf('\\n', start);
+      }
+      if (start < text.length) {
+        pending.push(text.slice(start));
+      }
+      if (result.done) {
+        break;
+      }
+      post(false);
+    }
+    handleLine(pending.join(''));
+    post(true);
+    self.postMessage({type: 'done'});
+  } catch (err) {
+    post(true);
+    self.postMessage({type: 'error', message: String(err && err.message || err)});
+  }
+};
+`;
+
+
+/**
+ * A message from the render stream worker.
+ */
+type WorkerMessage = (
+  { type: 'records', records: ReadonlyJSONValue[] } |
+  { type: 'done' } |
+  { type: 'error', message: string }
+);
+
+
+/**
+ * Whether the render stream can be parsed in a Web Worker.
+ */
+export function canUseRenderWorker(): boolean {
+  return (
+    typeof Worker !== 'undefined' &&
+    typeof Blob !== 'undefined' &&
+    typeof URL !== 'undefined' && typeof URL.createObjectURL === 'function'
+  );
+}
+
+
+let workerUrl: string | null = null;
+
+
+/**
+ * Stream the parsed JSON records of an NDJSON url, parsed in a Web Worker.
+ *
+ * Records with a `source` get a `parsedOutputs` entry with the parsed
+ * output data embedded in the source.
+ *
+ * @param url - The url to fetch
+ * @param headers - Any headers to send with the request
+ */
+export async function* requestInWorker(url: string, headers?: {[key: string]: string}): AsyncIterableIterator<ReadonlyJSONValue> {
+  if (workerUrl === null) {
+    workerUrl = URL.createObjectURL(
+      new Blob([WORKER_SOURCE], {type: 'application/javascript'}));
+  }
+  const worker = new Worker(workerUrl);
+
+  // Queue the worker messages until they are consumed:
+  const queue: WorkerMessage[] = [];
+  let wake: (() => void) | null = null;
+  worker.onmessage = (event: MessageEvent) => {
+    queue.push(event.data);
+    if (wake) {
+      wake();
+      wake = null;
+    }
+  };
+  worker.onerror = (event: ErrorEvent) => {
+    event.preventDefault();
+    worker.onmessage!({data: {type: 'error', message: event.message}} as MessageEvent);
+  };
+
+  try {
+    worker.postMessage({url, headers: headers || {}});
+    while (true) {
+      if (queue.length === 0) {
+        await new Promise<void>(resolve => { wake = resolve; });
+      }
+      const message = queue.shift()!;
+      if (message.type === 'records') {
+        yield* message.records;
+      } else if (message.type === 'done') {
+        return;
+      } else {
+        throw new Error(message.message);
+      }
+    }
+  } finally {
+    worker.terminate();
+  }
+}
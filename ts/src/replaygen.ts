@@ -1,3 +1,4 @@
+import { IDisposable } from '@phosphor/disposable';
 
 import { streamAsyncIterator } from './stream-helpers';
 
@@ -6,11 +7,15 @@ import { streamAsyncIterator } from './stream-helpers';
  *
  * Allows the elements of an async generator to be consumed by multiple
  * subscribers, that can connect at any point (before, during or after
- * element generation).
+ * element generation). Late subscribers first get all the elements that
+ * were generated before they connected.
+ *
+ * The history of elements is released when the generator is disposed.
  */
-export class ReplayableGenerator<T> {
-  constructor(generator: AsyncIterableIterator<T>) {
+export class ReplayableGenerator<T> implements IDisposable {
+  constructor(generator: AsyncIterableIterator<T>, options: ReplayableGenerator.IOptions<T> = {}) {
     this._generator = generator
+    this._compact = options.compact || null;
     this._mainLoop();
   }
 
@@ -19,25 +24,105 @@ export class ReplayableGenerator<T> {
     // On new element:
     // - Add to history
     // - Yield to all child gens
-    for await (const element of this._generator) {
-      this._history.push(element);
+    try {
+      for await (const element of this._generator) {
+        if (this._isDisposed) {
+          break;
+        }
+        this._history.push(this._compact ? this._compact(element) : element);
+        for (const child of this._children) {
+          child.enqueue(element);
+        }
+      }
+    } catch (reason) {
+      this._error = reason;
       for (const child of this._children) {
-        child.enqueue(element);
+        child.error(reason);
       }
+      this._children = [];
+      return;
+    } finally {
+      this._done = true;
+    }
+    for (const child of this._children) {
+      child.close();
     }
+    this._children = [];
   }
 
+  /**
+   * Get an iterator over all elements, past and future.
+   */
   elements(): AsyncIterableIterator<T> {
     const that = this;
+    let child: ReadableStreamDefaultController<T> | null = null;
     const stream = new ReadableStream<T>({
       start(controller) {
-        that._children.push(controller)
+        child = controller;
+        for (const element of that._history) {
+          controller.enqueue(element);
+        }
+        if (that._error !== undefined) {
+          controller.error(that._error);
+        } else if (that._done) {
+          controller.close();
+        } else {
+          that._children.push(controller);
+        }
+      },
+      cancel() {
+        const index = that._children.indexOf(child!);
+        if (index !== -1) {
+          that._children.splice(index, 1);
+        }
       }
     });
     return streamAsyncIterator(stream);
   }
 
+  /**
+   * Whether the generator is disposed.
+   */
+  get isDisposed(): boolean {
+    return this._isDisposed;
+  }
+
+  /**
+   * Release the history, and close all subscribers.
+   *
+   * The source generator is not consumed any further.
+   */
+  dispose(): void {
+    if (this._isDisposed) {
+      return;
+    }
+    this._isDisposed = true;
+    this._history = [];
+    for (const child of this._children) {
+      child.close();
+    }
+    this._children = [];
+    this._done = true;
+  }
+
   private _generator: AsyncIterableIterator<T>;
+  private _compact: ((element: T) => T) | null;
   private _history: T[] = [];
   private _children: ReadableStreamDefaultController<T>[] = [];
+  private _done = false;
+  private _error: any = undefined;
+  private _isDisposed = false;
+}
+
+export namespace ReplayableGenerator {
+  export interface IOptions<T> {
+    /**
+     * Create the lightweight version of an element kept for replaying.
+     *
+     * Current subscribers get the full element, while late subscribers
+     * get the compacted one. Useful when the element data is owned by
+     * something else after it has been consumed.
+     */
+    compact?: (element: T) => T;
+  }
 }
@@ -1,6 +1,8 @@
 
 
+import { nbformat } from "@jupyterlab/coreutils";
 import { IRenderMimeRegistry } from "@jupyterlab/rendermime";
+import { Kernel } from '@jupyterlab/services';
 import { WidgetRenderer } from '@jupyter-widgets/jupyterlab-manager';
 
 import {  PromiseDelegate, ReadonlyJSONValue } from "@phosphor/coreutils";
@@ -14,6 +16,7 @@ import { WidgetManager } from './widget-manager';
 import { OutputAreaModel } from "@jupyterlab/outputarea";
 
 import { ClonedOutputArea } from './clones';
+import { ObjectURLCache, createSharedImageFactory } from './shared-images';
 
 
 const WIDGET_VIEW_MIMETYPE = 'application/vnd.jupyter.widget-view+json';
@@ -27,11 +30,18 @@ export class VoilaSession implements IObservableDisposable {
     notebookPath: string,
     registry: WidgetRegistry,
     rendermime: IRenderMimeRegistry,
+    options: VoilaSession.IOptions = {},
   ) {
     this.notebookPath = notebookPath;
+    this._parseInWorker = !!options.parseInWorker;
+    // The output models own the output data, so only keep the markup
+    // around for replaying entries to views that are opened later:
     this._entryGen = new ReplayableGenerator(
-      this.entriesFromPath(notebookPath));
+      this.entriesFromPath(notebookPath),
+      {compact: VoilaSession.compactEntry});
     this.rendermime = rendermime.clone();
+    // Share the decoded images between the views and clones of outputs:
+    this.rendermime.addFactory(createSharedImageFactory(this._images));
     this.registry = registry;
   }
 
@@ -50,7 +60,7 @@ export class VoilaSession implements IObservableDisposable {
       return;
     }
     this._isDisposed = true;
-    this._entryGen = null!;
+    this._entryGen.dispose();
     for (const c of this._outputClones) {
       c.dispose();
     }
@@ -60,7 +70,21 @@ export class VoilaSession implements IObservableDisposable {
         m.dispose();
       }
     }
+    for (const m of this._retiredModels) {
+      m.dispose();
+    }
     this._outputModels = [];
+    this._flatOutputModels = [];
+    this._retiredModels = [];
+    if (this._wManager) {
+      this._wManager.dispose();
+      this._wManager = null;
+    }
+    if (this._kernel) {
+      this._kernel.dispose();
+      this._kernel = null;
+    }
+    this._images.dispose();
     this._disposed.emit(undefined);
     Signal.clearData(this);
   }
@@ -117,8 +141,15 @@ export class VoilaSession implements IObservableDisposable {
     return this._outputModels;
   }
 
+  /**
+   * Get an output model by its index among all the outputs of the notebook.
+   */
+  outputModelAt(index: number): OutputAreaModel | undefined {
+    return this._flatOutputModels[index];
+  }
+
   protected async* entriesFromPath(path: string) {
-    const gen = requestVoila(path);
+    const gen = requestVoila(path, undefined, {worker: this._parseInWorker});
     try {
       yield* this.entriesFromGenerator(gen);
     } finally {
@@ -132,22 +163,42 @@ export class VoilaSession implements IObservableDisposable {
         // await?
         this.processHeader(entry);
       }
+      if (VoilaSession.isWidgetState(entry) && this._wManager) {
+        // Build the models before the outputs that display them:
+        void this._wManager.restoreEmbeddedState(entry.widgets);
+      }
+      if (VoilaSession.isPartial(entry)) {
+        // Stream the outputs of the executing cell into a live entry:
+        const isNew = this._liveModel === null;
+        if (this._liveModel === null) {
+          this._liveModel = new OutputAreaModel({trusted: true});
+          this._outputModels.push([this._liveModel]);
+          this._flatOutputModels.push(this._liveModel);
+        }
+        VoilaSession.applyPartial(this._liveModel, entry.partial);
+        if (isNew) {
+          yield {source: VoilaSession.LIVE_ENTRY_SOURCE, live: true};
+        }
+      }
       if (VoilaSession.validateEntry(entry)) {
-        const rootNode = document.createElement('div');
-        rootNode.innerHTML = entry.source;
-        const outputs = rootNode.querySelectorAll(
-          'script[type="application/x.voila-lab-output+json"]'
-        );
         const models = [];
-        for (let i = 0; i != outputs.length; ++i) {
-          const node = outputs[i] as HTMLScriptElement;
+        for (const data of VoilaSession.outputData(entry)) {
           const model = new OutputAreaModel();
-          const data = JSON.parse(node.innerText);
           model.fromJSON(data.outputs);
           model.trusted = true;
           models.push(model);
         }
+        if (this._liveModel !== null) {
+          // The rendered cell replaces the live entry. Its model is only
+          // disposed with the session, as views may still show it until
+          // they replace it.
+          this._retiredModels.push(this._liveModel);
+          this._liveModel = null;
+          this._outputModels.pop();
+          this._flatOutputModels.pop();
+        }
         this._outputModels.push(models);
+        this._flatOutputModels.push(...models);
         yield entry;
       }
     }
@@ -157,8 +208,10 @@ export class VoilaSession implements IObservableDisposable {
 
   protected async processHeader(header: VoilaSession.HeaderData): Promise<void> {
     const { kernelId } = header;
-    const kernel = await connectKernel(kernelId);
-    const wManager = new WidgetManager(kernel, this.rendermime);
+    // The widget manager is created before the kernel is connected, so that
+    // widgets can be rendered from the state embedded in the render stream.
+    const wManager = new WidgetManager(null, this.rendermime);
+    this._wManager = wManager;
     this.registry.data.forEach(data => wManager.register(data));
 
 
@@ -173,12 +226,26 @@ export class VoilaSession implements IObservableDisposable {
           options, wManager as any)
       }, 0);
 
+    const kernel = await connectKernel(kernelId);
+    if (this.isDisposed) {
+      kernel.dispose();
+      return;
+    }
+    this._kernel = kernel;
+    wManager.setKernel(kernel);
     this._connected.resolve(wManager);
   }
 
   private _isDisposed = false;
+  private _parseInWorker: boolean;
   private _entryGen: ReplayableGenerator<VoilaSession.EntryData>;
   private _outputModels: OutputAreaModel[][] = [];
+  private _flatOutputModels: OutputAreaModel[] = [];
+  private _liveModel: OutputAreaModel | null = null;
+  private _retiredModels: OutputAreaModel[] = [];
+  private _wManager: WidgetManager | null = null;
+  private _kernel: Kernel.IKernel | null = null;
+  private _images = new ObjectURLCache();
   private _connected = new PromiseDelegate<WidgetManager>();
   private _populated = new PromiseDelegate<void>();
   private _disposed = new Signal<this, undefined>(this);
@@ -190,9 +257,103 @@ export class VoilaSession implements IObservableDisposable {
 
 export namespace VoilaSession {
 
+  export interface IOptions {
+    /**
+     * Whether to parse the render stream in a Web Worker, if available.
+     */
+    parseInWorker?: boolean;
+  }
+
   export type HeaderData = { kernelId: string };
 
-  export type EntryData = { source: string };
+  export type OutputData = { outputs: nbformat.IOutput[] };
+
+  /**
+   * A rendered cell.
+   *
+   * A `live` entry stands in for the cell that is executing, and is
+   * replaced by the next entry.
+   */
+  export type EntryData = { source: string, parsedOutputs?: OutputData[], live?: boolean };
+
+  /**
+   * A change to the outputs of the executing cell.
+   */
+  export type PartialRecord = (
+    { add: nbformat.IOutput } |
+    { clear: boolean } |
+    { outputs: nbformat.IOutput[] }
+  );
+
+  export type PartialData = { partial: PartialRecord };
+
+  /**
+   * Widget states embedded in the render stream.
+   */
+  export type WidgetStateData = { widgets: WidgetManager.IEmbeddedState };
+
+  /**
+   * The source of the live entry of the executing cell.
+   */
+  export const LIVE_ENTRY_SOURCE = (
+    '<div class="jp-Cell jp-CodeCell jp-Notebook-cell">' +
+    '<script type="application/x.voila-lab-output+json"></script>' +
+    '</div>'
+  );
+
+  const OUTPUT_SCRIPT_PATTERN = /(<script type="application\/x\.voila-lab-output\+json">)[\s\S]*?(<\/script>)/g;
+
+  /**
+   * Get a copy of an entry without the embedded output data.
+   *
+   * The script tags are kept, so that views can still find where
+   * to place the outputs.
+   */
+  export function compactEntry(entry: EntryData): EntryData {
+    const compact: EntryData = {
+      source: entry.source.replace(OUTPUT_SCRIPT_PATTERN, '$1$2')
+    };
+    if (entry.live) {
+      compact.live = true;
+    }
+    return compact;
+  }
+
+  /**
+   * Apply a partial output record to the output model of a cell.
+   */
+  export function applyPartial(model: OutputAreaModel, record: PartialRecord): void {
+    if ('add' in record) {
+      model.add(record.add);
+    } else if ('clear' in record) {
+      model.clear(record.clear);
+    } else {
+      model.clear();
+      model.fromJSON(record.outputs);
+    }
+  }
+
+  /**
+   * Get the output data embedded in the source of an entry.
+   *
+   * Uses the output data parsed by the render worker when available.
+   */
+  export function outputData(entry: EntryData): ReadonlyArray<OutputData> {
+    if (entry.parsedOutputs) {
+      return entry.parsedOutputs;
+    }
+    const rootNode = document.createElement('div');
+    rootNode.innerHTML = entry.source;
+    const outputs = rootNode.querySelectorAll(
+      'script[type="application/x.voila-lab-output+json"]'
+    );
+    const data = [];
+    for (let i = 0; i != outputs.length; ++i) {
+      const node = outputs[i] as HTMLScriptElement;
+      data.push(JSON.parse(node.innerText));
+    }
+    return data;
+  }
 
   export function validateEntry(entry: ReadonlyJSONValue): entry is EntryData {
     return (
@@ -202,6 +363,22 @@ export namespace VoilaSession {
     );
   }
 
+  export function isPartial(entry: ReadonlyJSONValue): entry is PartialData {
+    return (
+      entry !== null && entry !== undefined
+      && Object.keys(entry).indexOf('partial') !== -1
+      && typeof (entry as any).partial === 'object'
+    );
+  }
+
+  export function isWidgetState(entry: ReadonlyJSONValue): entry is WidgetStateData {
+    return (
+      entry !== null && entry !== undefined
+      && Object.keys(entry).indexOf('widgets') !== -1
+      && typeof (entry as any).widgets === 'object'
+    );
+  }
+
   export function isHeader(entry: ReadonlyJSONValue): entry is HeaderData {
     return (
       entry !== null && entry !== undefined
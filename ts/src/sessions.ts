@@ -0,0 +1,147 @@
+// Copyright (c) Vidar Tonaas Fauske
+// Distributed under the terms of the Modified BSD License.
+
+/*
+
+This module contains the bookkeeping of the sessions shared by the views
+and cloned outputs of notebooks.
+
+*/
+
+import { IObservableDisposable } from '@phosphor/disposable';
+
+import { ISignal } from '@phosphor/signaling';
+
+
+/**
+ * The parts of a session that its lifetime depends on.
+ */
+export interface ISharedSession extends IObservableDisposable {
+  /**
+   * Whether the session has any cloned outputs.
+   */
+  readonly hasClones: boolean;
+
+  /**
+   * A signal emitted when a cloned output of the session is removed.
+   */
+  readonly cloneRemoved: ISignal<this, undefined>;
+}
+
+
+/**
+ * The live sessions of notebooks, shared by their views and clones.
+ *
+ * A session is disposed once its last view or clone is closed.
+ */
+export class SessionRegistry<T extends ISharedSession> {
+  constructor(options: SessionRegistry.IOptions<T>) {
+    this._create = options.create;
+    this._hasViews = options.hasViews;
+  }
+
+  /**
+   * Get the live session of a notebook, or start a new one.
+   */
+  get(path: string): T {
+    const existing = this._sessions[path];
+    if (existing && !existing.isDisposed) {
+      return existing;
+    }
+    const session = this._create(path);
+    this._sessions[path] = session;
+    session.disposed.connect(() => {
+      if (this._sessions[path] === session) {
+        delete this._sessions[path];
+      }
+    });
+    session.cloneRemoved.connect(() => {
+      this.release(session);
+    });
+    return session;
+  }
+
+  /**
+   * Dispose a session, unless it has views or clones left.
+   */
+  release(session: T): void {
+    if (session.isDisposed || session.hasClones || this._hasViews(session)) {
+      return;
+    }
+    session.dispose();
+  }
+
+  private _create: (path: string) => T;
+  private _hasViews: (session: T) => boolean;
+  // The most recently opened, live session of each notebook path:
+  private _sessions: {[path: string]: T} = {};
+}
+
+
+/**
+ * SessionRegistry statics.
+ */
+export namespace SessionRegistry {
+  export interface IOptions<T> {
+    /**
+     * Start a new session for a notebook path.
+     */
+    create: (path: string) => T;
+
+    /**
+     * Whether any views of a session are open.
+     */
+    hasViews: (session: T) => boolean;
+  }
+}
+
+
+/**
+ * Stable slot numbers for the widgets of each key.
+ *
+ * A widget takes the lowest slot that is free for its key. Restoring the
+ * widgets of a layout therefore gives them the same slots as before, which
+ * makes the slots usable in the names of restored widgets.
+ */
+export class KeySlots<T> {
+  /**
+   * Take the lowest free slot for a key.
+   */
+  acquire(key: string, owner: T): number {
+    const taken = this._taken[key] || (this._taken[key] = []);
+    let slot = 0;
+    while (taken.indexOf(slot) !== -1) {
+      slot++;
+    }
+    taken.push(slot);
+    this._owners.set(owner, {key, slot});
+    return slot;
+  }
+
+  /**
+   * Get the slot of a widget, if it has one.
+   */
+  get(owner: T): number | undefined {
+    const entry = this._owners.get(owner);
+    return entry ? entry.slot : undefined;
+  }
+
+  /**
+   * Free the slot of a widget.
+   */
+  release(owner: T): void {
+    const entry = this._owners.get(owner);
+    if (!entry) {
+      return;
+    }
+    this._owners.delete(owner);
+    const taken = this._taken[entry.key];
+    taken.splice(taken.indexOf(entry.slot), 1);
+    if (taken.length === 0) {
+      delete this._taken[entry.key];
+    }
+  }
+
+  private _owners = new Map<T, {key: string, slot: number}>();
+  private _taken: {[key: string]: number[]} = {};
+}
@@ -0,0 +1,209 @@
+// Copyright (c) Vidar Tonaas Fauske
+// Distributed under the terms of the Modified BSD License.
+
+/*
+
+This module contains an image renderer that shares decoded image data.
+
+The default image renderer puts the base64 data of the output in a data
+URL, so every view of the same output (the notebook view and any number
+of clones) decodes and keeps its own copy of the image. Here, the data is
+decoded once into a Blob, and all renderers of the same data use the same
+object URL, which lets the browser share the decoded image as well.
+
+*/
+
+import { IRenderMime } from '@jupyterlab/rendermime-interfaces';
+
+import { ReadonlyJSONObject } from '@phosphor/coreutils';
+
+import { IDisposable } from '@phosphor/disposable';
+
+import { Widget } from '@phosphor/widgets';
+
+
+/**
+ * The image mime types rendered with shared object URLs.
+ */
+export const SHARED_IMAGE_MIMETYPES = [
+  'image/bmp',
+  'image/png',
+  'image/jpeg',
+  'image/gif'
+];
+
+
+/**
+ * Reference counted object URLs for base64 encoded data.
+ *
+ * URLs are cached per mime bundle, so that all renderers of the same
+ * output share a URL, without the cache holding on to the encoded data.
+ */
+export class ObjectURLCache implements IDisposable {
+  /**
+   * Get an object URL for the base64 encoded data of a mime bundle.
+   *
+   * The URL stays valid until it has been released as many times as
+   * it has been acquired.
+   */
+  acquire(bundle: ReadonlyJSONObject, mimeType: string): string {
+    let entries = this._bundles.get(bundle);
+    if (!entries) {
+      entries = new Map();
+      this._bundles.set(bundle, entries);
+    }
+    let entry = entries.get(mimeType);
+    if (!entry) {
+      const bytes = Private.decodeBase64(bundle[mimeType] as string);
+      const url = URL.createObjectURL(new Blob([bytes], {type: mimeType}));
+      entry = {url, mimeType, count: 0, entries};
+      entries.set(mimeType, entry);
+      this._urls.set(url, entry);
+    }
+    entry.count++;
+    return entry.url;
+  }
+
+  /**
+   * Release an object URL acquired from the cache.
+   */
+  release(url: string): void {
+    const entry = this._urls.get(url);
+    if (entry === undefined) {
+      return;
+    }
+    if (--entry.count <= 0) {
+      URL.revokeObjectURL(url);
+      entry.entries.delete(entry.mimeType);
+      this._urls.delete(url);
+    }
+  }
+
+  /**
+   * Whether the cache is disposed.
+   */
+  get isDisposed(): boolean {
+    return this._isDisposed;
+  }
+
+  /**
+   * Revoke all the object URLs of the cache.
+   */
+  dispose(): void {
+    if (this._isDisposed) {
+      return;
+    }
+    this._isDisposed = true;
+    this._urls.forEach(entry => {
+      URL.revokeObjectURL(entry.url);
+      entry.entries.clear();
+    });
+    this._urls.clear();
+  }
+
+  private _bundles = new WeakMap<ReadonlyJSONObject, Map<string, Private.IEntry>>();
+  private _urls = new Map<string, Private.IEntry>();
+  private _isDisposed = false;
+}
+
+
+/**
+ * An image renderer using object URLs from a shared cache.
+ */
+export class SharedImageRenderer extends Widget implements IRenderMime.IRenderer {
+  constructor(options: IRenderMime.IRendererOptions, cache: ObjectURLCache) {
+    super();
+    this.mimeType = options.mimeType;
+    this._cache = cache;
+    this.addClass('jp-RenderedImage');
+  }
+
+  readonly mimeType: string;
+
+  /**
+   * Render a mime model.
+   */
+  async renderModel(model: IRenderMime.IMimeModel): Promise<void> {
+    const metadata = (model.metadata[this.mimeType] || {}) as {
+      width?: number; height?: number; unconfined?: boolean;
+    };
+    this._releaseURL();
+    if (this._cache.isDisposed) {
+      return;
+    }
+    this._url = this._cache.acquire(model.data, this.mimeType);
+
+    const img = document.createElement('img');
+    img.src = this._url;
+    if (typeof metadata.height === 'number') {
+      img.height = metadata.height;
+    }
+    if (typeof metadata.width === 'number') {
+      img.width = metadata.width;
+    }
+    if (metadata.unconfined === true) {
+      img.classList.add('jp-mod-unconfined');
+    }
+    this.node.textContent = '';
+    this.node.appendChild(img);
+  }
+
+  dispose(): void {
+    if (this.isDisposed) {
+      return;
+    }
+    this._releaseURL();
+    super.dispose();
+  }
+
+  private _releaseURL(): void {
+    if (this._url !== null) {
+      this._cache.release(this._url);
+      this._url = null;
+    }
+  }
+
+  private _cache: ObjectURLCache;
+  private _url: string | null = null;
+}
+
+
+/**
+ * Create a renderer factory for images with shared object URLs.
+ */
+export function createSharedImageFactory(cache: ObjectURLCache, rank = 90): IRenderMime.IRendererFactory {
+  return {
+    safe: true,
+    mimeTypes: SHARED_IMAGE_MIMETYPES,
+    defaultRank: rank,
+    createRenderer: options => new SharedImageRenderer(options, cache)
+  };
+}
+
+
+namespace Private {
+  /**
+   * A cached object URL.
+   */
+  export interface IEntry {
+    url: string;
+    mimeType: string;
+    count: number;
+    /**
+     * The entries of the mime bundle the URL was created for.
+     */
+    entries: Map<string, IEntry>;
+  }
+
+  /**
+   * Decode base64 data, ignoring any whitespace in it.
+   */
+  export function decodeBase64(data: string): Uint8Array {
+    const binary = atob(data.replace(/\s/g, ''));
+    const bytes = new Uint8Array(binary.length);
+    for (let i = 0; i < binary.length; ++i) {
+      bytes[i] = binary.charCodeAt(i);
+    }
+    return bytes;
+  }
+}
@@ -1,17 +1,27 @@
-
-
-
 export async function* streamAsyncIterator<T>(stream: ReadableStream<T>): AsyncIterableIterator<T> {
   const reader = stream.getReader();
+  let finished = false;
   try {
     while (true) {
-      const { done, value } = await reader.read();
-    if (done) {
-      return;
-    }
-    yield value;
+      let result: ReadableStreamReadResult<T>;
+      try {
+        result = await reader.read();
+      } catch (reason) {
+        finished = true;
+        throw reason;
+      }
+      if (result.done) {
+        finished = true;
+        return;
+      }
+      yield result.value;
     }
   } finally {
+    // If the consumer stopped early, let the source know that no more
+    // values will be read before giving up the lock
+    if (!finished) {
+      await reader.cancel();
+    }
     reader.releaseLock();
   }
 }
@@ -30,7 +40,17 @@ export function textDecode(input: ReadableStream<Uint8Array>, label?: string, op
           break;
         }
 
-        controller.enqueue(decoder.decode(value));
+        // Keep incomplete multi-byte sequences for the next chunk
+        const text = decoder.decode(value, {stream: true});
+        if (text.length > 0) {
+          controller.enqueue(text);
+        }
+      }
+
+      // Flush anything left in the decoder
+      const rest = decoder.decode();
+      if (rest.length > 0) {
+        controller.enqueue(rest);
       }
 
       // Close the stream
@@ -71,10 +91,16 @@ SOFTWARE.
 
 /**
  * Split the stream
+ *
+ * Each chunk is only scanned once, and the pieces of a part that spans
+ * several chunks are only joined once the part is complete, so the time
+ * taken is linear in the length of the input.
+ *
  * @param {*} splitOn 
  */
 export function splitStream(input: ReadableStream<string>, splitOn: string) {
-  let buffer = '';
+  // The pieces of the current, unterminated part
+  let pending: string[] = [];
   const reader = input.getReader();
 
   return new ReadableStream<string>({
@@ -87,10 +113,38 @@ export function splitStream(input: ReadableStream<string>, splitOn: string) {
           break;
         }
 
-        buffer += value;
-        const parts = buffer.split(splitOn);
-        parts.slice(0, -1).forEach(part => controller.enqueue(part));
-        buffer = parts[parts.length - 1];
+        let text = value;
+        if (splitOn.length > 1 && pending.length > 0) {
+          // A separator might straddle the chunk boundary, so rescan the
+          // end of the pending part together with the new chunk
+          let tail = '';
+          while (pending.length > 0 && tail.length < splitOn.length - 1) {
+            tail = pending.pop() + tail;
+          }
+          const keep = Math.max(0, tail.length - (splitOn.length - 1));
+          if (keep > 0) {
+            pending.push(tail.slice(0, keep));
+          }
+          text = tail.slice(keep) + value;
+        }
+
+        let start = 0;
+        let idx = text.indexOf(splitOn);
+        while (idx !== -1) {
+          pending.push(text.slice(start, idx));
+          controller.enqueue(pending.join(''));
+          pending = [];
+          start = idx + splitOn.length;
+          idx = text.indexOf(splitOn, start);
+        }
+        if (start < text.length) {
+          pending.push(text.slice(start));
+        }
+      }
+
+      // Emit the last part, if it was not terminated
+      if (pending.length > 0) {
+        controller.enqueue(pending.join(''));
       }
 
       // Close the stream
@@ -2,6 +2,7 @@ import { Kernel, ServerConnection } from '@jupyterlab/services'
 import { PageConfig, URLExt } from '@jupyterlab/coreutils';
 import { ReadonlyJSONValue } from '@phosphor/coreutils';
 
+import { canUseRenderWorker, requestInWorker } from './render-worker';
 import {
   parseJSON,
   splitStream,
@@ -28,10 +29,20 @@ export async function connectKernel(
  *
  * @param path - The notebook path to pass to Voila
  * @param baseUrl - Optional base URL for the request
+ * @param options - Optional request options
  */
-export async function* requestVoila(path: string, baseUrl?: string): AsyncIterableIterator<ReadonlyJSONValue> {
+export async function* requestVoila(path: string, baseUrl?: string, options: requestVoila.IOptions = {}): AsyncIterableIterator<ReadonlyJSONValue> {
   baseUrl = baseUrl || PageConfig.getBaseUrl();
   const settings = ServerConnection.makeSettings({ baseUrl });
+  if (options.worker && canUseRenderWorker()) {
+    const headers: {[key: string]: string} = {};
+    if (settings.token) {
+      headers['Authorization'] = `token ${settings.token}`;
+    }
+    yield* requestInWorker(
+      URLExt.join(baseUrl, 'voila', 'render', path), headers);
+    return;
+  }
   const response = await ServerConnection.makeRequest(
     URLExt.join(baseUrl, 'voila', 'render', path), {}, settings);
 
@@ -47,3 +58,16 @@ export async function* requestVoila(path: string, baseUrl?: string): AsyncIterab
     yield data;
   }
 }
+
+
+export namespace requestVoila {
+  export interface IOptions {
+    /**
+     * Whether to fetch and parse the stream in a Web Worker, if available.
+     *
+     * Records with a `source` then also get the parsed output data that is
+     * embedded in the source as `parsedOutputs`.
+     */
+    worker?: boolean;
+  }
+}
@@ -9,6 +9,10 @@ import {
     ExportData, WidgetModel, WidgetView, put_buffers, serialize_state, IStateOptions
 } from '@jupyter-widgets/base';
 
+import {
+  ReadonlyJSONObject, UUID
+} from '@phosphor/coreutils';
+
 import {
   IDisposable
 } from '@phosphor/disposable';
@@ -41,14 +45,39 @@ import {
   BackboneViewWrapper
 } from '@jupyter-widgets/jupyterlab-manager/lib/manager';
 
+import {
+  IWidgetState, dependencyOrder, groupBuffers
+} from './widget-state';
+
+
+/**
+ * The comm target for requesting the state of all widgets in one message.
+ */
+const CONTROL_COMM_TARGET = 'jupyter.widget.control';
+
+/**
+ * The version of the control comm protocol.
+ */
+const CONTROL_COMM_PROTOCOL_VERSION = '1.0.0';
+
+/**
+ * How long to wait (ms) for the control comm reply before falling back.
+ */
+const CONTROL_COMM_TIMEOUT = 4000;
+
 
 /**
  * A widget manager that returns phosphor widgets.
  */
 export class WidgetManager extends ManagerBase<Widget> implements IDisposable {
-  constructor(kernel: Kernel.IKernel, rendermime: IRenderMimeRegistry) {
+  /**
+   * Create a widget manager.
+   *
+   * Without a kernel, models can be created from embedded widget state
+   * until the kernel is set.
+   */
+  constructor(kernel: Kernel.IKernel | null, rendermime: IRenderMimeRegistry) {
     super();
-    this._kernel = kernel;
     this._rendermime = rendermime;
 
     // Set _handleCommOpen so `this` is captured.
@@ -57,6 +86,22 @@ export class WidgetManager extends ManagerBase<Widget> implements IDisposable {
       await this.handle_comm_open(oldComm, msg);
     };
 
+    if (kernel) {
+      this.setKernel(kernel);
+    }
+  }
+
+  /**
+   * Connect the manager to its kernel, and restore the widgets from it.
+   *
+   * Models created from embedded state get their comms attached.
+   */
+  setKernel(kernel: Kernel.IKernel): void {
+    if (this._kernel) {
+      throw new Error('The widget manager already has a kernel');
+    }
+    this._kernel = kernel;
+
     kernel.statusChanged.connect((sender, args) => {
       this._handleKernelStatusChange(args);
     });
@@ -65,6 +110,44 @@ export class WidgetManager extends ManagerBase<Widget> implements IDisposable {
     this.restoreWidgets();
   }
 
+  /**
+   * Create or update widget models from state in the widget embed format.
+   *
+   * New models are registered synchronously, so that they can be rendered
+   * right away. They have no comms until the kernel is set, so changes made
+   * to them in the meantime are queued, and sent once they get their comm.
+   * Existing models with a live comm are left as they are.
+   */
+  async restoreEmbeddedState(embedded: WidgetManager.IEmbeddedState): Promise<void> {
+    const states = embedded.state;
+    const restores: Promise<void>[] = [];
+    for (const widget_id of dependencyOrder(states)) {
+      const { state, buffers, ...spec } = states[widget_id];
+      if (buffers && buffers.length > 0) {
+        put_buffers(
+          state,
+          buffers.map(b => b.path),
+          buffers.map(b => Private.decodeBuffer(b.data, b.encoding))
+        );
+      }
+      if (this._hasModel(widget_id)) {
+        restores.push(this._updateModel(widget_id, state, false));
+        continue;
+      }
+      restores.push(this.new_model({
+        ...spec,
+        model_id: widget_id,
+      }, state).then(model => {
+        if (!model.comm_live) {
+          this._queueChanges(model);
+        }
+      }));
+    }
+    await Promise.all(restores.map(p => p.catch(reason => {
+      console.error(reason);
+    })));
+  }
+
   _handleKernelStatusChange(args: Kernel.Status) {
     switch (args) {
     case 'connected':
@@ -95,11 +178,210 @@ export class WidgetManager extends ManagerBase<Widget> implements IDisposable {
     this._restoredStatus = false;
   }
 
+  /**
+   * Restore the widget models from the kernel.
+   *
+   * All widget states are requested in one message over the control comm.
+   * Kernels that do not support it get a request per widget comm instead.
+   */
   async _loadFromKernel(): Promise<void> {
     if (!this.kernel) {
       return;
     }
     await this.kernel.ready;
+    let reply: Private.IStatesReply;
+    try {
+      reply = await this._requestStates();
+    } catch (reason) {
+      console.info(
+        'Could not fetch the widget states over the control comm, ' +
+        'falling back to fetching the state of each widget:', reason);
+      return this._loadFromKernelModels();
+    }
+
+    const buffers = groupBuffers(reply.data.buffer_paths, reply.buffers);
+
+    // Create the models with their dependencies first. `new_model`
+    // synchronously registers the model id before reconstructing its
+    // state asynchronously, so referenced models are always available
+    // without waiting for every comm to be set up first.
+    const states = reply.data.states;
+    const restores: Promise<void>[] = [];
+    for (const widget_id of dependencyOrder(states)) {
+      const { state, ...spec } = states[widget_id];
+      if (widget_id in buffers) {
+        put_buffers(state, buffers[widget_id].paths, buffers[widget_id].buffers);
+      }
+      if (this._hasModel(widget_id)) {
+        restores.push(this._updateModel(widget_id, state, true));
+        continue;
+      }
+      const comm = await this._create_comm(this.comm_target_name, widget_id);
+      restores.push(this.new_model({
+        ...spec,
+        model_id: widget_id,
+        comm,
+      }, state).then(() => undefined));
+    }
+    await Promise.all(restores.map(p => p.catch(reason => {
+      console.error(reason);
+    })));
+  }
+
+  /**
+   * Request the state of all widgets over the control comm.
+   */
+  private async _requestStates(): Promise<Private.IStatesReply> {
+    const comm = await this._create_comm(
+      CONTROL_COMM_TARGET, UUID.uuid4(), {},
+      {version: CONTROL_COMM_PROTOCOL_VERSION});
+    let closed = false;
+    let timer: any = null;
+    try {
+      return await new Promise<Private.IStatesReply>((resolve, reject) => {
+        comm.on_msg((msg) => {
+          const data = msg.content.data as any;
+          if (data.method !== 'update_states') {
+            console.warn(`Unknown ${data.method} message on the control comm`);
+            return;
+          }
+          // Make the buffers DataViews once, up front:
+          const buffers = (msg.buffers || []).map((b: any) => {
+            if (b instanceof DataView) {
+              return b;
+            }
+            return b instanceof ArrayBuffer ?
+              new DataView(b) :
+              new DataView(b.buffer, b.byteOffset, b.byteLength);
+          });
+          resolve({data, buffers});
+        });
+        comm.on_close(() => {
+          closed = true;
+          reject(new Error('The control comm was closed by the kernel'));
+        });
+        comm.send({method: 'request_states'}, {});
+        timer = setTimeout(() => {
+          reject(new Error('The control comm did not reply in time'));
+        }, CONTROL_COMM_TIMEOUT);
+      });
+    } finally {
+      clearTimeout(timer);
+      if (!closed) {
+        comm.close();
+      }
+    }
+  }
+
+  /**
+   * Handle a comm opened by the kernel.
+   *
+   * Models created from embedded state keep their views, and get the
+   * comm attached instead of being replaced by a new model.
+   */
+  async handle_comm_open(comm: IClassicComm, msg: KernelMessage.ICommOpenMsg): Promise<WidgetModel> {
+    const widget_id = comm.comm_id;
+    if (!this._hasModel(widget_id)) {
+      return super.handle_comm_open(comm, msg);
+    }
+    const model = await this.get_model(widget_id);
+    if (model.comm_live) {
+      return super.handle_comm_open(comm, msg);
+    }
+    this._attachComm(model, comm);
+    const data = msg.content.data as any;
+    put_buffers(data.state, data.buffer_paths || [], msg.buffers || []);
+    const cls = model.constructor as typeof WidgetModel;
+    model.set_state(await cls._deserialize_state(data.state, this));
+    this._sendQueuedChanges(model);
+    return model;
+  }
+
+  /**
+   * Set the restored state of an existing model.
+   *
+   * With `attach`, models without a live comm get one. Without it, models
+   * with a live comm are skipped, as the kernel state is more recent.
+   */
+  private async _updateModel(widget_id: string, state: any, attach: boolean): Promise<void> {
+    const model = await this.get_model(widget_id);
+    if (!attach && model.comm_live) {
+      return;
+    }
+    if (attach && !model.comm_live) {
+      const comm = await this._create_comm(this.comm_target_name, widget_id);
+      this._attachComm(model, comm);
+    }
+    const cls = model.constructor as typeof WidgetModel;
+    const deserialized = await cls._deserialize_state(state, this);
+    this._settingState = true;
+    try {
+      model.set_state(deserialized);
+    } finally {
+      this._settingState = false;
+    }
+    if (attach) {
+      this._sendQueuedChanges(model);
+    }
+  }
+
+  /**
+   * Queue the changes made to a model without a comm, until it gets one.
+   *
+   * Syncing a model fails without a comm, so saving is a no-op until then.
+   */
+  private _queueChanges(model: WidgetModel): void {
+    const changes: {[key: string]: any} = {};
+    this._queuedChanges.set(model, changes);
+    model.on('change', () => {
+      if (!model.comm_live && !this._settingState) {
+        Object.assign(changes, model.changedAttributes());
+      }
+    }, this);
+    (model as any).save_changes = () => undefined;
+  }
+
+  /**
+   * Send the queued changes of a model that got its comm.
+   *
+   * The changes are set again, as they take precedence over the kernel state.
+   */
+  private _sendQueuedChanges(model: WidgetModel): void {
+    const changes = this._queuedChanges.get(model);
+    if (!changes) {
+      return;
+    }
+    this._queuedChanges.delete(model);
+    model.off('change', undefined, this);
+    delete (model as any).save_changes;
+    if (Object.keys(changes).length > 0) {
+      model.set(changes);
+      model.save_changes();
+    }
+  }
+
+  /**
+   * Whether a model with an id has been registered.
+   */
+  private _hasModel(widget_id: string): boolean {
+    return super.get_model(widget_id) !== undefined;
+  }
+
+  /**
+   * Attach a comm to a model, as if it was created with it.
+   */
+  private _attachComm(model: WidgetModel, comm: IClassicComm): void {
+    const m = model as any;
+    model.comm = comm;
+    model.comm_live = true;
+    comm.on_close(m._handle_comm_closed.bind(model));
+    comm.on_msg(m._handle_comm_msg.bind(model));
+  }
+
+  /**
+   * Restore the widget models with a state request per widget comm.
+   */
+  private async _loadFromKernelModels(): Promise<void> {
     const comm_ids = await this._get_comm_info();
 
     // For each comm id, create the comm, and request the state.
@@ -132,6 +414,18 @@ export class WidgetManager extends ManagerBase<Widget> implements IDisposable {
     // by the time they are used.
     await Promise.all(widgets_info.map(async widget_info => {
       const content = widget_info.msg.content as any;
+      const widget_id = widget_info.comm.comm_id;
+      if (this._hasModel(widget_id)) {
+        // Created from embedded state, or before a kernel restart:
+        const model = await this.get_model(widget_id);
+        if (!model.comm_live) {
+          this._attachComm(model, widget_info.comm);
+        }
+        const cls = model.constructor as typeof WidgetModel;
+        model.set_state(await cls._deserialize_state(content.data.state, this));
+        this._sendQueuedChanges(model);
+        return;
+      }
       await this.new_model({
         model_name: content.data.state._model_name,
         model_module: content.data.state._model_module,
@@ -178,7 +472,7 @@ export class WidgetManager extends ManagerBase<Widget> implements IDisposable {
    * This is a read-only property.
    */
   get isDisposed(): boolean {
-    return this._kernel === null;
+    return this._isDisposed;
   }
 
   /**
@@ -189,6 +483,7 @@ export class WidgetManager extends ManagerBase<Widget> implements IDisposable {
       return;
     }
 
+    this._isDisposed = true;
     this._kernel = null;
   }
 
@@ -291,6 +586,7 @@ export class WidgetManager extends ManagerBase<Widget> implements IDisposable {
   async clear_state(): Promise<void> {
     await super.clear_state();
     this._modelsSync = new Map();
+    this._queuedChanges = new Map();
   }
 
   /**
@@ -313,7 +609,8 @@ export class WidgetManager extends ManagerBase<Widget> implements IDisposable {
   }
 
   private _handleCommOpen: (comm: Kernel.IComm, msg: KernelMessage.ICommOpenMsg) => Promise<void>;
-  private _kernel: Kernel.IKernel | null;
+  private _kernel: Kernel.IKernel | null = null;
+  private _isDisposed = false;
   private _registry: SemVerCache<ExportData> = new SemVerCache<ExportData>();
   private _rendermime: IRenderMimeRegistry;
 
@@ -321,6 +618,37 @@ export class WidgetManager extends ManagerBase<Widget> implements IDisposable {
   private _restoredStatus = false;
 
   private _modelsSync = new Map<string, WidgetModel>();
+  private _queuedChanges = new Map<WidgetModel, {[key: string]: any}>();
+  private _settingState = false;
+}
+
+
+export namespace WidgetManager {
+  /**
+   * Widget state in the widget embed format (version 2).
+   */
+  export
+  interface IEmbeddedState extends ReadonlyJSONObject {
+    version_major: number;
+    version_minor: number;
+    state: {[widget_id: string]: IEmbeddedWidgetState};
+  }
+
+  /**
+   * The state of a single widget in the widget embed format.
+   */
+  export
+  interface IEmbeddedWidgetState extends ReadonlyJSONObject {
+    model_name: string;
+    model_module: string;
+    model_module_version: string;
+    state: any;
+    buffers?: {
+      path: (string | number)[];
+      data: string;
+      encoding: 'base64' | 'hex';
+    }[];
+  }
 }
 
 
@@ -334,4 +662,38 @@ namespace Private {
     comm: IClassicComm;
     msg: KernelMessage.ICommMsgMsg;
   }
+
+  /**
+   * The reply to a control comm state request.
+   */
+  export
+  interface IStatesReply {
+    data: {
+      method: 'update_states';
+      states: {[widget_id: string]: IWidgetState};
+      buffer_paths: [string, ...(string | number)[]][];
+    };
+    buffers: DataView[];
+  }
+
+  /**
+   * Decode an embedded widget buffer.
+   */
+  export
+  function decodeBuffer(data: string, encoding: 'base64' | 'hex'): DataView {
+    let bytes: Uint8Array;
+    if (encoding === 'hex') {
+      bytes = new Uint8Array(data.length / 2);
+      for (let i = 0; i < bytes.length; ++i) {
+        bytes[i] = parseInt(data.substr(2 * i, 2), 16);
+      }
+    } else {
+      const binary = atob(data);
+      bytes = new Uint8Array(binary.length);
+      for (let i = 0; i < binary.length; ++i) {
+        bytes[i] = binary.charCodeAt(i);
+      }
+    }
+    return new DataView(bytes.buffer);
+  }
 }
@@ -0,0 +1,94 @@
+// Copyright (c) Vidar Tonaas Fauske
+// Distributed under the terms of the Modified BSD License.
+
+/*
+
+Helpers for restoring serialized widget states, as sent by the kernel over
+the control comm, or embedded in a rendered notebook.
+
+*/
+
+/**
+ * The prefix of a model reference in a serialized widget state.
+ */
+const MODEL_REFERENCE_PREFIX = 'IPY_MODEL_';
+
+
+/**
+ * The serialized state of a widget.
+ */
+export
+interface IWidgetState {
+  model_name: string;
+  model_module: string;
+  model_module_version: string;
+  state: any;
+}
+
+
+/**
+ * Get the ids of the models referenced by a widget state.
+ */
+export
+function modelReferences(value: any, refs: Set<string> = new Set()): Set<string> {
+  if (typeof value === 'string') {
+    if (value.startsWith(MODEL_REFERENCE_PREFIX)) {
+      refs.add(value.slice(MODEL_REFERENCE_PREFIX.length));
+    }
+  } else if (Array.isArray(value)) {
+    for (const item of value) {
+      modelReferences(item, refs);
+    }
+  } else if (value && typeof value === 'object' && !ArrayBuffer.isView(value)) {
+    for (const key of Object.keys(value)) {
+      modelReferences(value[key], refs);
+    }
+  }
+  return refs;
+}
+
+
+/**
+ * Order widget ids so that models come after the models they reference.
+ *
+ * References to unknown models, and reference cycles, are ignored.
+ */
+export
+function dependencyOrder(states: {[widget_id: string]: IWidgetState}): string[] {
+  const order: string[] = [];
+  const visited = new Set<string>();
+  const visit = (widget_id: string) => {
+    if (visited.has(widget_id) || !(widget_id in states)) {
+      return;
+    }
+    visited.add(widget_id);
+    for (const ref of modelReferences(states[widget_id].state)) {
+      visit(ref);
+    }
+    order.push(widget_id);
+  };
+  Object.keys(states).forEach(visit);
+  return order;
+}
+
+
+/**
+ * Group the buffers of a state reply by widget.
+ *
+ * Each buffer path starts with the id of the widget it belongs to, and is
+ * followed by the path of the buffer in the state of that widget.
+ */
+export
+function groupBuffers<T>(
+  bufferPaths: [string, ...(string | number)[]][], buffers: T[]
+): {[widget_id: string]: {paths: (string | number)[][], buffers: T[]}} {
+  const groups: {[widget_id: string]: {paths: (string | number)[][], buffers: T[]}} = {};
+  bufferPaths.forEach(([widget_id, ...path], i) => {
+    if (!groups[widget_id]) {
+      groups[widget_id] = {paths: [], buffers: []};
+    }
+    groups[widget_id].paths.push(path);
+    groups[widget_id].buffers.push(buffers[i]);
+  });
+  return groups;
+}
@@ -31,6 +31,16 @@ const FACTORY_MIME = 'application/vnd.phosphor.widget-factory';
  */
 const DRAG_THRESHOLD = 5;
 
+/**
+ * The estimated height in pixels of entries that have not been rendered.
+ */
+const PLACEHOLDER_HEIGHT = 100;
+
+/**
+ * How far outside the viewport to keep entries rendered.
+ */
+const RENDER_MARGIN = '100% 0px';
+
 
 class ReplaceLayout<T extends Widget> extends Layout {
   replaceNode(target: HTMLElement, widget: T) {
@@ -104,8 +114,11 @@ export class VoilaOutputWidget extends Widget {
     );
     for (let i = 0; i != outputs.length; ++i) {
       const node = outputs[i] as HTMLScriptElement;
+      const model = outputAreaModels[i];
+      if (!model) {
+        continue;
+      }
       try {
-        const model = outputAreaModels[i];
         const view = new OutputArea({
           model,
           rendermime: rendermime
@@ -142,18 +155,157 @@ export class VoilaOutputWidget extends Widget {
 }
 
 
+/**
+ * The output widget of a notebook cell entry.
+ *
+ * The cell content is only rendered on request, and can be released
+ * again while keeping a placeholder of the same height. The output
+ * models are owned by the session, and are kept alive while released.
+ */
+export class VoilaEntryWidget extends VoilaOutputWidget {
+  constructor(options: VoilaEntryWidget.IOptions) {
+    super();
+    this._source = options.source;
+    this.rendermime = options.rendermime;
+    this._outputModels = options.outputModels;
+    this.outputOffset = options.outputOffset;
+    this.node.style.minHeight = `${PLACEHOLDER_HEIGHT}px`;
+  }
+
+  /**
+   * Whether the cell content is currently rendered.
+   */
+  get isRendered(): boolean {
+    return this._isRendered;
+  }
+
+  /**
+   * Render the cell content, if it is not already rendered.
+   */
+  renderContent(): void {
+    if (this._isRendered) {
+      return;
+    }
+    this._isRendered = true;
+    this.node.innerHTML = this._source;
+    this.insertOutputAreas(this.rendermime, this._outputModels);
+    this.node.style.minHeight = '';
+  }
+
+  /**
+   * Release the rendered cell content, keeping a placeholder of its height.
+   */
+  releaseContent(): void {
+    if (!this._isRendered) {
+      return;
+    }
+    const height = this.node.getBoundingClientRect().height;
+    for (const area of toArray(this.layout)) {
+      this.layout.removeWidget(area);
+      area.dispose();
+    }
+    this.node.textContent = '';
+    this.node.style.minHeight = `${height}px`;
+    this._isRendered = false;
+  }
+
+  /**
+   * Replace the cell content, keeping it rendered if it is.
+   */
+  replaceContent(source: string, outputModels: ReadonlyArray<OutputAreaModel>): void {
+    const rendered = this._isRendered;
+    this.releaseContent();
+    this._source = source;
+    this._outputModels = outputModels;
+    if (rendered) {
+      this.renderContent();
+    }
+  }
+
+  /**
+   * The HTML source of the cell.
+   */
+  get source(): string {
+    return this._source;
+  }
+
+  /**
+   * The output models of the cell.
+   */
+  get outputModels(): ReadonlyArray<OutputAreaModel> {
+    return this._outputModels;
+  }
+
+  readonly rendermime: IRenderMimeRegistry;
+
+  /**
+   * The index of the first output of the entry among all session outputs.
+   */
+  readonly outputOffset: number;
+
+  private _source: string;
+  private _outputModels: ReadonlyArray<OutputAreaModel>;
+  private _isRendered = false;
+}
+
+export namespace VoilaEntryWidget {
+  export interface IOptions {
+    /**
+     * The HTML source of the cell, with output script tags.
+     */
+    source: string;
+
+    /**
+     * The rendermime registry to render the outputs with.
+     */
+    rendermime: IRenderMimeRegistry;
+
+    /**
+     * The output models of the cell, one per output script tag.
+     */
+    outputModels: ReadonlyArray<OutputAreaModel>;
+
+    /**
+     * The index of the first output of the entry among all session outputs.
+     */
+    outputOffset: number;
+  }
+}
+
+
 export class VoilaView extends Widget {
   /**
    *
    */
-  constructor(session: VoilaSession) {
+  constructor(session: VoilaSession, options: VoilaView.IOptions = {}) {
     super();
     this.layout = new PanelLayout();
     this.addClass(VOILA_VIEW_CLASS);
     this.session = session;
+    if (options.virtualize !== false && typeof IntersectionObserver !== 'undefined') {
+      this._observer = new IntersectionObserver(
+        this._onIntersection.bind(this),
+        {root: this.node, rootMargin: RENDER_MARGIN}
+      );
+    }
     this.populateFromSession();
   }
 
+  /**
+   * Dispose of the resources held by the widget.
+   */
+  dispose(): void {
+    if (this.isDisposed) {
+      return;
+    }
+    if (this._observer) {
+      this._observer.disconnect();
+      this._observer = null;
+    }
+    this._entryWidgets.clear();
+    super.dispose();
+  }
+
   async populateFromSession() {
     try {
       this.session.connected.then((wManager) => {
@@ -164,6 +316,9 @@ export class VoilaView extends Widget {
         });
       });
       for await (const entry of this.session.entries) {
+        if (this.isDisposed) {
+          break;
+        }
         this.addEntry(entry);
       }
     } catch (reason) {
@@ -175,13 +330,39 @@ export class VoilaView extends Widget {
   }
 
   addEntry(entry: VoilaSession.EntryData): void {
-    const view = new VoilaOutputWidget();
-    view.node.innerHTML = entry.source;
+    const live = this._liveWidget;
+    this._liveWidget = null;
+    if (live) {
+      // The entry replaces the live entry of the cell that was executing:
+      const outputModels = this.session.outputModels[this.layout.widgets.length - 1];
+      this._outputCount += outputModels.length - live.outputModels.length;
+      live.replaceContent(
+        VoilaSession.compactEntry(entry).source, outputModels);
+      if (entry.live) {
+        this._liveWidget = live;
+      }
+      return;
+    }
+    const outputModels = this.session.outputModels[this.layout.widgets.length];
+    const view = new VoilaEntryWidget({
+      // Only keep the markup, the session owns the output data:
+      source: VoilaSession.compactEntry(entry).source,
+      rendermime: this.session.rendermime,
+      outputModels,
+      outputOffset: this._outputCount
+    });
+    this._outputCount += outputModels.length;
     this.layout.addWidget(view);
-    view.insertOutputAreas(
-      this.session.rendermime,
-      this.session.outputModels[this.layout.widgets.length - 1]
-    );
+    if (entry.live) {
+      this._liveWidget = view;
+    }
+    if (this._observer) {
+      // Rendered once it comes near the viewport:
+      this._entryWidgets.set(view.node, view);
+      this._observer.observe(view.node);
+    } else {
+      view.renderContent();
+    }
   }
 
   get allowDrag(): boolean {
@@ -250,18 +431,47 @@ export class VoilaView extends Widget {
     document.removeEventListener('mouseup', this, true);
   }
 
+  /**
+   * The currently rendered output areas.
+   */
   get outputAreas() {
+    return this._renderedOutputs().map(o => o.area);
+  }
+
+  /**
+   * Get the rendered output areas, with their index among all session outputs.
+   */
+  private _renderedOutputs() {
     const items = [];
-    for (const ow of toArray(this.layout)) {
-      for (const oa of toArray((ow as VoilaOutputWidget).layout)) {
-        items.push(oa);
+    for (const ew of toArray(this.layout)) {
+      const widget = ew as VoilaEntryWidget;
+      const areas = toArray(widget.layout);
+      for (let i = 0; i < areas.length; ++i) {
+        items.push({area: areas[i], index: widget.outputOffset + i});
       }
     }
     return items;
   }
 
-  private get _items() {
-    return this.outputAreas.map(o => o.node);
+  /**
+   * Render entries coming into view, and release those going out of view.
+   */
+  private _onIntersection(entries: IntersectionObserverEntry[]): void {
+    // Hidden views report all entries as out of view, ignore them:
+    if (!this.isVisible) {
+      return;
+    }
+    for (const entry of entries) {
+      const widget = this._entryWidgets.get(entry.target);
+      if (!widget) {
+        continue;
+      }
+      if (entry.isIntersecting) {
+        widget.renderContent();
+      } else if (!this._drag) {
+        widget.releaseContent();
+      }
+    }
   }
 
   /**
@@ -270,7 +480,8 @@ export class VoilaView extends Widget {
   private _evtMousedown(event: MouseEvent): void {
     // Left mouse press for drag start.
     if (event.button === 0 && this._allowDrag) {
-      const items = this._items;
+      const outputs = this._renderedOutputs();
+      const items = outputs.map(o => o.area.node);
       let index = hitTestNodes(items, event.clientX, event.clientY);
       if (index === -1) {
         return;
@@ -284,7 +495,7 @@ export class VoilaView extends Widget {
       this._dragData = {
         pressX: event.clientX,
         pressY: event.clientY,
-        index: index
+        index: outputs[index].index
       };
       document.addEventListener('mouseup', this, true);
       document.addEventListener('mousemove', this, true);
@@ -332,7 +543,8 @@ export class VoilaView extends Widget {
    * Start a drag event.
    */
   private _startDrag(index: number, clientX: number, clientY: number): void {
-    let source = this.outputAreas[index];
+    let source = ArrayExt.findFirstValue(
+      this._renderedOutputs(), o => o.index === index);
 
     if (!source) {
       return;
@@ -385,11 +597,27 @@ export class VoilaView extends Widget {
     index: number;
   } | null = null;
 
+  private _observer: IntersectionObserver | null = null;
+  private _entryWidgets = new Map<Element, VoilaEntryWidget>();
+  private _outputCount = 0;
+  private _liveWidget: VoilaEntryWidget | null = null;
+
   private _connected = new PromiseDelegate<void>();
   private _populated = new PromiseDelegate<void>();
   private _cloned = new Signal<this, MainAreaWidget<ClonedOutputArea>>(this);
 }
 
+export namespace VoilaView {
+  export interface IOptions {
+    /**
+     * Whether to only render the entries near the viewport, if supported.
+     *
+     * The default is `true`.
+     */
+    virtualize?: boolean;
+  }
+}
+
 function hitTestNodes(
   nodes: HTMLElement[],
   x: number,
@@ -0,0 +1,144 @@
+// Copyright (c) Vidar Tonaas Fauske
+// Distributed under the terms of the Modified BSD License.
+
+import expect = require('expect.js');
+
+import * as javascriptExtension from '@jupyterlab/javascript-extension';
+
+import * as jsonExtension from '@jupyterlab/json-extension';
+
+import * as pdfExtension from '@jupyterlab/pdf-extension';
+
+import { IRenderMime } from '@jupyterlab/rendermime-interfaces';
+
+import * as vega4Extension from '@jupyterlab/vega4-extension';
+
+import * as vega5Extension from '@jupyterlab/vega5-extension';
+
+import {
+  ILazyMimeExtension, LAZY_MIME_EXTENSIONS, createLazyRendererFactory,
+  loadRendererFactory
+} from '../../src/mimerenderers';
+
+
+/**
+ * The eagerly loaded modules of the lazy mime extensions.
+ */
+const EAGER_MODULES: {[name: string]: IRenderMime.IExtensionModule} = {
+  '@jupyterlab/javascript-extension': javascriptExtension,
+  '@jupyterlab/json-extension': jsonExtension,
+  '@jupyterlab/pdf-extension': pdfExtension,
+  '@jupyterlab/vega4-extension': vega4Extension,
+  '@jupyterlab/vega5-extension': vega5Extension,
+};
+
+/**
+ * The rank of an extension's renderers, as registered by JupyterLab.
+ */
+function rankOf(extension: IRenderMime.IExtension): number {
+  if (typeof extension.rank === 'number') {
+    return extension.rank;
+  }
+  const defaultRank = extension.rendererFactory.defaultRank;
+  return typeof defaultRank === 'number' ? defaultRank : 100;
+}
+
+function extensionsOf(mod: IRenderMime.IExtensionModule): IRenderMime.IExtension[] {
+  return Array.isArray(mod.default) ? mod.default : [mod.default];
+}
+
+/**
+ * Create a lazy extension, named uniquely as loaded chunks are cached by name.
+ */
+function lazyExtension(name: string, load: () => Promise<IRenderMime.IExtensionModule>): ILazyMimeExtension {
+  return {name, mimeTypes: ['text/x-test'], safe: true, rank: 10, load};
+}
+
+function testModule(): IRenderMime.IExtensionModule {
+  return {
+    default: {
+      id: 'test-extension:factory',
+      rendererFactory: {
+        safe: true,
+        mimeTypes: ['text/x-test'],
+        createRenderer: () => { throw new Error('Not rendering'); }
+      }
+    }
+  };
+}
+
+
+describe('mimerenderers', () => {
+
+  describe('LAZY_MIME_EXTENSIONS', () => {
+
+    for (const lazy of LAZY_MIME_EXTENSIONS) {
+
+      it(`should match the eager renderers of ${lazy.name}`, () => {
+        const mod = EAGER_MODULES[lazy.name];
+        expect(mod).to.be.ok();
+        const mimeTypes: string[] = [];
+        for (const ext of extensionsOf(mod)) {
+          mimeTypes.push(...ext.rendererFactory.mimeTypes);
+          expect(lazy.safe).to.be(ext.rendererFactory.safe);
+          expect(lazy.rank).to.be(rankOf(ext));
+        }
+        expect(lazy.mimeTypes.slice().sort()).to.eql(mimeTypes.sort());
+      });
+
+    }
+
+    it('should cover every lazily loaded module', () => {
+      expect(LAZY_MIME_EXTENSIONS.map(ext => ext.name).sort()).to.eql(
+        Object.keys(EAGER_MODULES).sort()
+      );
+    });
+
+  });
+
+  describe('createLazyRendererFactory()', () => {
+
+    it('should register with the rank of the extension', () => {
+      const factory = createLazyRendererFactory(
+        lazyExtension('factory-extension', async () => testModule())
+      );
+      expect(factory.defaultRank).to.be(10);
+      expect(factory.safe).to.be(true);
+      expect(factory.mimeTypes).to.eql(['text/x-test']);
+    });
+
+  });
+
+  describe('loadRendererFactory()', () => {
+
+    it('should find the factory of a mime type', async () => {
+      const mod = testModule();
+      const factory = await loadRendererFactory(
+        lazyExtension('load-extension', async () => mod), 'text/x-test'
+      );
+      expect(factory).to.be((mod.default as IRenderMime.IExtension).rendererFactory);
+    });
+
+    it('should retry loading a chunk that failed to load', async () => {
+      let attempts = 0;
+      const extension = lazyExtension('retry-extension', async () => {
+        if (attempts++ === 0) {
+          throw new Error('Chunk failed to load');
+        }
+        return testModule();
+      });
+      let error: Error | null = null;
+      try {
+        await loadRendererFactory(extension, 'text/x-test');
+      } catch (e) {
+        error = e;
+      }
+      expect(error).to.be.ok();
+      const factory = await loadRendererFactory(extension, 'text/x-test');
+      expect(factory.mimeTypes).to.eql(['text/x-test']);
+      expect(attempts).to.be(2);
+    });
+
+  });
+
+});
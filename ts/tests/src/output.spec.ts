@@ -0,0 +1,162 @@
+// Copyright (c) Vidar Tonaas Fauske
+// Distributed under the terms of the Modified BSD License.
+
+import expect = require('expect.js');
+
+import { nbformat } from '@jupyterlab/coreutils';
+
+import { KernelMessage } from '@jupyterlab/services';
+
+import { OutputModel } from '../../src/output';
+
+
+function iopub(msg_type: string, content: any): KernelMessage.IIOPubMessage {
+  return {
+    header: {msg_type, msg_id: msg_type, session: '', username: '', date: '', version: '5.3'},
+    parent_header: {},
+    metadata: {},
+    content,
+    channel: 'iopub'
+  } as any;
+}
+
+function stream(text: string, name: 'stdout' | 'stderr' = 'stdout') {
+  return iopub('stream', {name, text});
+}
+
+function display(text: string) {
+  return iopub('display_data', {data: {'text/plain': text}, metadata: {}});
+}
+
+function clear(wait: boolean) {
+  return iopub('clear_output', {wait});
+}
+
+/**
+ * Wait for pending outputs to be flushed.
+ */
+function flushed(): Promise<void> {
+  return new Promise(resolve => setTimeout(resolve, 200));
+}
+
+
+describe('OutputModel', () => {
+
+  let model: OutputModel;
+  let added: any[];
+  let saves: number;
+
+  beforeEach(() => {
+    model = new OutputModel({}, {model_id: 'output', widget_manager: {}});
+    added = [];
+    saves = 0;
+    const outputs = model.outputs!;
+    const add = outputs.add.bind(outputs);
+    outputs.add = (output: nbformat.IOutput) => {
+      added.push(output);
+      return add(output);
+    };
+    model.save_changes = () => {
+      saves += 1;
+    };
+  });
+
+  afterEach(() => {
+    model.close(true);
+  });
+
+  describe('#add()', () => {
+
+    it('should merge consecutive messages of the same stream', async () => {
+      model.add(stream('a'));
+      model.add(stream('b'));
+      model.add(stream('c', 'stderr'));
+      model.add(stream('d', 'stderr'));
+      model.add(stream('e'));
+      await flushed();
+      expect(added.map(o => [o.name, o.text])).to.eql([
+        ['stdout', 'ab'], ['stderr', 'cd'], ['stdout', 'e']
+      ]);
+      expect(model.get('outputs').length).to.be(3);
+    });
+
+    it('should not merge streams across other outputs', async () => {
+      model.add(stream('a'));
+      model.add(display('x'));
+      model.add(stream('b'));
+      await flushed();
+      expect(added.map(o => o.output_type)).to.eql(
+        ['stream', 'display_data', 'stream']
+      );
+    });
+
+    it('should drop the messages before an immediate clear', async () => {
+      model.add(stream('a'));
+      model.add(display('x'));
+      model.add(clear(false));
+      model.add(stream('b'));
+      await flushed();
+      expect(added.map(o => o.text)).to.eql(['b']);
+      expect(model.get('outputs')).to.eql([
+        {output_type: 'stream', name: 'stdout', text: 'b'}
+      ]);
+    });
+
+    it('should keep the messages before a waiting clear', async () => {
+      model.add(stream('a'));
+      model.add(clear(true));
+      model.add(stream('b'));
+      await flushed();
+      expect(added.map(o => o.text)).to.eql(['a', 'b']);
+      expect(model.get('outputs').map((o: any) => o.text)).to.eql(['b']);
+    });
+
+    it('should save the outputs once per batch', async () => {
+      for (let i = 0; i < 5; ++i) {
+        model.add(stream(`${i}`));
+        model.add(display(`${i}`));
+      }
+      await flushed();
+      expect(saves).to.be(1);
+      model.add(stream('again'));
+      await flushed();
+      expect(saves).to.be(2);
+    });
+
+    it('should ignore other messages', async () => {
+      model.add(iopub('status', {execution_state: 'busy'}));
+      await flushed();
+      expect(added).to.eql([]);
+      expect(saves).to.be(0);
+    });
+
+  });
+
+  describe('#setOutputs()', () => {
+
+    it('should drop pending messages', async () => {
+      model.add(stream('a'));
+      model.set('outputs', [{output_type: 'stream', name: 'stdout', text: 'x'}]);
+      await flushed();
+      expect(saves).to.be(0);
+      expect(model.outputs!.length).to.be(1);
+      expect(model.outputs!.get(0).toJSON()).to.eql(
+        {output_type: 'stream', name: 'stdout', text: 'x'}
+      );
+    });
+
+  });
+
+  describe('#close()', () => {
+
+    it('should drop pending messages', async () => {
+      model.add(stream('a'));
+      model.close(true);
+      await flushed();
+      expect(added).to.eql([]);
+      expect(saves).to.be(0);
+    });
+
+  });
+
+});
@@ -0,0 +1,127 @@
+// Copyright (c) Vidar Tonaas Fauske
+// Distributed under the terms of the Modified BSD License.
+
+import expect = require('expect.js');
+
+import { ReadonlyJSONValue } from '@phosphor/coreutils';
+
+import { canUseRenderWorker, requestInWorker } from '../../src/render-worker';
+import { VoilaSession } from '../../src/session';
+import {
+  parseJSON, splitStream, streamAsyncIterator, textDecode
+} from '../../src/stream-helpers';
+
+
+/**
+ * Create an NDJSON render stream like the one Voila sends.
+ */
+function makeRenderStream(cells: number, outputSize: number): string {
+  const lines = [JSON.stringify({kernelId: 'kernel'})];
+  for (let i = 0; i < cells; ++i) {
+    const outputs = {outputs: [{
+      output_type: 'stream',
+      name: 'stdout',
+      text: `cell ${i}: ` + 'x'.repeat(outputSize)
+    }]};
+    const source = (
+      '<div class="output">' +
+      '<script type="application/x.voila-lab-output+json">' +
+      JSON.stringify(outputs) +
+      '</script></div>'
+    );
+    lines.push(JSON.stringify({source}));
+  }
+  return lines.join('\n') + '\n';
+}
+
+/**
+ * Measure the longest time the main thread is blocked while running fn.
+ */
+async function measureBlocking(fn: () => Promise<void>): Promise<number> {
+  let last = performance.now();
+  let longest = 0;
+  let running = true;
+  const tick = () => {
+    const now = performance.now();
+    longest = Math.max(longest, now - last);
+    last = now;
+    if (running) {
+      setTimeout(tick, 0);
+    }
+  };
+  setTimeout(tick, 0);
+  try {
+    await fn();
+  } finally {
+    running = false;
+  }
+  return longest;
+}
+
+
+describe('render-worker', () => {
+
+  if (!canUseRenderWorker()) {
+    return;
+  }
+
+  let url: string;
+
+  before(() => {
+    const body = makeRenderStream(20, 2 * 1024 * 1024);
+    url = URL.createObjectURL(new Blob([body], {type: 'application/x-ndjson'}));
+  });
+
+  after(() => {
+    URL.revokeObjectURL(url);
+  });
+
+  it('should stream parsed records with parsed outputs', async function() {
+    this.timeout(30000);
+    const records: ReadonlyJSONValue[] = [];
+    for await (const record of requestInWorker(url)) {
+      records.push(record);
+    }
+    expect(records.length).to.be(21);
+    expect(VoilaSession.isHeader(records[0])).to.be(true);
+    const entry = records[1] as VoilaSession.EntryData;
+    expect(VoilaSession.validateEntry(entry)).to.be(true);
+    expect(entry.parsedOutputs!.length).to.be(1);
+    expect(VoilaSession.outputData(entry)).to.eql(
+      VoilaSession.outputData({source: entry.source}));
+  });
+
+  it('should report request errors', async function() {
+    let error: Error | null = null;
+    try {
+      for await (const record of requestInWorker(url + '-missing')) {
+        expect(record).to.be(undefined);
+      }
+    } catch (err) {
+      error = err;
+    }
+    expect(error).to.be.an(Error);
+  });
+
+  it('should block the main thread less than parsing on it', async function() {
+    this.timeout(60000);
+    const mainThread = await measureBlocking(async () => {
+      const response = await fetch(url);
+      const records = parseJSON(splitStream(textDecode(response.body!), '\n'));
+      for await (const record of streamAsyncIterator(records)) {
+        if (VoilaSession.validateEntry(record)) {
+          VoilaSession.outputData(record);
+        }
+      }
+    });
+    const worker = await measureBlocking(async () => {
+      for await (const record of requestInWorker(url)) {
+        if (VoilaSession.validateEntry(record)) {
+          VoilaSession.outputData(record);
+        }
+      }
+    });
+    expect(worker).to.be.lessThan(mainThread);
+  });
+
+});
@@ -0,0 +1,104 @@
+// Copyright (c) Vidar Tonaas Fauske
+// Distributed under the terms of the Modified BSD License.
+
+import expect = require('expect.js');
+
+import { PromiseDelegate } from '@phosphor/coreutils';
+
+import { ReplayableGenerator } from '../../src/replaygen';
+
+
+async function collect<T>(iterator: AsyncIterableIterator<T>): Promise<T[]> {
+  const values: T[] = [];
+  for await (const value of iterator) {
+    values.push(value);
+  }
+  return values;
+}
+
+
+describe('ReplayableGenerator', () => {
+
+  it('should replay all elements to late subscribers, and close', async () => {
+    async function* source() {
+      yield 1;
+      yield 2;
+      yield 3;
+    }
+    const gen = new ReplayableGenerator(source());
+    expect(await collect(gen.elements())).to.eql([1, 2, 3]);
+    expect(await collect(gen.elements())).to.eql([1, 2, 3]);
+  });
+
+  it('should only keep compacted elements for replaying', async () => {
+    const gate = new PromiseDelegate<void>();
+    async function* source() {
+      yield {id: 1, data: 'x'.repeat(1000)};
+      await gate.promise;
+      yield {id: 2, data: 'y'.repeat(1000)};
+    }
+    const gen = new ReplayableGenerator(source(), {
+      compact: (element) => ({id: element.id, data: ''})
+    });
+    const early = collect(gen.elements());
+    gate.resolve();
+    expect((await early).map(e => e.data.length)).to.eql([1000, 1000]);
+    expect((await collect(gen.elements())).map(e => e.data.length)).to.eql([0, 0]);
+  });
+
+  it('should pass source errors on to subscribers', async () => {
+    async function* source() {
+      yield 1;
+      throw new Error('failed');
+    }
+    const gen = new ReplayableGenerator(source());
+    for (let i = 0; i < 2; ++i) {
+      let error: Error | null = null;
+      try {
+        await collect(gen.elements());
+      } catch (err) {
+        error = err;
+      }
+      expect(error!.message).to.be('failed');
+    }
+  });
+
+  it('should drop subscribers that stop early', async () => {
+    const gate = new PromiseDelegate<void>();
+    async function* source() {
+      yield 1;
+      await gate.promise;
+      yield 2;
+    }
+    const gen = new ReplayableGenerator(source());
+    const children = (gen as any)._children as any[];
+    const values: number[] = [];
+    for await (const value of gen.elements()) {
+      expect(children.length).to.be(1);
+      values.push(value);
+      break;
+    }
+    expect(values).to.eql([1]);
+    expect(children.length).to.be(0);
+    gate.resolve();
+    expect(await collect(gen.elements())).to.eql([1, 2]);
+  });
+
+  it('should release the history and close subscribers when disposed', async () => {
+    const gate = new PromiseDelegate<void>();
+    async function* source() {
+      yield 1;
+      await gate.promise;
+      yield 2;
+    }
+    const gen = new ReplayableGenerator(source());
+    const iterator = gen.elements();
+    expect((await iterator.next()).value).to.be(1);
+    gen.dispose();
+    expect(gen.isDisposed).to.be(true);
+    expect((await iterator.next()).done).to.be(true);
+    expect(await collect(gen.elements())).to.eql([]);
+    gate.resolve();
+  });
+
+});
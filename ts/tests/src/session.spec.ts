@@ -0,0 +1,87 @@
+// Copyright (c) Vidar Tonaas Fauske
+// Distributed under the terms of the Modified BSD License.
+
+import expect = require('expect.js');
+
+import { nbformat } from '@jupyterlab/coreutils';
+
+import { OutputAreaModel } from '@jupyterlab/outputarea';
+
+import { VoilaSession } from '../../src/session';
+
+
+function stream(text: string, name: 'stdout' | 'stderr' = 'stdout'): nbformat.IStream {
+  return {output_type: 'stream', name, text};
+}
+
+function texts(model: OutputAreaModel): string[] {
+  const values: string[] = [];
+  for (let i = 0; i < model.length; ++i) {
+    values.push((model.get(i).toJSON() as nbformat.IStream).text as string);
+  }
+  return values;
+}
+
+
+describe('VoilaSession', () => {
+
+  describe('.isPartial()', () => {
+
+    it('should recognize partial output records', () => {
+      expect(VoilaSession.isPartial({partial: {add: stream('a')}})).to.be(true);
+      expect(VoilaSession.isPartial({partial: {clear: true}})).to.be(true);
+      expect(VoilaSession.isPartial({partial: {outputs: []}})).to.be(true);
+    });
+
+    it('should reject other records', () => {
+      expect(VoilaSession.isPartial({source: '<div></div>'})).to.be(false);
+      expect(VoilaSession.isPartial({kernelId: 'abc'})).to.be(false);
+      expect(VoilaSession.isPartial({partial: 'abc'})).to.be(false);
+      expect(VoilaSession.isPartial(null)).to.be(false);
+    });
+
+  });
+
+  describe('.applyPartial()', () => {
+
+    let model: OutputAreaModel;
+
+    beforeEach(() => {
+      model = new OutputAreaModel({trusted: true});
+    });
+
+    afterEach(() => {
+      model.dispose();
+    });
+
+    it('should add outputs', () => {
+      VoilaSession.applyPartial(model, {add: stream('a')});
+      VoilaSession.applyPartial(model, {add: stream('b', 'stderr')});
+      expect(texts(model)).to.eql(['a', 'b']);
+    });
+
+    it('should replace all outputs', () => {
+      VoilaSession.applyPartial(model, {add: stream('a')});
+      VoilaSession.applyPartial(model, {
+        outputs: [stream('b'), stream('c', 'stderr')]
+      });
+      expect(texts(model)).to.eql(['b', 'c']);
+    });
+
+    it('should clear outputs', () => {
+      VoilaSession.applyPartial(model, {add: stream('a')});
+      VoilaSession.applyPartial(model, {clear: false});
+      expect(model.length).to.be(0);
+    });
+
+    it('should defer a waiting clear until the next output', () => {
+      VoilaSession.applyPartial(model, {add: stream('a')});
+      VoilaSession.applyPartial(model, {clear: true});
+      expect(texts(model)).to.eql(['a']);
+      VoilaSession.applyPartial(model, {add: stream('b')});
+      expect(texts(model)).to.eql(['b']);
+    });
+
+  });
+
+});
@@ -0,0 +1,154 @@
+// Copyright (c) Vidar Tonaas Fauske
+// Distributed under the terms of the Modified BSD License.
+
+import expect = require('expect.js');
+
+import { ISignal, Signal } from '@phosphor/signaling';
+
+import { ISharedSession, KeySlots, SessionRegistry } from '../../src/sessions';
+
+
+/**
+ * A session with clones that can be added and removed.
+ */
+class TestSession implements ISharedSession {
+  constructor(readonly path: string) {}
+
+  get isDisposed(): boolean {
+    return this._isDisposed;
+  }
+
+  get disposed(): ISignal<this, void> {
+    return this._disposed;
+  }
+
+  get cloneRemoved(): ISignal<this, undefined> {
+    return this._cloneRemoved;
+  }
+
+  get hasClones(): boolean {
+    return this.clones > 0;
+  }
+
+  removeClone(): void {
+    this.clones--;
+    this._cloneRemoved.emit(undefined);
+  }
+
+  dispose(): void {
+    if (this._isDisposed) {
+      return;
+    }
+    this._isDisposed = true;
+    this._disposed.emit(undefined);
+    Signal.clearData(this);
+  }
+
+  clones = 0;
+  private _isDisposed = false;
+  private _disposed = new Signal<this, void>(this);
+  private _cloneRemoved = new Signal<this, undefined>(this);
+}
+
+
+describe('sessions', () => {
+
+  describe('SessionRegistry', () => {
+
+    let views: TestSession[];
+    let registry: SessionRegistry<TestSession>;
+
+    /**
+     * Close a view of a session, as the voila view plugin does.
+     */
+    function closeView(session: TestSession) {
+      views.splice(views.indexOf(session), 1);
+      registry.release(session);
+    }
+
+    beforeEach(() => {
+      views = [];
+      registry = new SessionRegistry<TestSession>({
+        create: path => new TestSession(path),
+        hasViews: session => views.indexOf(session) !== -1
+      });
+    });
+
+    it('should share the live session of a path', () => {
+      const session = registry.get('a.ipynb');
+      expect(registry.get('a.ipynb')).to.be(session);
+      expect(registry.get('b.ipynb')).to.not.be(session);
+    });
+
+    it('should dispose a session when its last view is closed', () => {
+      const session = registry.get('a.ipynb');
+      views.push(session, session);
+      closeView(session);
+      expect(session.isDisposed).to.be(false);
+      closeView(session);
+      expect(session.isDisposed).to.be(true);
+      expect(registry.get('a.ipynb')).to.not.be(session);
+    });
+
+    it('should keep a session alive while clones remain', () => {
+      const session = registry.get('a.ipynb');
+      views.push(session);
+      session.clones = 2;
+      closeView(session);
+      expect(session.isDisposed).to.be(false);
+      session.removeClone();
+      expect(session.isDisposed).to.be(false);
+      expect(registry.get('a.ipynb')).to.be(session);
+      session.removeClone();
+      expect(session.isDisposed).to.be(true);
+    });
+
+    it('should keep a session alive while views remain', () => {
+      const session = registry.get('a.ipynb');
+      views.push(session);
+      session.clones = 1;
+      session.removeClone();
+      expect(session.isDisposed).to.be(false);
+      closeView(session);
+      expect(session.isDisposed).to.be(true);
+    });
+
+    it('should start a new session after a session is disposed', () => {
+      const session = registry.get('a.ipynb');
+      session.dispose();
+      const other = registry.get('a.ipynb');
+      expect(other).to.not.be(session);
+      expect(other.isDisposed).to.be(false);
+    });
+
+  });
+
+  describe('KeySlots', () => {
+
+    it('should give the lowest free slot of a key', () => {
+      const slots = new KeySlots<object>();
+      const [a, b, c, d] = [{}, {}, {}, {}];
+      expect(slots.acquire('x', a)).to.be(0);
+      expect(slots.acquire('x', b)).to.be(1);
+      expect(slots.acquire('y', c)).to.be(0);
+      slots.release(a);
+      expect(slots.get(a)).to.be(undefined);
+      expect(slots.acquire('x', d)).to.be(0);
+      expect(slots.get(b)).to.be(1);
+      expect(slots.get(d)).to.be(0);
+    });
+
+    it('should give the same slots when widgets are reopened', () => {
+      const slots = new KeySlots<object>();
+      const before = [{}, {}, {}].map(owner => slots.acquire('x', owner));
+      const owners = [{}, {}, {}];
+      const after = owners.map(owner => slots.acquire('y', owner));
+      expect(after).to.eql(before);
+      owners.forEach(owner => slots.release(owner));
+      slots.release({});
+      expect(slots.acquire('y', {})).to.be(0);
+    });
+
+  });
+
+});
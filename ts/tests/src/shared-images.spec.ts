@@ -0,0 +1,104 @@
+// Copyright (c) Vidar Tonaas Fauske
+// Distributed under the terms of the Modified BSD License.
+
+import expect = require('expect.js');
+
+import { ObjectURLCache } from '../../src/shared-images';
+
+
+// A 1x1 transparent GIF:
+const GIF = 'R0lGODlhAQABAAAAACH5BAEKAAEALAAAAAABAAEAAAICTAEAOw==';
+
+
+describe('ObjectURLCache', () => {
+
+  let cache: ObjectURLCache;
+  let revoked: string[];
+  let revokeObjectURL: typeof URL.revokeObjectURL;
+
+  beforeEach(() => {
+    cache = new ObjectURLCache();
+    revoked = [];
+    revokeObjectURL = URL.revokeObjectURL;
+    URL.revokeObjectURL = (url: string) => {
+      revoked.push(url);
+      revokeObjectURL(url);
+    };
+  });
+
+  afterEach(() => {
+    cache.dispose();
+    URL.revokeObjectURL = revokeObjectURL;
+  });
+
+  describe('#acquire()', () => {
+
+    it('should share a URL between renders of the same bundle', () => {
+      const bundle = {'image/gif': GIF};
+      const url = cache.acquire(bundle, 'image/gif');
+      expect(url).to.match(/^blob:/);
+      expect(cache.acquire(bundle, 'image/gif')).to.be(url);
+    });
+
+    it('should not share URLs between bundles', () => {
+      const url = cache.acquire({'image/gif': GIF}, 'image/gif');
+      expect(cache.acquire({'image/gif': GIF}, 'image/gif')).to.not.be(url);
+    });
+
+    it('should ignore whitespace in the data', () => {
+      const url = cache.acquire({'image/gif': `${GIF.slice(0, 10)}\n${GIF.slice(10)}\n`}, 'image/gif');
+      expect(url).to.match(/^blob:/);
+    });
+
+  });
+
+  describe('#release()', () => {
+
+    it('should revoke a URL once it has been released by every holder', () => {
+      const bundle = {'image/gif': GIF};
+      const url = cache.acquire(bundle, 'image/gif');
+      cache.acquire(bundle, 'image/gif');
+      cache.release(url);
+      expect(revoked).to.eql([]);
+      cache.release(url);
+      expect(revoked).to.eql([url]);
+      // Releasing it again does nothing:
+      cache.release(url);
+      expect(revoked).to.eql([url]);
+    });
+
+    it('should create a new URL when acquired after being revoked', () => {
+      const bundle = {'image/gif': GIF};
+      const url = cache.acquire(bundle, 'image/gif');
+      cache.release(url);
+      const other = cache.acquire(bundle, 'image/gif');
+      expect(other).to.not.be(url);
+      cache.release(other);
+      expect(revoked).to.eql([url, other]);
+    });
+
+    it('should ignore unknown URLs', () => {
+      cache.release('blob:unknown');
+      expect(revoked).to.eql([]);
+    });
+
+  });
+
+  describe('#dispose()', () => {
+
+    it('should revoke all URLs', () => {
+      const first = cache.acquire({'image/gif': GIF}, 'image/gif');
+      const second = cache.acquire({'image/gif': GIF}, 'image/gif');
+      cache.acquire({'image/gif': GIF}, 'image/gif');
+      cache.release(second);
+      cache.dispose();
+      expect(cache.isDisposed).to.be(true);
+      expect(revoked.length).to.be(3);
+      expect(revoked).to.contain(first);
+      cache.release(first);
+      expect(revoked.length).to.be(3);
+    });
+
+  });
+
+});
@@ -0,0 +1,111 @@
+// Copyright (c) Vidar Tonaas Fauske
+// Distributed under the terms of the Modified BSD License.
+
+import expect = require('expect.js');
+
+import {
+  parseJSON, splitStream, textDecode
+} from '../../src/stream-helpers';
+
+
+function fromChunks<T>(chunks: T[]): ReadableStream<T> {
+  let i = 0;
+  return new ReadableStream<T>({
+    pull(controller) {
+      if (i < chunks.length) {
+        controller.enqueue(chunks[i++]);
+      } else {
+        controller.close();
+      }
+    }
+  });
+}
+
+async function collect<T>(stream: ReadableStream<T>): Promise<T[]> {
+  const reader = stream.getReader();
+  const values: T[] = [];
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) {
+      return values;
+    }
+    values.push(value);
+  }
+}
+
+function chunkString(value: string, size: number): string[] {
+  const chunks: string[] = [];
+  for (let i = 0; i < value.length; i += size) {
+    chunks.push(value.slice(i, i + size));
+  }
+  return chunks;
+}
+
+
+describe('stream-helpers', () => {
+
+  describe('textDecode', () => {
+
+    it('should decode multi-byte characters split across chunks', async () => {
+      const text = '{"a":"æøå€😀"}';
+      const bytes = new TextEncoder().encode(text);
+      const chunks: Uint8Array[] = [];
+      for (let i = 0; i < bytes.length; i++) {
+        chunks.push(bytes.slice(i, i + 1));
+      }
+      const parts = await collect(textDecode(fromChunks(chunks)));
+      expect(parts.join('')).to.be(text);
+    });
+
+  });
+
+  describe('splitStream', () => {
+
+    it('should split parts spanning several chunks', async () => {
+      const parts = await collect(splitStream(fromChunks(['ab', 'c\nd', '\n\ne']), '\n'));
+      expect(parts).to.eql(['abc', 'd', '', 'e']);
+    });
+
+    it('should find separators straddling chunk boundaries', async () => {
+      const parts = await collect(splitStream(fromChunks(['a-', '-b-', '', '-', '-c---d']), '--'));
+      expect(parts).to.eql(['a', 'b', '-c', '-d']);
+    });
+
+    it('should emit an unterminated last part', async () => {
+      const parts = await collect(splitStream(fromChunks(['a\nb']), '\n'));
+      expect(parts).to.eql(['a', 'b']);
+    });
+
+    it('should split multi-MB lines in small chunks in linear time', async function() {
+      this.timeout(30000);
+      const timings: number[] = [];
+      for (let size of [2, 8]) {
+        const line = 'x'.repeat(size * 1024 * 1024);
+        const chunks = chunkString(line + '\n' + line + '\n', 1024);
+        const start = performance.now();
+        const parts = await collect(splitStream(fromChunks(chunks), '\n'));
+        timings.push(performance.now() - start);
+        expect(parts.length).to.be(2);
+        expect(parts[0].length).to.be(line.length);
+      }
+      // Four times the input should take nowhere near sixteen times as long:
+      expect(timings[1]).to.be.lessThan(Math.max(8 * timings[0], 1000));
+    });
+
+  });
+
+  describe('parseJSON', () => {
+
+    it('should parse NDJSON from a byte stream', async () => {
+      const bytes = new TextEncoder().encode('{"a":"😀"}\n\n{"b":1}\n');
+      const chunks: Uint8Array[] = [];
+      for (let i = 0; i < bytes.length; i += 3) {
+        chunks.push(bytes.slice(i, i + 3));
+      }
+      const records = await collect(parseJSON(splitStream(textDecode(fromChunks(chunks)), '\n')));
+      expect(records).to.eql([{a: '😀'}, {b: 1}]);
+    });
+
+  });
+
+});
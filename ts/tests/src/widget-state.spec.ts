@@ -0,0 +1,105 @@
+// Copyright (c) Vidar Tonaas Fauske
+// Distributed under the terms of the Modified BSD License.
+
+import expect = require('expect.js');
+
+import {
+  IWidgetState, dependencyOrder, groupBuffers, modelReferences
+} from '../../src/widget-state';
+
+
+function widget(state: any): IWidgetState {
+  return {
+    model_name: 'BoxModel',
+    model_module: '@jupyter-widgets/controls',
+    model_module_version: '1.5.0',
+    state
+  };
+}
+
+function sorted(values: Iterable<string>): string[] {
+  return Array.from(values).sort();
+}
+
+
+describe('widget-state', () => {
+
+  describe('modelReferences()', () => {
+
+    it('should find nested model references', () => {
+      const refs = modelReferences({
+        layout: 'IPY_MODEL_layout',
+        children: ['IPY_MODEL_a', ['IPY_MODEL_b']],
+        nested: {deeper: {value: 'IPY_MODEL_c'}},
+        description: 'IPY_MODEL',
+        other: 'not a reference',
+        count: 5,
+        empty: null
+      });
+      expect(sorted(refs)).to.eql(['a', 'b', 'c', 'layout']);
+    });
+
+    it('should not look into buffers', () => {
+      const data = new Uint8Array([73, 80, 89]);
+      expect(modelReferences({value: data}).size).to.be(0);
+      expect(modelReferences({value: new DataView(data.buffer)}).size).to.be(0);
+    });
+
+  });
+
+  describe('dependencyOrder()', () => {
+
+    it('should order models after the models they reference', () => {
+      const order = dependencyOrder({
+        box: widget({children: ['IPY_MODEL_slider', 'IPY_MODEL_label']}),
+        slider: widget({layout: 'IPY_MODEL_layout'}),
+        label: widget({layout: 'IPY_MODEL_layout'}),
+        layout: widget({})
+      });
+      expect(sorted(order)).to.eql(['box', 'label', 'layout', 'slider']);
+      const index = (id: string) => order.indexOf(id);
+      expect(index('layout')).to.be.lessThan(index('slider'));
+      expect(index('layout')).to.be.lessThan(index('label'));
+      expect(index('slider')).to.be.lessThan(index('box'));
+      expect(index('label')).to.be.lessThan(index('box'));
+    });
+
+    it('should ignore references to unknown models', () => {
+      expect(dependencyOrder({
+        a: widget({layout: 'IPY_MODEL_unknown'})
+      })).to.eql(['a']);
+    });
+
+    it('should include every model once with reference cycles', () => {
+      const order = dependencyOrder({
+        a: widget({next: 'IPY_MODEL_b'}),
+        b: widget({next: 'IPY_MODEL_c'}),
+        c: widget({next: 'IPY_MODEL_a'}),
+        d: widget({self: 'IPY_MODEL_d', next: 'IPY_MODEL_a'})
+      });
+      expect(sorted(order)).to.eql(['a', 'b', 'c', 'd']);
+      expect(order[3]).to.be('d');
+    });
+
+  });
+
+  describe('groupBuffers()', () => {
+
+    it('should group buffers by widget', () => {
+      const groups = groupBuffers(
+        [['a', 'value'], ['b', 'data', 0], ['a', 'other', 'x'], ['b', 'data', 1]],
+        [1, 2, 3, 4]
+      );
+      expect(groups).to.eql({
+        a: {paths: [['value'], ['other', 'x']], buffers: [1, 3]},
+        b: {paths: [['data', 0], ['data', 1]], buffers: [2, 4]}
+      });
+    });
+
+    it('should handle replies without buffers', () => {
+      expect(groupBuffers([], [])).to.eql({});
+    });
+
+  });
+
+});